@@ -0,0 +1,97 @@
+'''import_time.py
+
+Benchmark cold start latency of 'import hytools' and of opening an ENVI
+image with HyTools().read_file, each in a fresh interpreter. Import times
+are parsed from 'python -X importtime' output. Heavy optional dependencies
+loaded by each step are listed, none should be loaded by either step.
+
+Usage:
+    python benchmarks/import_time.py -runs 5
+
+'''
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from hytools.io.envi import WriteENVI,envi_header_dict
+
+HEAVY_MODULES = ['ray','h5py','scipy','pandas','matplotlib','sklearn']
+
+IMPORT = "import hytools"
+
+READ_FILE = '''
+import hytools as ht
+hy_obj = ht.HyTools()
+hy_obj.read_file(%r,'envi')
+'''
+
+LOADED = '''
+import sys
+print(','.join(m for m in %r if m in sys.modules))
+'''
+
+def write_image(output_name,lines = 100,columns = 100,bands = 50):
+    '''Write a small synthetic ENVI image.
+    '''
+    header_dict = envi_header_dict()
+    header_dict['lines'] = lines
+    header_dict['samples'] = columns
+    header_dict['bands'] = bands
+    header_dict['interleave'] = 'bil'
+    header_dict['data type'] = 2
+    header_dict['byte order'] = 0
+    header_dict['data ignore value'] = -9999
+    header_dict['wavelength'] = list(np.linspace(400,2500,bands))
+    header_dict['fwhm'] = [10. for band in range(bands)]
+    header_dict['wavelength units'] = 'nanometers'
+
+    writer = WriteENVI(output_name,header_dict)
+    for line in range(lines):
+        writer.write_line(np.ones((columns,bands),dtype=np.int16),line)
+    writer.close()
+
+def import_time(code):
+    '''Run code in a fresh interpreter, return the cumulative import time
+    of hytools (s) and the total run time (s).
+    '''
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable,'-X','importtime','-c',code],
+                            capture_output = True,text = True,check = True)
+    total = time.perf_counter()-start
+
+    cumulative = np.nan
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'hytools':
+            cumulative = int(fields[1])/1E6
+    return cumulative,total
+
+def loaded_modules(code):
+    '''Return heavy modules loaded after running code.
+    '''
+    result = subprocess.run([sys.executable,'-c',code + LOADED % HEAVY_MODULES],
+                            capture_output = True,text = True,check = True)
+    return result.stdout.strip()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark hytools cold start latency")
+    parser.add_argument("-runs", help="Number of runs", type = int,required=False,default=5)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp() + '/'
+    image = work_dir + 'image'
+    write_image(image)
+
+    print("%16s %16s %16s  %s" % ('','import (s)','total (s)','heavy modules'))
+    for name,code in [('import hytools',IMPORT),('read_file',READ_FILE % image)]:
+        times = np.array([import_time(code) for run in range(args.runs)])
+        print("%16s %16.3f %16.3f  %s" % (name,np.median(times[:,0]),
+                                           np.median(times[:,1]),
+                                           loaded_modules(code) or 'none'))
+    shutil.rmtree(work_dir)
+
+if __name__== "__main__":
+    main()
@@ -0,0 +1,57 @@
+'''neon_edge.py
+
+Benchmark the NEON edge buffer mask, distance transform vs binary erosion,
+across a range of buffer radii. Results of both methods are compared and
+must be identical, the script exits with a non-zero status otherwise.
+
+Usage:
+    python benchmarks/neon_edge.py -lines 5000 -columns 1000 -radii 5 10 30 60
+
+'''
+import argparse
+import sys
+import time
+import numpy as np
+from hytools.masks.calc_apply import neon_edge
+from synthetic import rotated_footprint
+
+class MaskContainer:
+    '''Minimal stand-in for a HyTools object holding a no data mask.
+    '''
+    def __init__(self,no_data):
+        self.lines,self.columns = no_data.shape
+        self.mask = {'no_data' : no_data}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark neon_edge mask methods")
+    parser.add_argument("-lines", help="Number of lines", type = int,required=False,default=5000)
+    parser.add_argument("-columns", help="Number of columns", type = int,required=False,default=1000)
+    parser.add_argument("-radii", help="Buffer radii", type = int,nargs='*',required=False,
+                        default=[5,10,20,30,60])
+    args = parser.parse_args()
+
+    hy_obj = MaskContainer(rotated_footprint(args.lines,args.columns))
+    print("%8s %12s %12s %8s" % ('radius','erosion (s)','edt (s)','match'))
+
+    mismatches = []
+
+    for radius in args.radii:
+        start = time.perf_counter()
+        erosion = neon_edge(hy_obj,{'radius':radius,'method':'erosion'})
+        erosion_time = time.perf_counter()-start
+
+        start = time.perf_counter()
+        edt = neon_edge(hy_obj,{'radius':radius})
+        edt_time = time.perf_counter()-start
+
+        match = np.array_equal(erosion,edt)
+        if not match:
+            mismatches.append(radius)
+        print("%8s %12.3f %12.3f %8s" % (radius,erosion_time,edt_time,match))
+
+    if mismatches:
+        print("ERROR: Distance transform and erosion masks differ for radii %s." % mismatches)
+        sys.exit(1)
+
+if __name__== "__main__":
+    main()
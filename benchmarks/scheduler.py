@@ -0,0 +1,136 @@
+'''scheduler.py
+
+Benchmark exporting resampled images with one ray actor per image vs. the
+row band task scheduler, for a single large image and for a group of
+small images with the same total number of pixels. All runs use a fixed
+number of cores, on Linux the process is pinned to the first 'cpus' cores.
+
+Usage:
+    python benchmarks/scheduler.py -cpus 4 -lines 4000 -columns 500 -bands 100 -images 20
+
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import ray
+import hytools as ht
+from hytools.io.envi import WriteENVI,envi_header_dict,parse_envi_header
+from hytools.parallel import TaskScheduler
+
+def write_image(output_name,lines,columns,bands):
+    '''Write a synthetic ENVI image with a no data border.
+    '''
+    header_dict = envi_header_dict()
+    header_dict['lines'] = lines
+    header_dict['samples'] = columns
+    header_dict['bands'] = bands
+    header_dict['interleave'] = 'bil'
+    header_dict['data type'] = 2
+    header_dict['byte order'] = 0
+    header_dict['data ignore value'] = -9999
+    header_dict['wavelength'] = list(np.linspace(400,2500,bands))
+    header_dict['fwhm'] = [10. for band in range(bands)]
+    header_dict['wavelength units'] = 'nanometers'
+
+    writer = WriteENVI(output_name,header_dict)
+    spectrum = (1000 + 500*np.sin(np.linspace(0,6,bands))).astype(np.int16)
+    for line in range(lines):
+        data = np.tile(spectrum,(columns,1))
+        data[:columns//20] = -9999
+        writer.write_line(data,line)
+    writer.close()
+
+def output_header(hy_obj,out_waves):
+    header_dict = hy_obj.get_header()
+    header_dict['bands'] = len(out_waves)
+    header_dict['wavelength'] = list(out_waves)
+    header_dict['data type'] = 4
+    return header_dict
+
+def export_image(hy_obj,args):
+    '''Export full image, one actor per image model.
+    '''
+    output_dir,out_waves = args
+    hy_obj.resampler = {'type': 'linear','out_waves': out_waves}
+    writer = WriteENVI(output_dir + hy_obj.base_name,output_header(hy_obj,out_waves))
+    iterator = hy_obj.iterate(by='line',resample=True)
+    while not iterator.complete:
+        line = iterator.read_next()
+        writer.write_line(line,iterator.current_line)
+    writer.close()
+
+def export_rows(hy_obj,start,end,args):
+    '''Export a band of lines, scheduler model.
+    '''
+    output_dir,out_waves = args
+    output_name = output_dir + hy_obj.base_name
+    writer = WriteENVI(output_name,parse_envi_header(output_name + ".hdr"),mode='r+')
+    chunk = hy_obj.get_chunk(0,hy_obj.columns,start,end,resample=True)
+    writer.write_chunk(chunk,start,0)
+    writer.close()
+
+def run_actors(images,output_dir,out_waves):
+    hytools = ray.remote(ht.HyTools)
+    actors = [hytools.remote() for image in images]
+    _ = ray.get([a.read_file.remote(image,'envi') for a,image in zip(actors,images)])
+    _ = ray.get([a.do.remote(export_image,(output_dir,out_waves)) for a in actors])
+    for actor in actors:
+        ray.kill(actor)
+
+def run_scheduler(images,output_dir,out_waves,cpus):
+    scheduler = TaskScheduler(cpus)
+    hy_objs = []
+    for image in images:
+        hy_obj = ht.HyTools()
+        hy_obj.read_file(image,'envi')
+        hy_obj.resampler = {'type': 'linear','out_waves': out_waves}
+        writer = WriteENVI(output_dir + hy_obj.base_name,output_header(hy_obj,out_waves))
+        writer.close()
+        hy_objs.append(hy_obj)
+    _ = scheduler.map_rows(export_rows,hy_objs,(output_dir,out_waves))
+    scheduler.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark actor per image vs. task scheduler")
+    parser.add_argument("-cpus", help="Number of cores", type = int,required=False,default=4)
+    parser.add_argument("-lines", help="Lines in large image", type = int,required=False,default=4000)
+    parser.add_argument("-columns", help="Number of columns", type = int,required=False,default=500)
+    parser.add_argument("-bands", help="Number of bands", type = int,required=False,default=100)
+    parser.add_argument("-images", help="Number of small images", type = int,required=False,default=20)
+    args = parser.parse_args()
+
+    if hasattr(os,'sched_setaffinity'):
+        os.sched_setaffinity(0,range(min(args.cpus,os.cpu_count())))
+
+    work_dir = tempfile.mkdtemp() + '/'
+    large = [work_dir + 'large']
+    write_image(large[0],args.lines,args.columns,args.bands)
+    small = [work_dir + 'small_%02d' % i for i in range(args.images)]
+    for image in small:
+        write_image(image,args.lines//args.images,args.columns,args.bands)
+    out_waves = np.linspace(450,2400,args.bands//2)
+
+    ray.init(num_cpus = args.cpus)
+    print("%s cores, %s total lines" % (args.cpus,args.lines))
+    print("%16s %16s %16s" % ('','actors (s)','scheduler (s)'))
+
+    for name,images in [('1 large',large),('%s small' % args.images,small)]:
+        times = []
+        for method in ['actors','scheduler']:
+            output_dir = tempfile.mkdtemp(dir = work_dir) + '/'
+            start = time.perf_counter()
+            if method == 'actors':
+                run_actors(images,output_dir,out_waves)
+            else:
+                run_scheduler(images,output_dir,out_waves,args.cpus)
+            times.append(time.perf_counter()-start)
+        print("%16s %16.2f %16.2f" % (name,times[0],times[1]))
+
+    ray.shutdown()
+    shutil.rmtree(work_dir)
+
+if __name__== "__main__":
+    main()
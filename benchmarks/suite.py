@@ -0,0 +1,431 @@
+'''suite.py
+
+Benchmark suite for HyTools I/O, corrections, resampling, trait
+estimation and ENVI writing, run on deterministic synthetic flightlines
+(see synthetic.py). Each benchmark is run 'repeats' times, setup is not
+timed. Results are written to JSON and can be compared against the
+results of another commit:
+
+    python benchmarks/suite.py -output base.json
+    git checkout my_branch
+    python benchmarks/suite.py -output new.json -compare base.json
+
+Benchmarks:
+    read.<format>.<method> : get_band, get_line, get_column, get_chunk
+                             and get_pixels reads
+    iterate.<format>.<by>  : Full image Iterator pass by line, column,
+                             band, chunk, auto (planned chunks) and good
+                             (planned chunks of the good bands only)
+    calc.<correction>      : Correction coefficient calculation
+    apply.<corrections>[.auto|.good] : Full image corrected chunk iteration
+    resample.<type>[.auto|.good] : Full image resampled chunk iteration
+    trait.<model>          : Trait model application and export
+    write.<interleave>.<method> : WriteENVI paths
+    write.encoded.<type>   : Full image write and read back of float32,
+                             scaled int16 and float16 encoded images
+
+Formats are <interleave>_<byte order> for ENVI images and 'neon' for
+NEON HDF images.
+
+'''
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import hytools as ht
+from hytools.io.envi import WriteENVI,encode_header
+from hytools.masks import mask_create
+from hytools.topo.scsc import calc_scsc_coeffs
+from hytools.brdf.brdf import set_solar_zn
+from hytools.brdf.flex import calc_flex_single
+from synthetic import write_envi,write_neon
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','scripts'))
+from trait_estimate import create_trait_output,apply_trait_model
+
+ENVI_FORMATS = ['bip_0','bip_1','bil_0','bil_1','bsq_0','bsq_1']
+CHUNK_SIZE = (100,100)
+
+# Slower or faster than baseline by more than this fraction is flagged
+THRESHOLD = 0.1
+
+TOPO = {'type': 'scs+c',
+        'c_fit_type': 'ols',
+        'calc_mask': [['ndi',{'band_1':850,'band_2':660,'min':0.1,'max':1.0}]],
+        'apply_mask': [['ndi',{'band_1':850,'band_2':660,'min':0.1,'max':1.0}]]}
+
+BRDF = {'type': 'flex',
+        'grouped': False,
+        'geometric': 'li_dense_r',
+        'volume': 'ross_thick',
+        'b/r': 2.5,
+        'h/b': 2,
+        'sample_perc': 0.1,
+        'interp_kind': 'linear',
+        'solar_zn_type': 'scene',
+        'calc_mask': [['ndi',{'band_1':850,'band_2':660,'min':0.1,'max':1.0}],
+                      ['kernel_finite',{}],
+                      ['neon_edge',{'radius':10}]],
+        'apply_mask': [['ndi',{'band_1':850,'band_2':660,'min':0.05,'max':1.0}]],
+        'bin_type': 'dynamic',
+        'num_bins': 18,
+        'ndvi_bin_min': 0.05,
+        'ndvi_bin_max': 1.0,
+        'ndvi_perc_min': 10,
+        'ndvi_perc_max': 95}
+
+GLINT = {'type': 'hochberg',
+         'correction_wave': 860,
+         'truncate': True,
+         'apply_mask': [['ndi',{'band_1':850,'band_2':660,'min':-1.0,'max':0.0}]]}
+
+def open_image(images,image_format):
+    '''Open a synthetic image.
+    '''
+    hy_obj = ht.HyTools()
+    if image_format == 'neon':
+        hy_obj.read_file(images['neon'],'neon')
+    else:
+        image,anc_path = images[image_format]
+        hy_obj.read_file(image,'envi',anc_path)
+    hy_obj.create_bad_bands([[1300,1450],[1780,1970],[2450,2600]])
+    return hy_obj
+
+def iterate(hy_obj,by,corrections = [],resample = False,bands = None):
+    '''Run a full Iterator pass.
+    '''
+    iterator = hy_obj.iterate(by = by,chunk_size = CHUNK_SIZE,
+                              corrections = corrections,resample = resample,
+                              bands = bands)
+    while not iterator.complete:
+        iterator.read_next()
+
+def read_benchmarks(images,formats):
+    '''Slice reads and Iterator passes.
+    '''
+    benchmarks = []
+    for image_format in formats:
+        hy_obj = open_image(images,image_format)
+        bands = np.linspace(0,hy_obj.bands-1,10).astype(int)
+        lines = np.linspace(0,hy_obj.lines-1,20).astype(int)
+        columns = np.linspace(0,hy_obj.columns-1,10).astype(int)
+        chunks = [(x,x+CHUNK_SIZE[1],y,y+CHUNK_SIZE[0])
+                  for y in np.linspace(0,hy_obj.lines-CHUNK_SIZE[0],2).astype(int)
+                  for x in np.linspace(0,hy_obj.columns-CHUNK_SIZE[1],2).astype(int)]
+        rng = np.random.default_rng(0)
+        pixels = (rng.integers(0,hy_obj.lines,1000),rng.integers(0,hy_obj.columns,1000))
+
+        prefix = 'read.%s.' % image_format
+        benchmarks += [
+            (prefix + 'get_band',None,
+             lambda state,h=hy_obj,b=bands: [h.get_band(band) for band in b]),
+            (prefix + 'get_line',None,
+             lambda state,h=hy_obj,l=lines: [h.get_line(line) for line in l]),
+            (prefix + 'get_column',None,
+             lambda state,h=hy_obj,c=columns: [h.get_column(column) for column in c]),
+            (prefix + 'get_chunk',None,
+             lambda state,h=hy_obj,c=chunks: [h.get_chunk(*chunk) for chunk in c]),
+            (prefix + 'get_pixels',None,
+             lambda state,h=hy_obj,p=pixels: h.get_pixels(*p))]
+
+        for by in ['line','column','band','chunk','auto']:
+            benchmarks.append(('iterate.%s.%s' % (image_format,by),None,
+                               lambda state,h=hy_obj,b=by: iterate(h,b)))
+        benchmarks.append(('iterate.%s.good' % image_format,None,
+                           lambda state,h=hy_obj: iterate(h,'auto',bands = 'good')))
+    return benchmarks
+
+def calibrated_image(images):
+    '''Return an image with topo, brdf and glint coefficients.
+    '''
+    hy_obj = open_image(images,'bil_0')
+    hy_obj.gen_mask(mask_create,'calc_topo',TOPO['calc_mask'])
+    calc_scsc_coeffs(hy_obj,copy.deepcopy(TOPO))
+
+    np.random.seed(0)
+    hy_obj.brdf = copy.deepcopy(BRDF)
+    hy_obj.gen_mask(mask_create,'calc_brdf',BRDF['calc_mask'])
+    set_solar_zn(hy_obj)
+    calc_flex_single(hy_obj,hy_obj.brdf)
+
+    hy_obj.glint = copy.deepcopy(GLINT)
+    return hy_obj
+
+def setup_topo(images):
+    hy_obj = open_image(images,'bil_0')
+    hy_obj.gen_mask(mask_create,'calc_topo',TOPO['calc_mask'])
+    return hy_obj
+
+def calc_topo(hy_obj):
+    calc_scsc_coeffs(hy_obj,copy.deepcopy(TOPO))
+
+def setup_brdf(images):
+    hy_obj = open_image(images,'bil_0')
+    hy_obj.brdf = copy.deepcopy(BRDF)
+    return hy_obj
+
+def calc_brdf(hy_obj):
+    np.random.seed(0)
+    hy_obj.gen_mask(mask_create,'calc_brdf',hy_obj.brdf['calc_mask'])
+    set_solar_zn(hy_obj)
+    calc_flex_single(hy_obj,hy_obj.brdf)
+
+def correction_benchmarks(images):
+    '''Coefficient calculation and application.
+    '''
+    benchmarks = [('calc.topo',lambda: setup_topo(images),calc_topo),
+                  ('calc.brdf',lambda: setup_brdf(images),calc_brdf)]
+
+    # Images are copied so scene level arrays computed on first use
+    # are included in the timing
+    calibrated = calibrated_image(images)
+    for corrections in [['topo'],['brdf'],['glint'],['topo','brdf']]:
+        benchmarks.append(('apply.%s' % '+'.join(corrections),
+                           lambda: copy.deepcopy(calibrated),
+                           lambda h,c=corrections: iterate(h,'chunk',corrections = c)))
+        benchmarks.append(('apply.%s.auto' % '+'.join(corrections),
+                           lambda: copy.deepcopy(calibrated),
+                           lambda h,c=corrections: iterate(h,'auto',corrections = c)))
+        benchmarks.append(('apply.%s.good' % '+'.join(corrections),
+                           lambda: copy.deepcopy(calibrated),
+                           lambda h,c=corrections: iterate(h,'auto',corrections = c,
+                                                           bands = 'good')))
+    return benchmarks
+
+def resample_benchmarks(images):
+    '''Resampling to 10 nm.
+    '''
+    out_waves = np.arange(450,2400,10)
+    benchmarks = []
+    for kind in ['linear','cubic','gaussian']:
+        resampler = {'type': kind,
+                     'out_waves': out_waves,
+                     'out_fwhm': np.full(len(out_waves),10.)}
+        benchmarks.append(('resample.%s' % kind,
+                           lambda r=resampler: setup_resample(images,r),
+                           lambda h: iterate(h,'chunk',resample = True)))
+        benchmarks.append(('resample.%s.auto' % kind,
+                           lambda r=resampler: setup_resample(images,r),
+                           lambda h: iterate(h,'auto',resample = True)))
+        benchmarks.append(('resample.%s.good' % kind,
+                           lambda r=resampler: setup_resample(images,r),
+                           lambda h: iterate(h,'auto',resample = True,bands = 'good')))
+    return benchmarks
+
+def setup_resample(images,resampler):
+    hy_obj = open_image(images,'bil_0')
+    hy_obj.resampler = copy.deepcopy(resampler)
+    return hy_obj
+
+def trait_models(hy_obj):
+    '''Return trait models using image wavelengths and resampled wavelengths.
+    '''
+    rng = np.random.default_rng(0)
+    models = []
+    for name,waves in [('exact',hy_obj.wavelengths[~hy_obj.bad_bands][::4]),
+                       ('resampled',np.arange(450,2400,20.))]:
+        models.append({'name': name,
+                       'wavelengths': list(waves),
+                       'model': {'coefficients': (rng.normal(size=(10,len(waves)))*1E-3).tolist(),
+                                 'intercepts': [0.1]*10,
+                                 'transform': ['vector']},
+                       'model_diagnostics': {'min': -1,'max': 1}})
+    return models
+
+def trait_benchmarks(images,work_dir):
+    '''Trait model application and export.
+    '''
+    config_dict = {'output_dir': work_dir,
+                   'resampling': {'type': 'linear'},
+                   'masks': [['ndi',{'band_1':850,'band_2':660,'min':0.1,'max':1.0}]]}
+    benchmarks = []
+    for trait_model in trait_models(open_image(images,'bil_0')):
+        benchmarks.append(('trait.%s' % trait_model['name'],
+                           lambda t=trait_model: setup_trait(images,t,config_dict),
+                           run_trait))
+    return benchmarks
+
+def setup_trait(images,trait_model,config_dict):
+    hy_obj = open_image(images,'bil_0')
+    for mask,args in config_dict['masks']:
+        hy_obj.gen_mask(mask_create,mask,[[mask,args]])
+    create_trait_output(hy_obj,trait_model,config_dict)
+    return hy_obj,trait_model,config_dict
+
+def run_trait(state):
+    hy_obj,trait_model,config_dict = state
+    apply_trait_model(hy_obj,0,hy_obj.lines,(trait_model,config_dict))
+
+def write_benchmarks(images,work_dir):
+    '''WriteENVI line, column, band, chunk and pixel writes.
+    '''
+    hy_obj = open_image(images,'bil_0')
+    cube = hy_obj.get_chunk(0,hy_obj.columns,0,hy_obj.lines)
+    header_dict = hy_obj.get_header()
+    lines,columns,bands = cube.shape
+    rng = np.random.default_rng(0)
+    pixels = list(zip(rng.integers(0,lines,2000),rng.integers(0,columns,2000)))
+
+    def write(interleave,method):
+        header = dict(header_dict,interleave = interleave)
+        writer = WriteENVI(work_dir + 'write_%s' % interleave,header)
+        if method == 'line':
+            for line in range(lines):
+                writer.write_line(cube[line],line)
+        elif method == 'column':
+            for column in range(columns):
+                writer.write_column(cube[:,column],column)
+        elif method == 'band':
+            for band in range(bands):
+                writer.write_band(cube[:,:,band],band)
+        elif method == 'chunk':
+            for y in range(0,lines,CHUNK_SIZE[0]):
+                for x in range(0,columns,CHUNK_SIZE[1]):
+                    writer.write_chunk(cube[y:y+CHUNK_SIZE[0],x:x+CHUNK_SIZE[1]],y,x)
+        elif method == 'pixel':
+            for line,column in pixels:
+                writer.write_pixel(cube[line,column],line,column)
+        writer.close()
+
+    # Reflectance scaled cube, encoded images are written and read decoded
+    reflectance = np.where(cube == hy_obj.no_data,hy_obj.no_data,cube/10000).astype(np.float32)
+
+    def write_encoded(encoding):
+        header = encode_header(dict(header_dict,**{'data type': 4}),encoding)
+        writer = WriteENVI(work_dir + 'write_encoded',header)
+        writer.write_chunk(reflectance,0,0)
+        writer.close()
+        encoded = ht.HyTools()
+        encoded.read_file(work_dir + 'write_encoded','envi')
+        encoded.get_chunk(0,columns,0,lines)
+
+    benchmarks = []
+    for interleave in ['bip','bil','bsq']:
+        for method in ['line','column','band','chunk','pixel']:
+            benchmarks.append(('write.%s.%s' % (interleave,method),None,
+                               lambda state,i=interleave,m=method: write(i,m)))
+    for encoding in [None,{'type': 'int16','scale': 10000},{'type': 'float16'}]:
+        name = 'float32' if encoding is None else encoding['type']
+        benchmarks.append(('write.encoded.%s' % name,None,
+                           lambda state,e=encoding: write_encoded(e)))
+    return benchmarks
+
+def run_benchmark(setup,function,repeats):
+    '''Return run times (s) of a benchmark.
+    '''
+    times = []
+    for repeat in range(repeats):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter()-start)
+    return times
+
+def git_commit():
+    '''Return the current commit hash, None if not available.
+    '''
+    try:
+        result = subprocess.run(['git','rev-parse','--short','HEAD'],capture_output = True,
+                                text = True,cwd = os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def compare(results,meta,baseline_file):
+    '''Print median run times relative to a baseline results file.
+    '''
+    with open(baseline_file, 'r') as json_file:
+        baseline = json.load(json_file)
+    print("\nComparison with %s (commit %s)" % (baseline_file,baseline['meta']['commit']))
+    for key in ['lines','columns','bands','repeats']:
+        if baseline['meta'][key] != meta[key]:
+            print("WARNING: Baseline %s (%s) does not match (%s)." % (key,baseline['meta'][key],meta[key]))
+    print("%-32s %12s %12s %8s" % ('benchmark','base (s)','new (s)','ratio'))
+    for name,result in results.items():
+        if name not in baseline['results']:
+            continue
+        base = baseline['results'][name]['median']
+        ratio = result['median']/base
+        flag = ''
+        if ratio > 1 + THRESHOLD:
+            flag = 'slower'
+        elif ratio < 1 - THRESHOLD:
+            flag = 'faster'
+        print("%-32s %12.4f %12.4f %8.2f %s" % (name,base,result['median'],ratio,flag))
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run HyTools benchmark suite")
+    parser.add_argument("-lines", help="Number of lines", type = int,required=False,default=500)
+    parser.add_argument("-columns", help="Number of columns", type = int,required=False,default=300)
+    parser.add_argument("-bands", help="Number of bands", type = int,required=False,default=100)
+    parser.add_argument("-repeats", help="Number of runs per benchmark", type = int,required=False,default=3)
+    parser.add_argument("-seed", help="Scene seed", type = int,required=False,default=0)
+    parser.add_argument("-filter", help="Run benchmarks whose name contains any of these strings",
+                        nargs='*',required=False,default=[])
+    parser.add_argument("-output", help="Output JSON pathname", type = str,required=False)
+    parser.add_argument("-compare", help="Baseline JSON pathname", type = str,required=False)
+    parser.add_argument("-no_neon", help="Skip NEON HDF benchmarks", required=False, action='store_true')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp() + '/'
+    print("Generating synthetic images")
+    images = {}
+    for image_format in ENVI_FORMATS:
+        interleave,byte_order = image_format.split('_')
+        image = work_dir + 'synthetic_%s' % image_format
+        anc_path = write_envi(image,args.lines,args.columns,args.bands,
+                              interleave,int(byte_order),args.seed)
+        images[image_format] = (image,anc_path)
+    formats = list(ENVI_FORMATS)
+    if not args.no_neon:
+        images['neon'] = work_dir + 'synthetic.h5'
+        write_neon(images['neon'],args.lines,args.columns,args.bands,args.seed)
+        formats.append('neon')
+
+    benchmarks = read_benchmarks(images,formats)
+    benchmarks += correction_benchmarks(images)
+    benchmarks += resample_benchmarks(images)
+    benchmarks += trait_benchmarks(images,work_dir)
+    benchmarks += write_benchmarks(images,work_dir)
+
+    results = {}
+    for name,setup,function in benchmarks:
+        if args.filter and not any(string in name for string in args.filter):
+            continue
+        times = run_benchmark(setup,function,args.repeats)
+        results[name] = {'median': float(np.median(times)),
+                         'min': float(np.min(times)),
+                         'times': times}
+        print("%-32s %10.4f s" % (name,results[name]['median']))
+
+    output = {'meta': {'commit': git_commit(),
+                       'date': datetime.datetime.now().isoformat(timespec = 'seconds'),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'platform': platform.platform(),
+                       'cpus': os.cpu_count(),
+                       'lines': args.lines,
+                       'columns': args.columns,
+                       'bands': args.bands,
+                       'repeats': args.repeats,
+                       'seed': args.seed},
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(output,outfile,indent=3)
+    if args.compare:
+        compare(results,output['meta'],args.compare)
+
+    shutil.rmtree(work_dir)
+
+if __name__== "__main__":
+    main()
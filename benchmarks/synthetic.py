@@ -0,0 +1,288 @@
+'''synthetic.py
+
+Deterministic synthetic flightline generator for benchmarks.
+
+Scenes are a mix of vegetation, soil and water spectra over smooth
+terrain, viewed by a pushbroom sensor. The valid area of each flightline
+is a rotated rectangle, pixels outside the footprint are set to the no
+data value. All content is a function of the image size and seed, images
+with the same arguments are identical regardless of format.
+
+Images can be written in ENVI format (BIP, BIL or BSQ, either byte order)
+with a matching observables ancillary file, or in NEON AOP HDF layout.
+
+Usage:
+    python benchmarks/synthetic.py output_dir -lines 1000 -columns 500 -bands 100
+
+'''
+import argparse
+import os
+import numpy as np
+from hytools.io.envi import envi_header_dict,write_envi_header,dtype_dict
+
+NO_DATA = -9999
+SCALE = 10000
+PIXEL_SIZE = 5.
+
+# Observables band order, following NASA JPL AVIRIS *_obs_ort files
+OBS_NAMES = ['path_length','sensor_az','sensor_zn','solar_az','solar_zn',
+             'phase','slope','aspect','cosine_i','utc_time']
+
+MAP_INFO = ['UTM','1.000','1.000','500000.000','4000000.000',
+            str(PIXEL_SIZE),str(PIXEL_SIZE),'16','North','WGS-84','units=Meters']
+
+def rotated_footprint(lines,columns,angle = 25):
+    '''Create a no data mask of a rotated rectangular flightline.
+    '''
+    y_grid,x_grid = np.mgrid[:lines,:columns]
+    angle = np.radians(angle)
+    y_rot = (y_grid-lines/2)*np.cos(angle) - (x_grid-columns/2)*np.sin(angle)
+    x_rot = (y_grid-lines/2)*np.sin(angle) + (x_grid-columns/2)*np.cos(angle)
+    return (np.abs(y_rot) < lines*.4) & (np.abs(x_rot) < columns*.3)
+
+def scene_wavelengths(bands):
+    '''Return band centers and FWHM of a 400-2500 nm sensor.
+    '''
+    wavelengths = np.round(np.linspace(400,2500,bands),2)
+    fwhm = np.full(bands,np.round(2100/bands*1.1,2))
+    return wavelengths,fwhm
+
+def endmembers(wavelengths):
+    '''Return vegetation, soil and water reflectance spectra.
+    '''
+    waves = np.asarray(wavelengths)
+    absorption = np.exp(-((waves-1450)/60)**2) + np.exp(-((waves-1940)/70)**2)
+    vegetation = 0.03 + 0.05*np.exp(-((waves-550)/35)**2)
+    vegetation += 0.42/(1+np.exp(-(waves-715)/12))*np.exp(-(np.maximum(waves-1100,0)/1500))
+    vegetation *= 1 - 0.8*absorption
+    soil = (0.08 + 0.25*(waves-400)/2100)*(1 - 0.3*absorption)
+    water = 0.005 + 0.06*np.exp(-(waves-400)/120)
+    return np.clip(np.array([vegetation,soil,water]),0.001,1)
+
+class Scene:
+    """Synthetic scene, lines are generated on demand.
+
+    """
+
+    def __init__(self,lines,columns,bands,seed = 0):
+        self.lines = lines
+        self.columns = columns
+        self.bands = bands
+        self.seed = seed
+        self.wavelengths,self.fwhm = scene_wavelengths(bands)
+        self.spectra = endmembers(self.wavelengths)
+        self.footprint = rotated_footprint(lines,columns)
+
+        rng = np.random.default_rng(seed)
+        self.phase = rng.uniform(0,2*np.pi,6)
+        self.solar_az = 140 + rng.uniform(-10,10)
+        self.solar_zn = 35 + rng.uniform(-5,5)
+        self.x_grid = np.arange(columns)
+
+    def terrain(self,line):
+        '''Return slope and aspect (degrees) of a line.
+        '''
+        y,x,p = line,self.x_grid,self.phase
+        # Elevation: 80*sin(y/60+p0) + 60*cos(x/45+p1), gradients in m/m
+        dz_dy = 80/60*np.cos(y/60+p[0])*np.ones(self.columns)/PIXEL_SIZE
+        dz_dx = -60/45*np.sin(x/45+p[1])/PIXEL_SIZE
+        slope = np.degrees(np.arctan(np.hypot(dz_dx,dz_dy)))
+        aspect = np.degrees(np.arctan2(-dz_dx,dz_dy)) % 360
+        return slope,aspect
+
+    def observables(self,line):
+        '''Return observables (columns,10) of a line.
+        '''
+        obs = np.zeros((self.columns,len(OBS_NAMES)),dtype=np.float32)
+        center = self.columns/2
+        sensor_zn = np.abs(self.x_grid-center)/center*15
+        sensor_az = np.where(self.x_grid < center,90.,270.)
+        slope,aspect = self.terrain(line)
+        solar_zn,solar_az = np.radians(self.solar_zn),np.radians(self.solar_az)
+        cosine_i = np.cos(solar_zn)*np.cos(np.radians(slope))
+        cosine_i += np.sin(solar_zn)*np.sin(np.radians(slope))*np.cos(solar_az-np.radians(aspect))
+
+        obs[:,0] = 3000/np.cos(np.radians(sensor_zn))
+        obs[:,1] = sensor_az
+        obs[:,2] = sensor_zn
+        obs[:,3] = self.solar_az
+        obs[:,4] = self.solar_zn
+        obs[:,5] = np.degrees(np.arccos(np.cos(solar_zn)*np.cos(np.radians(sensor_zn))))
+        obs[:,6] = slope
+        obs[:,7] = aspect
+        obs[:,8] = cosine_i
+        obs[:,9] = 17.5 + line/self.lines*0.1
+        return obs
+
+    def reflectance(self,line):
+        '''Return scaled reflectance (columns,bands) of a line.
+        '''
+        y,x,p = line,self.x_grid,self.phase
+        # Water bodies scale with the scene, vegetation varies over ~100 m
+        water = (np.sin(4*np.pi*y/self.lines+p[2]) +
+                 np.cos(3*np.pi*x/self.columns+p[3])) > 1.5
+        vegetation = np.clip(0.5 + 0.6*np.sin(x/37+p[4])*np.cos(y/53+p[5]),0,1)
+        fractions = np.stack([vegetation,1-vegetation,np.zeros(self.columns)],axis=1)
+        fractions[water] = [0,0,1]
+        reflectance = fractions @ self.spectra
+
+        # Illumination and across track view angle effects
+        obs = self.observables(line)
+        illumination = np.clip(obs[:,8]/np.cos(np.radians(self.solar_zn)),0.2,1.5)
+        illumination[water] = 1
+        view = 1 + 0.15*(obs[:,2]/15)*np.where(obs[:,1] < 180,1,-1)
+        reflectance *= (illumination*view)[:,np.newaxis]
+
+        rng = np.random.default_rng([self.seed,line])
+        reflectance += rng.normal(0,0.003,reflectance.shape)
+        data = np.round(np.clip(reflectance,0,1)*SCALE).astype(np.int16)
+        data[~self.footprint[line]] = NO_DATA
+        return data
+
+def envi_header(lines,columns,bands,interleave,byte_order,data_type):
+    '''Return ENVI header dictionary.
+    '''
+    header_dict = envi_header_dict()
+    header_dict['lines'] = lines
+    header_dict['samples'] = columns
+    header_dict['bands'] = bands
+    header_dict['interleave'] = interleave
+    header_dict['data type'] = data_type
+    header_dict['byte order'] = byte_order
+    header_dict['header offset'] = 0
+    header_dict['file type'] = 'ENVI Standard'
+    header_dict['data ignore value'] = NO_DATA
+    header_dict['map info'] = MAP_INFO
+    return header_dict
+
+def write_lines(output_name,header_dict,line_function):
+    '''Write an ENVI image line by line in the header byte order.
+    '''
+    lines = header_dict['lines']
+    columns = header_dict['samples']
+    bands = header_dict['bands']
+    dtype = np.dtype(dtype_dict[header_dict['data type']])
+    dtype = dtype.newbyteorder('>' if header_dict['byte order'] == 1 else '<')
+
+    interleave = header_dict['interleave']
+    shape = {'bip': (lines,columns,bands),
+             'bil': (lines,bands,columns),
+             'bsq': (bands,lines,columns)}[interleave]
+    data = np.memmap(output_name,dtype = dtype,mode = 'w+',shape = shape)
+    for line in range(lines):
+        values = line_function(line)
+        if interleave == 'bip':
+            data[line] = values
+        elif interleave == 'bil':
+            data[line] = values.T
+        else:
+            data[:,line] = values.T
+    data.flush()
+    del data
+    write_envi_header(output_name,header_dict)
+
+def write_envi(output_name,lines,columns,bands,interleave = 'bil',
+               byte_order = 0,seed = 0):
+    '''Write a synthetic ENVI image and observables file.
+
+    Args:
+        output_name (str): Image pathname, observables are written to
+                           output_name + '_obs'.
+        lines (int): Number of lines.
+        columns (int): Number of columns.
+        bands (int): Number of bands.
+        interleave (str, optional): 'bip', 'bil' or 'bsq'. Defaults to 'bil'.
+        byte_order (int, optional): ENVI byte order, 0 little endian,
+                                    1 big endian. Defaults to 0.
+        seed (int, optional): Scene seed. Defaults to 0.
+
+    Returns:
+        dict: Ancillary path dictionary for HyTools.read_file.
+
+    '''
+    scene = Scene(lines,columns,bands,seed)
+
+    header_dict = envi_header(lines,columns,bands,interleave,byte_order,2)
+    header_dict['wavelength'] = list(scene.wavelengths)
+    header_dict['fwhm'] = list(scene.fwhm)
+    header_dict['wavelength units'] = 'nanometers'
+    write_lines(output_name,header_dict,scene.reflectance)
+
+    obs_name = output_name + '_obs'
+    header_dict = envi_header(lines,columns,len(OBS_NAMES),'bil',byte_order,4)
+    header_dict['band names'] = OBS_NAMES
+    write_lines(obs_name,header_dict,scene.observables)
+
+    return {name:[obs_name,band] for band,name in enumerate(OBS_NAMES)}
+
+def write_neon(output_name,lines,columns,bands,seed = 0,site = 'SYNT'):
+    '''Write a synthetic image in NEON AOP HDF layout.
+
+    Args:
+        output_name (str): Image pathname.
+        lines (int): Number of lines.
+        columns (int): Number of columns.
+        bands (int): Number of bands.
+        seed (int, optional): Scene seed. Defaults to 0.
+        site (str, optional): Site code, used as base key. Defaults to 'SYNT'.
+
+    Returns:
+        None.
+
+    '''
+    import h5py
+
+    scene = Scene(lines,columns,bands,seed)
+    with h5py.File(output_name,'w') as hdf_obj:
+        reflectance = hdf_obj.create_group(site).create_group('Reflectance')
+        data = reflectance.create_dataset('Reflectance_Data',(lines,columns,bands),
+                                          dtype = np.int16,
+                                          chunks = (min(lines,64),min(columns,64),bands))
+        data.attrs['Data_Ignore_Value'] = NO_DATA
+        data.attrs['Scale_Factor'] = SCALE
+
+        metadata = reflectance.create_group('Metadata')
+        coordinates = metadata.create_group('Coordinate_System')
+        coordinates['Coordinate_System_String'] = np.bytes_('PROJCS["WGS 84 / UTM zone 16N"]')
+        coordinates['Map_Info'] = np.bytes_(','.join(MAP_INFO))
+        spectral = metadata.create_group('Spectral_Data')
+        spectral['Wavelength'] = scene.wavelengths
+        spectral['Wavelength'].attrs['Units'] = 'nanometers'
+        spectral['FWHM'] = scene.fwhm
+
+        obs = np.zeros((lines,columns,len(OBS_NAMES)),dtype=np.float32)
+        for line in range(lines):
+            data[line] = scene.reflectance(line)
+            obs[line] = scene.observables(line)
+
+        ancillary = metadata.create_group('Ancillary_Imagery')
+        ancillary['Path_Length'] = obs[:,:,0]
+        ancillary['Slope'] = obs[:,:,6]
+        ancillary['Aspect'] = obs[:,:,7]
+        metadata['to-sensor_Azimuth_Angle'] = obs[:,:,1]
+        metadata['to-sensor_Zenith_Angle'] = obs[:,:,2]
+        logs = metadata.create_group('Logs')
+        logs['Solar_Azimuth_Angle'] = np.float32(scene.solar_az)
+        logs['Solar_Zenith_Angle'] = np.float32(scene.solar_zn)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Write synthetic flightlines")
+    parser.add_argument('output_dir',help="Output directory", type = str)
+    parser.add_argument("-lines", help="Number of lines", type = int,required=False,default=1000)
+    parser.add_argument("-columns", help="Number of columns", type = int,required=False,default=500)
+    parser.add_argument("-bands", help="Number of bands", type = int,required=False,default=100)
+    parser.add_argument("-seed", help="Scene seed", type = int,required=False,default=0)
+    parser.add_argument("-neon", help="Also write NEON HDF image", required=False, action='store_true')
+    args = parser.parse_args()
+
+    for interleave in ['bip','bil','bsq']:
+        for byte_order in [0,1]:
+            output_name = os.path.join(args.output_dir,'synthetic_%s_%s' % (interleave,byte_order))
+            write_envi(output_name,args.lines,args.columns,args.bands,
+                       interleave,byte_order,args.seed)
+    if args.neon:
+        write_neon(os.path.join(args.output_dir,'synthetic.h5'),
+                   args.lines,args.columns,args.bands,args.seed)
+
+if __name__== "__main__":
+    main()
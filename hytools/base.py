@@ -24,65 +24,109 @@ TODO: Add corrections to ndi()
 """
 import os
 import json
+from collections import OrderedDict
 import numpy as np
-import h5py
 import warnings
 import sys
+import time
 from .io.envi import envi_read_band,envi_read_pixels
 from .io.envi import envi_read_line,envi_read_column,envi_read_chunk
-from .io.envi import open_envi,parse_envi_header,envi_header_from_neon
+from .io.envi import open_envi,parse_envi_header,envi_header_from_neon,no_data_code
 from .io.neon import open_neon
 from .brdf import apply_brdf_correct
 from .glint import apply_glint_correct
 from .brdf.kernels import calc_volume_kernel,calc_geom_kernel
 from .topo import calc_cosine_i,apply_topo_correct
 from .transform.resampling import *
+from .masks.packed import PackedMask,mask_select
+from .masks.footprint import Footprint
+from .masks.masks import mask_key,mask_term,PIXEL_MASKS
+from .misc.geo import map_to_pixel,pixel_to_map
+from .misc.chunks import plan_iteration
 
 warnings.filterwarnings("ignore")
 
+# Ancillary datasets converted to radians
+ANGULAR_ANC = ['slope','sensor_az','sensor_zn','aspect','solar_zn','solar_az']
+
+# Corrections evaluated on pixel views when correcting pixels
+SPARSE_CORRECTIONS = ['topo','brdf']
+
+# Band dependent ancillary datasets, computed separately on band views
+BAND_ANCILLARY = ['interpolators','gao_b_simu','hedley_slopes']
+
 class HyTools:
     """HyTools file object"""
 
+    # Pixel wise mask terms are evaluated on the requested slices, see
+    # masks.LazyMask
+    slice_masks = True
+
     def __init__(self):
         """Constructor method
         """
+        self.anc_files = {}
         self.anc_path = {}
         self.ancillary = {}
         self.bad_bands = []
+        self.band_views = {}
         self.bands = None
         self.base_key = None
         self.base_name = None
         self.brdf = {'type': None}
         self.glint= {'type': None}
         self.byte_order = None
+        self.chunk_lines = None
         self.columns = None
         self.corrections = []
+        self.counters = None
         self.crs = None
         self.data = None
         self.dtype = None
+        self.encoding = None
         self.endianness = None
         self.file_name = None
         self.file_type = None
+        self.footprint = None
         self.fwhm = []
         self.hdf_obj  = None
         self.interleave = None
+        self.last_view = None
         self.lines = None
         self.map_info = None
         self.mask = {}
+        self.mask_terms = {}
         self.no_data = None
+        self.no_data_code = None
         self.offset = 0
+        self.plans = {}
         self.projection = None
         self.resampler = {'type': None}
+        self.resamplers = OrderedDict()
+        self.scale_factor = None
+        self.scale_offsets = None
         self.shape = None
         self.topo = {'type': None}
+        self.transform = None
         self.ulx = None
         self.uly = None
         self.wavelength_units = None
         self.wavelengths = []
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Slice views are rebuilt on request
+        state['last_view'] = None
+        return state
+
     def read_file(self,file_name,file_type,anc_path = None):
+        if self.counters is not None:
+            start = time.perf_counter()
         self.file_name = file_name
         self.file_type = file_type
+        # Plans depend on the image dimensions, see plan_iteration
+        self.plans = {}
+        self.chunk_lines = None
 
         if file_type == 'envi':
             open_envi(self,anc_path)
@@ -91,9 +135,12 @@ class HyTools:
         else:
             print("Unrecognized file type.")
 
-        # Create a no data mask
-        self.mask['no_data'] = self.get_band(0) != self.no_data
+        # Create a no data mask and its valid footprint index
+        self.mask['no_data'] = PackedMask(self.get_band(0) != self.no_data)
+        self.footprint = Footprint(self.mask['no_data'])
         self.base_name = os.path.basename(os.path.splitext(self.file_name)[0])
+        if self.counters is not None:
+            self.counters.add('read_file',start)
 
     def create_bad_bands(self,bad_regions):
         """Create bad bands mask, Good: True, bad : False.
@@ -133,6 +180,7 @@ class HyTools:
             self.data = np.memmap(self.file_name,dtype = self.dtype, mode=mode,
                                   shape = self.shape,offset=self.offset)
         elif self.file_type  == "neon":
+            import h5py
             self.hdf_obj = h5py.File(self.file_name,'r')
             self.data = self.hdf_obj[self.base_key]["Reflectance"]["Reflectance_Data"]
 
@@ -148,21 +196,80 @@ class HyTools:
         self.data = None
 
 
-    def iterate(self,by,chunk_size= (100,100),corrections = [],resample=False):
+    def iterate(self,by,chunk_size= (100,100),corrections = [],resample=False,bands = None):
         """Create data Iterator.
 
         Args:
-            by (str): Dimension along which to iterate: "line","column","band","chunk".
+            by (str): Dimension along which to iterate: "line","column","band","chunk"
+                      or "auto", reading blocks of full width lines sized to a
+                      memory budget from the band count, data type,
+                      corrections and resampling (see misc.chunks). Full width
+                      lines are contiguous for every interleave, so "column"
+                      is never planned.
             chunk_size (tuple, optional): Two dimensional chunk size (Y,X).
                                           Applies only when "chunk" selected.
                                           Defaults to (100,100).
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                          band_selection. Defaults to None,
+                                          all bands.
 
         Returns:
             Iterator class object: Data Iterator.
 
         """
+        if by == "auto":
+            by,chunk_size = plan_iteration(self,corrections,resample,bands)
+
+        return Iterator(self,by,chunk_size,corrections =corrections,resample=resample,
+                        bands = bands)
+
+    def band_selection(self,bands):
+        """Return the band indices of a band selection.
+
+        Args:
+            bands (str, list, numpy.ndarray): 'good' for the good bands (see
+                                              create_bad_bands), a boolean band
+                                              mask or a list of band indices.
+
+        Returns:
+            numpy.ndarray: Band indices, None when all bands are selected in
+            file order.
+
+        """
+        if bands is None:
+            return None
+        if isinstance(bands,str):
+            if bands != 'good':
+                print("ERROR: Unrecognized band selection %s." % bands)
+                return None
+            bands = ~np.asarray(self.bad_bands,dtype = bool)
+        bands = np.asarray(bands)
+        if bands.dtype == bool:
+            bands = np.flatnonzero(bands)
+        bands = bands.astype(int)
+        if np.array_equal(bands,np.arange(self.bands)):
+            return None
+        return bands
+
+    def band_view(self,bands):
+        """Return a view of a selection of bands used to correct slices read
+        with the selection, views are kept until the correction settings
+        change.
 
-        return Iterator(self,by,chunk_size,corrections =corrections,resample=resample)
+        Args:
+            bands (numpy.ndarray): Band indices.
+
+        Returns:
+            BandView: Band view.
+
+        """
+        key = tuple(bands)
+        view = self.band_views.get(key)
+        settings = (self.topo,self.brdf,self.glint)
+        if (view is None) or any(a is not b for a,b in zip(view.settings,settings)):
+            view = BandView(self,bands)
+            self.band_views[key] = view
+        return view
 
     def wave_to_band(self,wave):
         """Return band index corresponding to input wavelength. Return closest band if
@@ -196,19 +303,25 @@ class HyTools:
 
         """
 
+        if self.counters is not None:
+            start = time.perf_counter()
         self.load_data()
         if self.file_type == "neon":
             band =  self.data[:,:,index]
         elif self.file_type == "envi":
             band = envi_read_band(self.data,index,self.interleave)
             if self.endianness != sys.byteorder:
-                band = band.byteswap()
+                band = self.byteswap(band)
+            if self.encoding is not None:
+                band = self.decode(band,index)
         self.close_data()
+        if self.counters is not None:
+            self.counters.add('read',start,read = band.nbytes,output = band)
 
         band = self.correct(band,'band',index,corrections)
 
         if mask:
-            band = band[self.mask[mask]]
+            band = mask_select(band,self.mask[mask])
 
         return band
 
@@ -235,94 +348,146 @@ class HyTools:
             band = self.get_band(band_num,corrections= corrections, mask=mask)
         return band
 
-    def get_pixels(self,lines,columns,corrections= [],resample = False):
+    def get_pixels(self,lines,columns,corrections= [],resample = False,bands = None):
         """
         Args:
             lines (list): List of zero-indexed line indices.
             columns (list): List of zero-indexed column indices.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    band_selection. Defaults to None, all
+                                    bands.
 
         Returns:
             numpy.ndarray: Pixel array (pixels,bands).
 
         """
 
+        bands = self.band_selection(bands)
+        if self.counters is not None:
+            start = time.perf_counter()
         self.load_data()
         if self.file_type == "neon":
             pixels = []
             for line,column in zip(lines,columns):
                 pixels.append(self.data[line,column,:])
             pixels = np.array(pixels)
+            if bands is not None:
+                pixels = pixels[:,bands]
         elif self.file_type == "envi":
-            pixels = envi_read_pixels(self.data,lines,columns,self.interleave)
+            pixels = envi_read_pixels(self.data,lines,columns,self.interleave,bands)
             if self.endianness != sys.byteorder:
-                pixels = pixels.byteswap()
+                pixels = self.byteswap(pixels)
+            if self.encoding is not None:
+                pixels = self.decode(pixels,bands)
         self.close_data()
+        if self.counters is not None:
+            self.counters.add('read',start,read = pixels.nbytes,output = pixels)
 
         pixels = self.correct(pixels,'pixels',
-                         [lines,columns],corrections)
+                         [lines,columns],corrections,bands)
 
         if resample:
-            pixels = pixels[np.newaxis,:,~self.bad_bands]
-            pixels = apply_resampler(self,pixels)[0,:,:]
+            pixels = self.resample(pixels,resample,bands)
 
         return pixels
 
-    def get_line(self,index, corrections= [],resample = False):
-        """
+    def get_line(self,index, corrections= [],resample = False,bands = None):
+        """Pixels outside the valid footprint are set to no data without
+        being read.
+
         Args:
             index (int): Zero-indexed line index.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    band_selection. Defaults to None, all
+                                    bands.
 
         Returns:
             numpy.ndarray: Line array (columns, bands).
 
         """
 
+        window = (0,self.columns,index,index+1)
+        span = self.valid_span(window)
+        if span != window:
+            line = self.fill_window(window,span,corrections,resample,bands)
+            return [data[0] for data in line] if isinstance(line,list) else line[0]
+
+        bands = self.band_selection(bands)
+        if self.counters is not None:
+            start = time.perf_counter()
         self.load_data()
         if self.file_type == "neon":
             line = self.data[index,:,:]
+            if bands is not None:
+                line = line[:,bands]
         elif self.file_type == "envi":
-            line = envi_read_line(self.data,index,self.interleave)
+            line = envi_read_line(self.data,index,self.interleave,bands)
             if self.endianness != sys.byteorder:
-                line = line.byteswap()
+                line = self.byteswap(line)
+            if self.encoding is not None:
+                line = self.decode(line,bands)
         self.close_data()
+        if self.counters is not None:
+            self.counters.add('read',start,read = line.nbytes,output = line)
 
-        line = self.correct(line,'line',index,corrections)
+        line = self.correct(line,'line',index,corrections,bands)
 
         if resample:
-            line = line[np.newaxis,:,~self.bad_bands]
-            line = apply_resampler(self,line)[0,:,:]
+            line = self.resample(line,resample,bands)
 
         return line
 
-    def get_column(self,index,corrections = [],resample = False):
-        """
+    def get_column(self,index,corrections = [],resample = False,bands = None):
+        """Pixels outside the valid footprint are set to no data without
+        being read.
+
         Args:
             index (int): Zero-indexed column index.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    band_selection. Defaults to None, all
+                                    bands.
 
         Returns:
             numpy.ndarray: Column array (lines, bands).
 
         """
 
+        window = (index,index+1,0,self.lines)
+        span = self.valid_span(window)
+        if span != window:
+            column = self.fill_window(window,span,corrections,resample,bands)
+            return [data[:,0] for data in column] if isinstance(column,list) else column[:,0]
+
+        bands = self.band_selection(bands)
+        if self.counters is not None:
+            start = time.perf_counter()
         self.load_data()
         if self.file_type == "neon":
             column = self.data[:,index,:]
+            if bands is not None:
+                column = column[:,bands]
         elif self.file_type == "envi":
-            column = envi_read_column(self.data,index,self.interleave)
+            column = envi_read_column(self.data,index,self.interleave,bands)
             if self.endianness != sys.byteorder:
-                column = column.byteswap()
+                column = self.byteswap(column)
+            if self.encoding is not None:
+                column = self.decode(column,bands)
         self.close_data()
+        if self.counters is not None:
+            self.counters.add('read',start,read = column.nbytes,output = column)
 
-        column = self.correct(column,'column',index,corrections)
+        column = self.correct(column,'column',index,corrections,bands)
 
         if resample:
-            column = column[:,np.newaxis,~self.bad_bands]
-            column = apply_resampler(self,column)[:,0,:]
+            column = self.resample(column,resample,bands)
 
         return column
 
-    def get_chunk(self,col_start,col_end,line_start,line_end, corrections= [],resample = False):
-        """
+    def get_chunk(self,col_start,col_end,line_start,line_end, corrections= [],resample = False,
+                  bands = None):
+        """Pixels outside the valid footprint are set to no data without
+        being read.
+
         Args:
             col_start (int): Chunk starting column.
             col_end (int): Noninclusive chunk ending column index.
@@ -330,40 +495,330 @@ class HyTools:
             line_end (int): Noninclusive chunk ending line index.
             corrections(list): Corrections to apply, will be applied in
             order listed.
-            resample (bool): Resample wavelengths. Defaults to False.
+            resample (bool, dict, list): Resample wavelengths, see
+                                    HyTools.resample. Defaults to False.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    band_selection. Defaults to None, all
+                                    bands.
 
         Returns:
             numpy.ndarray: Chunk array (line_end-line_start,col_end-col_start,bands).
 
         """
 
+        window = (col_start,col_end,line_start,line_end)
+        span = self.valid_span(window)
+        if span != window:
+            return self.fill_window(window,span,corrections,resample,bands)
+        return self.read_chunk(col_start,col_end,line_start,line_end,corrections,resample,bands)
+
+    def read_chunk(self,col_start,col_end,line_start,line_end, corrections= [],resample = False,
+                   bands = None):
+        """Read a chunk, including pixels outside the valid footprint, see
+        get_chunk.
+        """
+
+        bands = self.band_selection(bands)
+        if self.counters is not None:
+            start = time.perf_counter()
         self.load_data()
         if self.file_type == "neon":
             chunk = self.data[line_start:line_end,col_start:col_end,:]
+            # HDF chunks hold all bands, bands are selected in memory
+            if bands is not None:
+                chunk = chunk[:,:,bands]
         elif self.file_type == "envi":
             chunk =  envi_read_chunk(self.data,col_start,col_end,
-                                     line_start,line_end,self.interleave)
+                                     line_start,line_end,self.interleave,bands)
             if self.endianness != sys.byteorder:
-                chunk = chunk.byteswap()
+                chunk = self.byteswap(chunk)
+            if self.encoding is not None:
+                chunk = self.decode(chunk,bands)
         self.close_data()
+        if self.counters is not None:
+            self.counters.add('read',start,read = chunk.nbytes,output = chunk)
 
         chunk = self.correct(chunk,'chunk',
                         [col_start,col_end,line_start,line_end],
-                        corrections)
+                        corrections,bands)
         if resample:
-            chunk = apply_resampler(self,chunk[:,:,~self.bad_bands])
+            chunk = self.resample(chunk,resample,bands)
         return chunk
 
-    def correct(self,data,dimension,index,corrections):
+    def valid_span(self,window):
+        """Return the valid footprint span of a window (col_start,col_end,
+        line_start,line_end), None if the window holds no valid pixels.
+        """
+        if self.footprint is None:
+            return window
+        return self.footprint.window(*window)
+
+    def fill_value(self,dtype):
+        """Return the no data value of an array of a data type, no data
+        values which cannot be stored (ex. -9999 in an unsigned integer
+        array) are replaced as in encoded images, see
+        hytools.io.envi.no_data_code.
+
+        Args:
+            dtype (numpy.dtype): Array data type.
+
+        Returns:
+            No data value.
+
+        """
+        return no_data_code(dtype,self.no_data)
+
+    def fill_window(self,window,span,corrections = [],resample = False,bands = None):
+        """Read the valid span of a window, pixels outside the span are set
+        to no data. Windows without valid pixels are not read, a single
+        pixel is read to set the bands and data type of the output.
+
+        Args:
+            window (tuple): Window (col_start,col_end,line_start,line_end).
+            span (tuple): Valid span of the window, see valid_span.
+            corrections(list): Corrections to apply.
+            resample (bool, dict, list): Resample wavelengths, see
+                                    HyTools.resample.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    band_selection.
+
+        Returns:
+            numpy.ndarray or list: Window array(s) (lines,columns,bands).
+
+        """
+        col_start,col_end,line_start,line_end = window
+        empty = span is None
+        if empty:
+            span = (col_start,col_start+1,line_start,line_start+1)
+        data = self.read_chunk(*span,corrections,resample,bands)
+
+        def fill(data):
+            window_data = np.full((line_end-line_start,col_end-col_start,data.shape[-1]),
+                                  self.fill_value(data.dtype),dtype = data.dtype)
+            if not empty:
+                window_data[span[2]-line_start:span[3]-line_start,
+                            span[0]-col_start:span[1]-col_start] = data
+            return window_data
+
+        if isinstance(data,list):
+            return [fill(array) for array in data]
+        return fill(data)
+
+    def map_to_pixel(self,x,y):
+        """Convert map coordinates to image pixel coordinates.
+
+        Args:
+            x (float, numpy.ndarray): Map x coordinates.
+            y (float, numpy.ndarray): Map y coordinates.
+
+        Returns:
+            line (float, numpy.ndarray): Fractional line coordinates.
+            column (float, numpy.ndarray): Fractional column coordinates.
+
+        """
+        return map_to_pixel(self.transform,x,y)
+
+    def pixel_to_map(self,line,column):
+        """Convert image pixel coordinates to map coordinates, add 0.5 to
+        lines and columns for pixel centers.
+
+        Args:
+            line (float, numpy.ndarray): Line coordinates.
+            column (float, numpy.ndarray): Column coordinates.
+
+        Returns:
+            x (float, numpy.ndarray): Map x coordinates.
+            y (float, numpy.ndarray): Map y coordinates.
+
+        """
+        return pixel_to_map(self.transform,line,column)
+
+    def window_extent(self,xmin,ymin,xmax,ymax):
+        """Return the pixel extent of a map window, including all pixels
+        with centers inside the window. For rotated images this is the
+        extent of the rotated window.
+
+        Args:
+            xmin (float): Minimum map x coordinate.
+            ymin (float): Minimum map y coordinate.
+            xmax (float): Maximum map x coordinate.
+            ymax (float): Maximum map y coordinate.
+
+        Returns:
+            tuple: (col_start,col_end,line_start,line_end), None if the
+            window does not overlap the image.
+
+        """
+        lines,columns = self.map_to_pixel(np.array([xmin,xmax,xmax,xmin]),
+                                          np.array([ymax,ymax,ymin,ymin]))
+        col_start = max(int(np.ceil(columns.min()-0.5)),0)
+        col_end = min(int(np.floor(columns.max()-0.5))+1,self.columns)
+        line_start = max(int(np.ceil(lines.min()-0.5)),0)
+        line_end = min(int(np.floor(lines.max()-0.5))+1,self.lines)
+
+        if (col_start >= col_end) or (line_start >= line_end):
+            return None
+        return col_start,col_end,line_start,line_end
+
+    def get_window(self,xmin,ymin,xmax,ymax,corrections= [],resample = False,bands = None):
+        """Read the pixels inside a map window.
+
+        Args:
+            xmin (float): Minimum map x coordinate.
+            ymin (float): Minimum map y coordinate.
+            xmax (float): Maximum map x coordinate.
+            ymax (float): Maximum map y coordinate.
+            corrections(list): Corrections to apply, will be applied in
+            order listed.
+            resample (bool, dict, list): Resample wavelengths, see
+                                    HyTools.resample. Defaults to False.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    band_selection. Defaults to None, all
+                                    bands.
+
+        Returns:
+            numpy.ndarray: Window array (lines,columns,bands), None if
+            the window does not overlap the image. On rotated images
+            pixels outside the window are set to no data.
+
+        """
+        extent = self.window_extent(xmin,ymin,xmax,ymax)
+        if extent is None:
+            print("WARNING: Window does not overlap %s." % self.base_name)
+            return None
+        col_start,col_end,line_start,line_end = extent
+
+        window = self.get_chunk(col_start,col_end,line_start,line_end,
+                                corrections,resample,bands)
+
+        if (self.transform[2] != 0) or (self.transform[4] != 0):
+            line,column = np.mgrid[line_start:line_end,col_start:col_end] + 0.5
+            x,y = self.pixel_to_map(line,column)
+            outside = (x < xmin) | (x > xmax) | (y < ymin) | (y > ymax)
+            if isinstance(window,list):
+                for data in window:
+                    data[outside] = self.fill_value(data.dtype)
+            else:
+                window = np.array(window)
+                window[outside] = self.fill_value(window.dtype)
+        return window
+
+    def resample(self,data,resampler = True,bands = None):
+        """Resample the good bands of a data slice.
+
+        Args:
+            data (numpy.ndarray): Data slice, bands along last axis.
+            resampler (bool, dict, list): Resampler(s) to apply, True uses
+                                    the HyTools resampler. When a list of
+                                    resampler dictionaries is provided a
+                                    list of resampled slices is returned.
+            bands (numpy.ndarray, optional): Band indices of a slice read
+                                    with a band selection. Defaults to None,
+                                    all bands.
+
+        Returns:
+            numpy.ndarray or list: Resampled data slice(s).
+
+        """
+
+        if self.counters is not None:
+            start = time.perf_counter()
+
+        if bands is None:
+            data = data[...,~self.bad_bands]
+            good = ~self.bad_bands
+        else:
+            # Good bands of the selection, in wavelength order
+            keep = np.flatnonzero(~self.bad_bands[bands])
+            keep = keep[np.argsort(bands[keep])]
+            if not np.array_equal(keep,np.arange(len(bands))):
+                data = data[...,keep]
+            good = np.zeros(self.bands,dtype = bool)
+            good[bands[keep]] = True
+
+        if isinstance(resampler,list):
+            resampled = [apply_resampler(self,data,r,good) for r in resampler]
+        elif isinstance(resampler,dict):
+            resampled = apply_resampler(self,data,resampler,good)
+        else:
+            resampled = apply_resampler(self,data,bands = good)
+
+        if self.counters is not None:
+            self.counters.add('resample',start,output = resampled)
+        return resampled
+
+    def correct(self,data,dimension,index,corrections,bands = None):
+        # Slices read with a band selection are corrected on a band view
+        if (bands is not None) and (len(corrections) > 0):
+            return self.band_view(bands).correct(data,dimension,index,corrections)
+
+        view = None
         for correction in corrections:
+            if self.counters is not None:
+                start = time.perf_counter()
+
+            # Pixels are corrected on a pixel view unless full scene
+            # correction arrays have already been built
+            image,image_index = self,index
+            if (dimension == 'pixels') and (correction in SPARSE_CORRECTIONS) and \
+                ('apply_%s' % correction not in self.mask):
+                if view is None:
+                    view = PixelView(self,*index)
+                image,image_index = view,view.index
+
             if correction == 'topo':
-                data = apply_topo_correct(self,data,dimension,index)
+                data = apply_topo_correct(image,data,dimension,image_index)
             elif correction == 'brdf':
-                data = apply_brdf_correct(self,data,dimension,index)
+                data = apply_brdf_correct(image,data,dimension,image_index)
             elif correction == 'glint':
                 data = apply_glint_correct(self,data,dimension,index)
+            if self.counters is not None:
+                self.counters.add(correction,start,output = data)
+
+        # Interpolators do not depend on pixels and are kept for later calls
+        if (view is not None) and ('interpolators' in view.ancillary):
+            self.ancillary['interpolators'] = view.ancillary['interpolators']
+        return data
+
+    def byteswap(self,data):
+        """Swap the byte order of a slice read from a non native byte
+        order file.
+        """
+        if self.counters is None:
+            return data.byteswap()
+        start = time.perf_counter()
+        data = data.byteswap()
+        self.counters.add('byteswap',start,output = data)
         return data
 
+    def decode(self,data,band = None):
+        """Decode a slice read from a scaled integer or float16 encoded
+        image to float32, see hytools.io.envi.encode_header.
+
+        Args:
+            data (numpy.ndarray): Slice array, bands along the last axis.
+            band (int, list, optional): Band index of a single band slice or
+                                        band indices of the last axis.
+                                        Defaults to None, all bands.
+
+        Returns:
+            numpy.ndarray: Decoded slice.
+
+        """
+        if self.counters is not None:
+            start = time.perf_counter()
+        if self.encoding == 'scaled':
+            decoded = np.divide(data,np.float32(self.scale_factor),dtype = np.float32)
+            if self.scale_offsets.any():
+                decoded += self.scale_offsets if band is None else self.scale_offsets[band]
+        else:
+            decoded = data.astype(np.float32)
+        if self.no_data is not None:
+            np.copyto(decoded,np.float32(self.no_data),where = data == self.no_data_code)
+        if self.counters is not None:
+            self.counters.add('decode',start,output = decoded)
+        return decoded
+
     def get_anc(self,anc,radians = True,mask = None):
         """Read ancillary datasets to memory.
 
@@ -376,18 +831,19 @@ class HyTools:
 
         """
 
-        angular_anc = ['slope','sensor_az','sensor_zn','aspect','solar_zn','solar_az']
+        if self.counters is not None:
+            start = time.perf_counter()
 
         if self.file_type == "envi":
             ancillary = HyTools()
             ancillary.read_file(self.anc_path[anc][0],'envi')
             ancillary.load_data()
+            # Byte order is handled by the ancillary file object
             anc_data = np.copy(ancillary.get_band(self.anc_path[anc][1]))
-            if self.endianness != sys.byteorder:
-                anc_data = anc_data.byteswap()
             ancillary.close_data()
 
         else:
+            import h5py
             hdf_obj = h5py.File(self.file_name,'r')
             metadata = hdf_obj[self.base_key]["Reflectance"]["Metadata"]
             keys = self.anc_path[anc]
@@ -400,12 +856,136 @@ class HyTools:
                 anc_data = np.ones((self.lines, self.columns)) * anc_data
             hdf_obj.close()
 
-        if radians and (anc in angular_anc):
+        if self.counters is not None:
+            self.counters.add('ancillary',start,read = anc_data.nbytes,output = anc_data)
+
+        if radians and (anc in ANGULAR_ANC):
             anc_data= np.radians(anc_data)
 
 
         if mask:
-            anc_data = anc_data[self.mask[mask]]
+            anc_data = mask_select(anc_data,self.mask[mask])
+
+        return anc_data
+
+    def anc_file(self,file_name):
+        """Return an ENVI ancillary file object used to read pixels and
+        chunks. Only the header is parsed, the ancillary no data mask is
+        not needed. Objects are kept so each header is parsed once.
+        """
+        if file_name not in self.anc_files:
+            ancillary = HyTools()
+            ancillary.file_name = file_name
+            ancillary.file_type = 'envi'
+            open_envi(ancillary)
+            self.anc_files[file_name] = ancillary
+        return self.anc_files[file_name]
+
+    def get_anc_pixels(self,anc,lines,columns,radians = True):
+        """Read ancillary dataset values at a set of pixels.
+
+        Args:
+            anc (str): Ancillary dataset name.
+            lines (list, numpy.ndarray): Zero-indexed line indices.
+            columns (list, numpy.ndarray): Zero-indexed column indices.
+            radians (bool, optional): Convert angular measures to radians. Defaults to True.
+
+        Returns:
+            anc_data (numpy.ndarray): Pixel values (pixels,).
+
+        """
+
+        lines = np.asarray(lines,dtype = int)
+        columns = np.asarray(columns,dtype = int)
+
+        if self.counters is not None:
+            start = time.perf_counter()
+
+        if self.file_type == "envi":
+            ancillary = self.anc_file(self.anc_path[anc][0])
+            ancillary.load_data()
+            anc_data = envi_read_pixels(ancillary.data,lines,columns,ancillary.interleave)
+            anc_data = np.copy(anc_data[:,self.anc_path[anc][1]])
+            ancillary.close_data()
+            if ancillary.endianness != sys.byteorder:
+                anc_data = anc_data.byteswap()
+            if ancillary.encoding is not None:
+                anc_data = ancillary.decode(anc_data,self.anc_path[anc][1])
+
+        else:
+            import h5py
+            hdf_obj = h5py.File(self.file_name,'r')
+            metadata = hdf_obj[self.base_key]["Reflectance"]["Metadata"]
+            keys = self.anc_path[anc]
+            for key in keys:
+                metadata = metadata[key]
+
+            if anc in ['solar_zn','solar_az']:
+                anc_data = np.ones(len(lines)) * metadata[()]
+            else:
+                # Read each requested line once
+                rows = np.unique(lines)
+                anc_data = metadata[rows,:][np.searchsorted(rows,lines),columns]
+            hdf_obj.close()
+
+        if self.counters is not None:
+            self.counters.add('ancillary',start,read = anc_data.nbytes,output = anc_data)
+
+        if radians and (anc in ANGULAR_ANC):
+            anc_data= np.radians(anc_data)
+
+        return anc_data
+
+    def get_anc_chunk(self,anc,col_start,col_end,line_start,line_end,radians = True):
+        """Read a chunk of an ancillary dataset.
+
+        Args:
+            anc (str): Ancillary dataset name.
+            col_start (int): Chunk starting column.
+            col_end (int): Noninclusive chunk ending column index.
+            line_start (int): Chunk starting line.
+            line_end (int): Noninclusive chunk ending line index.
+            radians (bool, optional): Convert angular measures to radians. Defaults to True.
+
+        Returns:
+            anc_data (numpy.ndarray): Chunk array (lines,columns).
+
+        """
+
+        if self.counters is not None:
+            start = time.perf_counter()
+
+        if self.file_type == "envi":
+            ancillary = self.anc_file(self.anc_path[anc][0])
+            ancillary.load_data()
+            anc_data = envi_read_chunk(ancillary.data,col_start,col_end,line_start,line_end,
+                                       ancillary.interleave,[self.anc_path[anc][1]])
+            anc_data = np.copy(anc_data[:,:,0])
+            ancillary.close_data()
+            if ancillary.endianness != sys.byteorder:
+                anc_data = anc_data.byteswap()
+            if ancillary.encoding is not None:
+                anc_data = ancillary.decode(anc_data,self.anc_path[anc][1])
+
+        else:
+            import h5py
+            hdf_obj = h5py.File(self.file_name,'r')
+            metadata = hdf_obj[self.base_key]["Reflectance"]["Metadata"]
+            keys = self.anc_path[anc]
+            for key in keys:
+                metadata = metadata[key]
+
+            if anc in ['solar_zn','solar_az']:
+                anc_data = np.ones((line_end-line_start,col_end-col_start)) * metadata[()]
+            else:
+                anc_data = metadata[line_start:line_end,col_start:col_end]
+            hdf_obj.close()
+
+        if self.counters is not None:
+            self.counters.add('ancillary',start,read = anc_data.nbytes,output = anc_data)
+
+        if radians and (anc in ANGULAR_ANC):
+            anc_data= np.radians(anc_data)
 
         return anc_data
 
@@ -461,7 +1041,7 @@ class HyTools:
         ndi = (wave1-wave2)/(wave1+wave2)
 
         if mask:
-            ndi = ndi[self.mask[mask]]
+            ndi = mask_select(ndi,self.mask[mask])
         return ndi
 
 
@@ -469,25 +1049,70 @@ class HyTools:
         """Generate mask using masking function which takes a HyTools object as
         an argument.
         """
-        self.mask[name] = mask
+        self.mask[name] = self.pack_mask(mask)
 
     def gen_mask(self,masker,name,args = None):
         """Generate mask using masking function which takes a HyTools object as
         an argument.
         """
+        if self.counters is not None:
+            start = time.perf_counter()
         if args:
-            self.mask[name] = masker(self,args)
+            self.mask[name] = self.pack_mask(masker(self,args))
         else:
-            self.mask[name] = masker(self)
+            self.mask[name] = self.pack_mask(masker(self))
+        if self.counters is not None:
+            self.counters.add('mask',start)
+
+    def slice_view(self,window = None,pixels = None):
+        """Return a view of a window or a set of pixels of the image, used
+        to evaluate pixel wise mask terms of lines, columns, chunks and
+        pixels. The last view is kept so terms shared by several masks are
+        evaluated once per slice.
+
+        Args:
+            window (tuple, optional): Window (col_start,col_end,line_start,line_end).
+            pixels (list, optional): Zero-indexed line and column indices.
+
+        Returns:
+            WindowView or PixelView: View of the slice.
+
+        """
+        if window is not None:
+            key = ('window',) + tuple(window)
+        else:
+            key = ('pixels',) + tuple(np.asarray(index).tobytes() for index in pixels)
+
+        if (self.last_view is None) or (self.last_view[0] != key):
+            if window is not None:
+                view = WindowView(self,*window)
+            else:
+                view = PixelView(self,*pixels)
+            self.last_view = (key,view)
+        return self.last_view[1]
+
+    def pack_mask(self,mask):
+        """Store full image boolean masks bit-packed.
+        """
+        if isinstance(mask,np.ndarray) and (mask.dtype == bool) and \
+            (mask.shape == (self.lines,self.columns)):
+            return PackedMask(mask)
+        return mask
 
     def do(self,function,args = None):
         """Run a function and return the results.
 
         """
+        counters = self.counters
+        if counters is not None:
+            start = time.perf_counter()
         if args:
-            return function(self, args)
+            result = function(self, args)
         else:
-            return function(self)
+            result = function(self)
+        if counters is not None:
+            counters.add('do:%s' % function.__name__,start)
+        return result
 
 
     def get_header(self):
@@ -510,16 +1135,316 @@ class HyTools:
                 self.topo = json.load(outfile, cls =Decoder)
 
 
+class PixelView(HyTools):
+    """Pixels of an image viewed as a single line image.
+
+    Ancillary datasets, bands and pixel wise mask terms are read only at
+    the viewed pixels, so correctors evaluate kernels, incidence angles,
+    NDVI and masks without building full scene arrays. Mask terms which
+    depend on neighbouring pixels are taken from the full image.
+
+    """
+
+    slice_masks = False
+
+    def __init__(self,hy_obj,lines,columns):
+        """
+        Args:
+            hy_obj (HyTools file object): Image.
+            lines (list, numpy.ndarray): Zero-indexed line indices.
+            columns (list, numpy.ndarray): Zero-indexed column indices.
+
+        Returns:
+            None.
+
+        """
+        super().__init__()
+        for key,value in hy_obj.__dict__.items():
+            if key not in ['ancillary','data','footprint','hdf_obj','last_view','mask','mask_terms']:
+                setattr(self,key,value)
+
+        self.image = hy_obj
+        self.pixel_lines = np.asarray(lines,dtype = int)
+        self.pixel_columns = np.asarray(columns,dtype = int)
+        self.lines,self.columns = 1,len(self.pixel_lines)
+        # Pixel index of the viewed pixels
+        self.index = [np.zeros(self.columns,dtype = int),np.arange(self.columns)]
+
+        self.mask['no_data'] = self.view_mask(hy_obj.mask['no_data'])
+        if 'interpolators' in hy_obj.ancillary:
+            self.ancillary['interpolators'] = hy_obj.ancillary['interpolators']
+        self.anc_cache = {}
+        self.pixels = None
+
+    def view_mask(self,mask):
+        """Subset a full image mask to the viewed pixels.
+        """
+        return PackedMask(np.asarray(mask[self.pixel_lines,self.pixel_columns])[np.newaxis])
+
+    def get_anc(self,anc,radians = True,mask = None):
+        """Read ancillary dataset values at the viewed pixels.
+        """
+        if (anc,radians) not in self.anc_cache:
+            self.anc_cache[(anc,radians)] = self.image.get_anc_pixels(anc,self.pixel_lines,
+                                                                     self.pixel_columns,
+                                                                     radians)[np.newaxis]
+        anc_data = self.anc_cache[(anc,radians)]
+        if mask:
+            anc_data = mask_select(anc_data,self.mask[mask])
+        return anc_data
+
+    def get_band(self,index,corrections= [], mask =None):
+        """Read a band at the viewed pixels.
+        """
+        if self.pixels is None:
+            self.pixels = self.image.get_pixels(self.pixel_lines,self.pixel_columns)
+        band = np.copy(self.pixels[np.newaxis,:,index])
+        band = self.correct(band,'band',index,corrections)
+        if mask:
+            band = mask_select(band,self.mask[mask])
+        return band
+
+    def gen_mask(self,masker,name,args = None):
+        """Generate mask, mask terms which are not pixel wise are subset
+        from the full image.
+        """
+        if isinstance(args,list):
+            for mask_name,mask_args in args:
+                if mask_name not in PIXEL_MASKS:
+                    key = mask_key(self,mask_name,mask_args)
+                    self.mask_terms[key] = self.view_mask(mask_term(self.image,mask_name,mask_args))
+        super().gen_mask(masker,name,args)
+
+
+class WindowView(HyTools):
+    """Window of an image viewed as an image.
+
+    Ancillary datasets and bands are read only within the window, so
+    pixel wise mask terms of lines, columns and chunks are evaluated
+    without building full scene arrays.
+
+    """
+
+    slice_masks = False
+
+    def __init__(self,hy_obj,col_start,col_end,line_start,line_end):
+        """
+        Args:
+            hy_obj (HyTools file object): Image.
+            col_start (int): Window starting column.
+            col_end (int): Noninclusive window ending column index.
+            line_start (int): Window starting line.
+            line_end (int): Noninclusive window ending line index.
+
+        Returns:
+            None.
+
+        """
+        super().__init__()
+        for key,value in hy_obj.__dict__.items():
+            if key not in ['ancillary','data','footprint','hdf_obj','last_view','mask','mask_terms']:
+                setattr(self,key,value)
+
+        self.image = hy_obj
+        self.window = (col_start,col_end,line_start,line_end)
+        self.lines,self.columns = line_end-line_start,col_end-col_start
+        self.mask['no_data'] = PackedMask(hy_obj.mask['no_data'][line_start:line_end,col_start:col_end])
+        self.anc_cache = {}
+        self.band_cache = {}
+
+    def get_anc(self,anc,radians = True,mask = None):
+        """Read ancillary dataset values within the window.
+        """
+        if (anc,radians) not in self.anc_cache:
+            self.anc_cache[(anc,radians)] = self.image.get_anc_chunk(anc,*self.window,radians)
+        anc_data = self.anc_cache[(anc,radians)]
+        if mask:
+            anc_data = mask_select(anc_data,self.mask[mask])
+        return anc_data
+
+    def get_band(self,index,corrections= [], mask =None):
+        """Read a band within the window.
+        """
+        if index not in self.band_cache:
+            if self.file_type == "neon":
+                # HDF chunks hold all bands, the window is read once
+                chunk = self.image.read_chunk(*self.window)
+                self.band_cache = {band: chunk[:,:,band] for band in range(self.bands)}
+            else:
+                self.band_cache[index] = self.image.read_chunk(*self.window,bands = [index])[:,:,0]
+        band = np.copy(self.band_cache[index])
+        band = self.correct(band,'band',index,corrections)
+        if mask:
+            band = mask_select(band,self.mask[mask])
+        return band
+
+
+class BandView(HyTools):
+    """Selected bands of an image viewed as an image with fewer bands.
+
+    Wavelengths, bad bands and band indexed correction coefficients are
+    subset to the viewed bands, so correctors apply to slices read with a
+    band selection. Wavelength lookups, masks and band independent
+    ancillary datasets are computed on the image with all of its bands,
+    band dependent ancillary datasets are subset from the image's.
+
+    """
+
+    def __init__(self,hy_obj,bands):
+        """
+        Args:
+            hy_obj (HyTools file object): Image.
+            bands (numpy.ndarray): Band indices.
+
+        Returns:
+            None.
+
+        """
+        super().__init__()
+        for key,value in hy_obj.__dict__.items():
+            if key not in ['ancillary','band_views','data','hdf_obj','mask','mask_terms']:
+                setattr(self,key,value)
+
+        self.image = hy_obj
+        self.band_index = bands
+        self.bands = len(bands)
+        self.bad_bands = np.asarray(hy_obj.bad_bands)[bands]
+        self.wavelengths = np.asarray(hy_obj.wavelengths)[bands]
+        if len(hy_obj.fwhm) == hy_obj.bands:
+            self.fwhm = np.asarray(hy_obj.fwhm)[bands]
+
+        self.settings = (hy_obj.topo,hy_obj.brdf,hy_obj.glint)
+        self.topo = self.view_coeffs(hy_obj.topo)
+        self.brdf = self.view_coeffs(hy_obj.brdf)
+        self.glint = dict(hy_obj.glint)
+        # Image masks and ancillary datasets present after the last prime
+        self.primed = None
+
+    def view_coeffs(self,correction):
+        """Copy a correction dictionary with band coefficients keyed by
+        view band index.
+        """
+        correction = dict(correction)
+        if 'coeffs' in correction:
+            position = {band: i for i,band in enumerate(self.band_index)}
+            correction['coeffs'] = {position[int(band)]: coeffs
+                                    for band,coeffs in correction['coeffs'].items()
+                                    if int(band) in position}
+        return correction
+
+    def view_ancillary(self,key,value):
+        """Subset a band dependent image ancillary dataset to the viewed
+        bands, band independent datasets are shared.
+        """
+        if key not in BAND_ANCILLARY:
+            return value
+        # Interpolators are keyed by band, other datasets have bands
+        # along the last axis
+        if isinstance(value,dict):
+            return {i: value[band] for i,band in enumerate(self.band_index)
+                    if band in value}
+        return value[...,self.band_index]
+
+    def prime(self,corrections):
+        """Build the masks and ancillary datasets of the corrections on the
+        image by correcting a single pixel of all bands.
+        """
+        image = self.image
+        if (self.primed is not None) and (self.primed[0] == tuple(corrections)) and \
+            self.primed[1] <= set(image.ancillary) | set(image.mask):
+            return
+        counters,image.counters = image.counters,None
+        try:
+            image.correct(np.zeros((1,1,image.bands),dtype = np.float32),
+                          'chunk',[0,1,0,1],corrections)
+        finally:
+            image.counters = counters
+        self.primed = (tuple(corrections),set(image.ancillary) | set(image.mask))
+
+    def correct(self,data,dimension,index,corrections,bands = None):
+        """Correct a slice of the viewed bands. Pixels are corrected as
+        full spectra on the image, so pixel views of the image are used.
+        Other slices are corrected on the view once the image has built
+        the masks and ancillary datasets of the corrections.
+        """
+        image = self.image
+        if dimension == 'pixels':
+            # Correctors do not combine bands, other bands are left at zero
+            spectra = np.zeros(data.shape[:-1] + (image.bands,),dtype = data.dtype)
+            spectra[...,self.band_index] = data
+            return image.correct(spectra,dimension,index,corrections)[...,self.band_index]
+
+        self.prime(corrections)
+        self.mask,self.mask_terms = image.mask,image.mask_terms
+        self.ancillary = {key: self.view_ancillary(key,value)
+                          for key,value in image.ancillary.items()}
+        return super().correct(data,dimension,index,corrections)
+
+    def get_wave(self,wave,corrections= [],mask =None):
+        """Read the image band closest to a wavelength, wavelengths are
+        looked up in all image bands.
+        """
+        return self.image.get_wave(wave,corrections,mask)
+
+    def wave_to_band(self,wave):
+        """Return the image band index closest to a wavelength.
+        """
+        return self.image.wave_to_band(wave)
+
+    def ndi(self,wave1= 850,wave2 = 660,mask = None):
+        """Calculate a normalized difference index from image bands.
+        """
+        return self.image.ndi(wave1,wave2,mask)
+
+    def gen_mask(self,masker,name,args = None):
+        """Generate an image mask.
+        """
+        self.image.gen_mask(masker,name,args)
+        self.mask = self.image.mask
+
+    def get_band(self,index,corrections= [], mask =None):
+        """Read a viewed band.
+        """
+        return self.image.get_band(self.band_index[index],corrections,mask)
+
+    def get_pixels(self,lines,columns,corrections= [],resample = False,bands = None):
+        """Read the viewed bands of a set of pixels.
+        """
+        return self.image.get_pixels(lines,columns,corrections,resample,self.band_index)
+
+    def get_line(self,index, corrections= [],resample = False,bands = None):
+        """Read the viewed bands of a line.
+        """
+        return self.image.get_line(index,corrections,resample,self.band_index)
+
+    def get_column(self,index,corrections = [],resample = False,bands = None):
+        """Read the viewed bands of a column.
+        """
+        return self.image.get_column(index,corrections,resample,self.band_index)
+
+    def get_chunk(self,col_start,col_end,line_start,line_end, corrections= [],resample = False,
+                  bands = None):
+        """Read the viewed bands of a chunk.
+        """
+        return self.image.get_chunk(col_start,col_end,line_start,line_end,
+                                    corrections,resample,self.band_index)
+
+
 class Iterator:
     """Iterator class
     """
 
-    def __init__(self,hy_obj,by,chunk_size = None,corrections = [],resample = False):
+    def __init__(self,hy_obj,by,chunk_size = None,corrections = [],resample = False,
+                 bands = None):
         """
         Args:
             hy_obj (Hytools object): Populated Hytools file object.
             by (str): Iterator slice dimension: "line", "column", "band"",chunk".
             chunk_size (tuple, optional): Chunk size. Defaults to None.
+            bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                    HyTools.band_selection. Band iterators
+                                    return only the selected bands. Defaults
+                                    to None, all bands.
 
         Iterator cannot be pickled when reading HDF files.
 
@@ -537,11 +1462,14 @@ class Iterator:
         self.hy_obj = hy_obj
         self.resample = resample
         self.corrections = corrections
+        self.bands = hy_obj.band_selection(bands)
 
 
     def read_next(self):
         """ Return next line/column/band/chunk.
         """
+        if self.hy_obj.counters is not None:
+            start = time.perf_counter()
 
         if self.by == "line":
             self.current_line +=1
@@ -549,19 +1477,25 @@ class Iterator:
                 self.complete = True
             subset = self.hy_obj.get_line(self.current_line,
                                             corrections =self.corrections,
-                                            resample = self.resample)
+                                            resample = self.resample,
+                                            bands = self.bands)
         elif self.by == "column":
             self.current_column +=1
             if self.current_column == self.hy_obj.columns-1:
                 self.complete = True
             subset = self.hy_obj.get_column(self.current_column,
                                             corrections =self.corrections,
-                                            resample = self.resample)
+                                            resample = self.resample,
+                                            bands = self.bands)
         elif self.by == "band":
             self.current_band +=1
-            if self.current_band == self.hy_obj.bands-1:
+            if self.bands is None:
+                band,bands = self.current_band,self.hy_obj.bands
+            else:
+                band,bands = self.bands[self.current_band],len(self.bands)
+            if self.current_band == bands-1:
                 self.complete = True
-            subset = self.hy_obj.get_band(self.current_band,
+            subset = self.hy_obj.get_band(band,
                                             corrections =self.corrections)
 
         elif self.by == "chunk":
@@ -588,7 +1522,11 @@ class Iterator:
 
             subset = self.hy_obj.get_chunk(x_start,x_end, y_start,y_end,
                                             corrections =self.corrections,
-                                            resample = self.resample)
+                                            resample = self.resample,
+                                            bands = self.bands)
+
+        if self.hy_obj.counters is not None:
+            self.hy_obj.counters.add('iterate',start)
         return subset
 
     def reset(self):
@@ -20,12 +20,13 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
     BRDF Correction
 """
 import json
-import ray
+from ..parallel.executors import call,call_each
 import numpy as np
 from .universal import universal_brdf,apply_universal
 from .flex import flex_brdf,apply_flex
 from ..masks import mask_create
-from ..misc import set_brdf, update_brdf
+from ..misc import set_brdf, update_brdf, add_correction, get_attribute
+from ..misc import image_state,coeff_key,cache_load,cache_save
 
 def apply_brdf_correct(hy_obj,data,dimension,index):
     ''' Apply in memory BRDF correction.
@@ -55,42 +56,63 @@ def calc_brdf_coeffs(actors,config_dict):
 
     if brdf_dict['type'] == 'precomputed':
         print("Using precomputed BRDF coefficients")
-        _ = ray.get([a.do.remote(load_brdf_precomputed,
-                                 config_dict['brdf']) for a in actors])
+        _ = call(actors,'do',load_brdf_precomputed,
+                 config_dict['brdf'])
     else:
-        # Set BRDF dict
-        _ = ray.get([a.do.remote(set_brdf,brdf_dict) for a in actors])
-
-        # Create masks used for calculating coefficients
-        _ = ray.get([a.gen_mask.remote(mask_create,'calc_brdf',
-                                       brdf_dict['calc_mask']) for a in actors])
-        # Calculate mean solar zenith
-        if isinstance(brdf_dict['solar_zn_type'],str):
-
-            # Assign per line mean solar zenith
-            solar_zn_samples = ray.get([a.do.remote(set_solar_zn) for a in actors])
-            # Calculate and assign scene average solar zenith
-            if brdf_dict['solar_zn_type'] == 'scene':
-                scene_mean = float(np.mean(solar_zn_samples))
-                _ =  ray.get([a.do.remote(update_brdf,{'key':'solar_zn_norm_radians',
-                                                      'value': scene_mean }) for a in actors])
-                print("Scene average solar zenith angle : %s degrees" % round(np.degrees(scene_mean),3))
-
-        elif isinstance(brdf_dict['solar_zn_type'],float):
-            _ =  ray.get([a.do.remote(update_brdf,{'key':'solar_zn_norm_radians',
-                                                   'value': brdf_dict['solar_zn_type']}) for a in actors])
+        # Group fits, and fits normalized to the scene average solar
+        # zenith, are cached on the full image set
+        states = call(actors,'do',image_state)
+        if brdf_dict['grouped'] or (brdf_dict['solar_zn_type'] == 'scene'):
+            keys = [coeff_key('brdf',states,brdf_dict)]*len(actors)
         else:
-            print('Unrecognized solar zenith angle normalization')
-
-        print("Calculating BRDF coefficients")
-        if brdf_dict['type']== 'universal':
-            universal_brdf(actors,config_dict)
-        elif brdf_dict['type'] == 'flex':
-            flex_brdf(actors,config_dict)
-        elif brdf_dict['type'] == 'local':
-            print('Local/class BRDF correction....under development')
-
-    _ = ray.get([a.do.remote(lambda x: x.corrections.append('brdf')) for a in actors])
+            keys = [coeff_key('brdf',[state],brdf_dict) for state in states]
+        cached = [cache_load(key) for key in keys]
+        hits = [i for i,coeffs in enumerate(cached) if coeffs is not None]
+        if len(hits) > 0:
+            print("Using cached BRDF coefficients for %s of %s images." % (len(hits),len(actors)))
+            _ = call_each([actors[i] for i in hits],'do',[set_brdf]*len(hits),
+                          [cached[i] for i in hits])
+
+        calc_actors = [actor for i,actor in enumerate(actors) if i not in hits]
+        calc_keys = [key for i,key in enumerate(keys) if i not in hits]
+
+        if len(calc_actors) > 0:
+            # Set BRDF dict
+            _ = call(calc_actors,'do',set_brdf,brdf_dict)
+
+            # Create masks used for calculating coefficients
+            _ = call(calc_actors,'gen_mask',mask_create,'calc_brdf',
+                     brdf_dict['calc_mask'])
+            # Calculate mean solar zenith
+            if isinstance(brdf_dict['solar_zn_type'],str):
+
+                # Assign per line mean solar zenith
+                solar_zn_samples = call(calc_actors,'do',set_solar_zn)
+                # Calculate and assign scene average solar zenith
+                if brdf_dict['solar_zn_type'] == 'scene':
+                    scene_mean = float(np.mean(solar_zn_samples))
+                    _ =  call(calc_actors,'do',update_brdf,{'key':'solar_zn_norm_radians',
+                              'value': scene_mean })
+                    print("Scene average solar zenith angle : %s degrees" % round(np.degrees(scene_mean),3))
+
+            elif isinstance(brdf_dict['solar_zn_type'],float):
+                _ =  call(calc_actors,'do',update_brdf,{'key':'solar_zn_norm_radians',
+                          'value': brdf_dict['solar_zn_type']})
+            else:
+                print('Unrecognized solar zenith angle normalization')
+
+            print("Calculating BRDF coefficients")
+            if brdf_dict['type']== 'universal':
+                universal_brdf(calc_actors,config_dict)
+            elif brdf_dict['type'] == 'flex':
+                flex_brdf(calc_actors,config_dict)
+            elif brdf_dict['type'] == 'local':
+                print('Local/class BRDF correction....under development')
+
+            for key,coeffs in zip(calc_keys,call(calc_actors,'do',get_attribute,'brdf')):
+                cache_save(key,coeffs)
+
+    _ = call(actors,'do',add_correction,'brdf')
 
 
 
@@ -25,12 +25,12 @@ Equations and constants can be found in the following papers:
 """
 
 import numpy as np
-import ray
-from scipy.interpolate import interp1d
+from ..parallel.executors import call
 from .kernels import calc_volume_kernel,calc_geom_kernel
 from ..masks import mask_create
 from ..misc import progbar, pairwise
-from ..misc import update_brdf
+from ..misc import update_brdf,get_attribute
+from ..misc import sketch_image, merge_sketches
 
 
 def flex_brdf(actors,config_dict):
@@ -38,7 +38,7 @@ def flex_brdf(actors,config_dict):
     if brdf_dict['grouped']:
         actors = calc_flex_group(actors,brdf_dict)
     else:
-        _ = ray.get([a.do.remote(calc_flex_single,brdf_dict) for a in actors])
+        _ = call(actors,'do',calc_flex_single,brdf_dict)
 
 
 def ndvi_stratify(hy_obj):
@@ -62,7 +62,16 @@ def ndvi_stratify(hy_obj):
     hy_obj.ancillary['ndvi_classes'] = class_mask
 
 
-def ndvi_2nd_split(ndvi_bins_dynamic, all_ndvi_array, ndvi_bin_range_thres=0.15):
+def ndvi_sketch(hy_obj):
+    '''Summarize image NDVI values with a quantile sketch, updated
+    chunk by chunk
+    '''
+    bands = [hy_obj.wave_to_band(850),hy_obj.wave_to_band(660)]
+    def ndvi(chunk):
+        return (chunk[:,:,0]-chunk[:,:,1])/(chunk[:,:,0]+chunk[:,:,1])
+    return sketch_image(hy_obj,ndvi,bands,mask = hy_obj.mask['no_data'])
+
+def ndvi_2nd_split(ndvi_bins_dynamic, ndvi_sketch, ndvi_bin_range_thres=0.15):
     ''' Perform a second NDVI split
     '''
 
@@ -75,29 +84,33 @@ def ndvi_2nd_split(ndvi_bins_dynamic, all_ndvi_array, ndvi_bin_range_thres=0.15)
     if bin_for_split.shape[0]>0:
         for bin_id in bin_for_split:
             # Use median of the bin as the new break point
-            new_break += [np.median(all_ndvi_array[(all_ndvi_array >  ndvi_bins_dynamic[bin_id]) & (all_ndvi_array < ndvi_bins_dynamic[bin_id+1])]).astype(np.float64)]
+            new_break += [float(ndvi_sketch.median_between(ndvi_bins_dynamic[bin_id],
+                                                           ndvi_bins_dynamic[bin_id+1]))]
 
     # New list of bin break points
     ndvi_bins_dynamic = sorted(ndvi_bins_dynamic + new_break)
 
     return ndvi_bins_dynamic
 
-def ndvi_bins(ndvi,brdf_dict):
-    '''Calculate NDVI bin extents
+def ndvi_bins(ndvi_sketch,brdf_dict):
+    '''Calculate NDVI bin extents from a sketch of NDVI values
     '''
     perc_range = brdf_dict['ndvi_perc_max'] - brdf_dict['ndvi_perc_min'] + 1
+    percentiles = np.arange(brdf_dict['ndvi_perc_min'],
+                            brdf_dict['ndvi_perc_max'] + 1,
+                            perc_range / (brdf_dict['num_bins'] - 1))
+
+    # Percentiles of positive NDVI values
+    positive_start = ndvi_sketch.cdf(0)
+    ndvi_break_dyn_bin = ndvi_sketch.quantile(positive_start + (1-positive_start)*percentiles/100)
 
-    ndvi_break_dyn_bin = np.percentile(ndvi[ndvi > 0],
-                                       np.arange(brdf_dict['ndvi_perc_min'],
-                                                brdf_dict['ndvi_perc_max'] + 1,
-                                                perc_range / (brdf_dict['num_bins'] - 1)))
     ndvi_thres = [brdf_dict['ndvi_bin_min']]
     ndvi_thres += ndvi_break_dyn_bin.tolist()
     ndvi_thres += [brdf_dict['ndvi_bin_max']]
     ndvi_thres = sorted(list(set(ndvi_thres)))
 
     # Do a second split of the NDVI dins
-    ndvi_thres = ndvi_2nd_split(ndvi_thres, ndvi)
+    ndvi_thres = ndvi_2nd_split(ndvi_thres, ndvi_sketch)
 
     bins = [[x,y] for x,y in pairwise(ndvi_thres)]
     return bins
@@ -130,7 +143,7 @@ def calc_flex_single(hy_obj,brdf_dict):
 
     # Determine bin dimensions and create class mask
     if hy_obj.brdf['bin_type'] == 'dynamic':
-        bins = ndvi_bins(hy_obj.ndi()[hy_obj.mask['no_data']],brdf_dict)
+        bins = ndvi_bins(ndvi_sketch(hy_obj),brdf_dict)
         #Update number of bins
         hy_obj.brdf['num_bins'] = len(bins)
     else:
@@ -148,7 +161,7 @@ def calc_flex_single(hy_obj,brdf_dict):
             coeffs= []
 
             for bin_num in hy_obj.brdf['bins']:
-                bin_mask = [kernel_samples[:,3] == bin_num]
+                bin_mask = kernel_samples[:,3] == bin_num
                 X = kernel_samples[:,:3][bin_mask]
                 y = band_samples[bin_mask]
                 coeffs.append(np.linalg.lstsq(X, y,rcond=-1)[0].flatten().tolist())
@@ -157,42 +170,40 @@ def calc_flex_single(hy_obj,brdf_dict):
 def calc_flex_group(actors,brdf_dict):
     ''' Calculate BRDF coefficents for a group of images
     '''
-    # Aggregate NDVI values from images
-    ndvi = ray.get([a.ndi.remote(mask = 'no_data') for a in actors])
-    ndvi = np.concatenate([n.flatten() for n in ndvi])
-
     # Determine bin dimensions
     if  brdf_dict['bin_type'] == 'dynamic':
-        bins = ndvi_bins(ndvi,brdf_dict)
+        # Merge NDVI sketches from images
+        sketches = call(actors,'do',ndvi_sketch)
+        bins = ndvi_bins(merge_sketches(sketches),brdf_dict)
         #Update number of bins
-        _ = ray.get([a.do.remote(update_brdf,{'key':'num_bins',
-                                              'value': len(bins)}) for a in actors])
+        _ = call(actors,'do',update_brdf,{'key':'num_bins',
+                 'value': len(bins)})
     else:
         bins = brdf_dict['bins']
 
     bins  = {k:v for (k,v) in enumerate(bins,start=1)}
 
     #Update BRDF coeffs
-    _ = ray.get([a.do.remote(update_brdf,{'key':'bins',
-                                          'value': bins}) for a in actors])
+    _ = call(actors,'do',update_brdf,{'key':'bins',
+             'value': bins})
 
     #Create NDVI class mask and sample kernels
-    _ = ray.get([a.do.remote(ndvi_stratify) for a in actors])
-    kernel_samples = ray.get([a.do.remote(get_kernel_samples) for a in actors])
+    _ = call(actors,'do',ndvi_stratify)
+    kernel_samples = call(actors,'do',get_kernel_samples)
     kernel_samples = np.concatenate(kernel_samples)
 
-    bad_bands = ray.get(actors[0].do.remote(lambda x: x.bad_bands))
+    bad_bands = call(actors[:1],'do',get_attribute,'bad_bands')[0]
     coeffs = {}
 
     for band_num,band in enumerate(bad_bands):
         if ~band:
             coeffs[band_num] = {}
-            band_samples = ray.get([a.do.remote(get_band_samples,
-                                     {'band_num':band_num}) for a in actors])
+            band_samples = call(actors,'do',get_band_samples,
+                                {'band_num':band_num})
             band_samples = np.concatenate(band_samples)
             band_coeffs= []
             for bin_num in bins:
-                bin_mask = [kernel_samples[:,3] == bin_num]
+                bin_mask = kernel_samples[:,3] == bin_num
                 X = kernel_samples[:,:3][bin_mask]
                 y = band_samples[bin_mask]
                 band_coeffs.append(np.linalg.lstsq(X, y,rcond=-1)[0].flatten().tolist())
@@ -202,8 +213,8 @@ def calc_flex_group(actors,brdf_dict):
     print('\n')
 
     #Update BRDF coeffs
-    _ = ray.get([a.do.remote(update_brdf,{'key':'coeffs',
-                                          'value': coeffs}) for a in actors])
+    _ = call(actors,'do',update_brdf,{'key':'coeffs',
+             'value': coeffs})
 
 def apply_flex(hy_obj,data,dimension,index):
     ''' Apply flex BRDF correction to a slice of the data
@@ -238,6 +249,7 @@ def apply_flex(hy_obj,data,dimension,index):
         hy_obj.ancillary['ndvi'] =  hy_obj.ndi()
 
     if 'interpolators' not in hy_obj.ancillary:
+        from scipy.interpolate import interp1d
         bin_centers = np.mean(list(hy_obj.brdf['bins'].values()),axis=1)
         hy_obj.ancillary['interpolators'] ={}
 
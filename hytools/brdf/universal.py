@@ -25,13 +25,12 @@ per flightline or across multiple flightlines.
 from itertools import product
 from copy import deepcopy
 import numpy as np
-import ray
-from scipy.optimize import minimize
+from ..parallel.executors import call
 from .kernels import calc_volume_kernel,calc_geom_kernel
 from ..misc import progbar
-from ..misc import update_brdf
+from ..misc import update_brdf,get_attribute
 from ..masks import mask_create
-from ..plotting import universal_diagno_plot
+from ..masks.packed import mask_select
 
 def universal_brdf(actors,config_dict):
     brdf_dict = config_dict['brdf']
@@ -39,20 +38,23 @@ def universal_brdf(actors,config_dict):
     if brdf_dict['grouped']:
         actors = calc_universal_group(actors)
     else:
-        _ = ray.get([a.do.remote(calc_universal_single) for a in actors])
+        _ = call(actors,'do',calc_universal_single)
 
     if brdf_dict['diagnostic_plots']:
+        from ..plotting import universal_diagno_plot
         print('Exporting diagnostic plots.')
-        _ = ray.get([a.do.remote(universal_diagno_plot,config_dict) for a in actors])
+        _ = call(actors,'do',universal_diagno_plot,config_dict)
 
 def sample_kernels(hy_obj):
     '''Calculate and sample BRDF kernels
     '''
     #Sample kernel images
-    geom_kernel = hy_obj.geom_kernel(hy_obj.brdf['geometric'],
-                                     b_r=hy_obj.brdf["b/r"],
-                                     h_b =hy_obj.brdf["h/b"])[hy_obj.mask['calc_brdf']]
-    vol_kernel = hy_obj.volume_kernel(hy_obj.brdf['volume'])[hy_obj.mask['calc_brdf']]
+    geom_kernel = mask_select(hy_obj.geom_kernel(hy_obj.brdf['geometric'],
+                                                 b_r=hy_obj.brdf["b/r"],
+                                                 h_b =hy_obj.brdf["h/b"]),
+                              hy_obj.mask['calc_brdf'])
+    vol_kernel = mask_select(hy_obj.volume_kernel(hy_obj.brdf['volume']),
+                             hy_obj.mask['calc_brdf'])
     X = np.vstack([vol_kernel,geom_kernel,
                    np.ones(vol_kernel.shape)]).T
     return X
@@ -84,27 +86,27 @@ def calc_universal_single(hy_obj):
 def calc_universal_group(actors):
     '''Calculate BRDF coefficients using pooled data from all flightlines.
     '''
-    _ = ray.get([a.do.remote(subsample_mask) for a in actors])
-    X = ray.get([a.do.remote(sample_kernels) for a in actors])
+    _ = call(actors,'do',subsample_mask)
+    X = call(actors,'do',sample_kernels)
     X = np.concatenate(X)
 
-    bad_bands = ray.get(actors[0].do.remote(lambda x: x.bad_bands))
-    corections = ray.get(actors[0].do.remote(lambda x: x.corrections))
+    bad_bands = call(actors[:1],'do',get_attribute,'bad_bands')[0]
+    corections = call(actors[:1],'do',get_attribute,'corrections')[0]
 
     coeffs = {}
 
     for band_num,band in enumerate(bad_bands):
         if ~band:
-            y = ray.get([a.get_band.remote(band_num,mask='calc_brdf',
-                                           corrections = corections) for a in actors])
+            y = call(actors,'get_band',band_num,mask='calc_brdf',
+                     corrections = corections)
             y = np.concatenate(y)
             coeffs[band_num] = np.linalg.lstsq(X, y)[0].flatten().tolist()
             progbar(np.sum(~bad_bands[:band_num+1]),np.sum(~bad_bands))
     print('\n')
 
     #Update BRDF coeffs
-    _ = ray.get([a.do.remote(update_brdf,{'key':'coeffs',
-                                          'value': coeffs}) for a in actors])
+    _ = call(actors,'do',update_brdf,{'key':'coeffs',
+             'value': coeffs})
 
     return actors
 
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Extract spectra at points or plots from groups of images.
+
+Requested pixels are sorted by line and column and read in blocks of
+consecutive lines, so each touched line is read once and reads follow
+the storage order of the file. Corrections and resampling are applied
+only to the requested pixels, and only the selected bands are read.
+
+Points are given as a table (dict of arrays or DataFrame) with either
+'line' and 'column' or map 'x' and 'y' columns, and an optional 'image'
+column of indices into the image list. Points in map coordinates without
+an image index are extracted from every image covering them.
+
+"""
+import sys
+import time
+import numpy as np
+from ..io.envi import envi_read_chunk
+
+# Maximum number of lines read in a single block
+BLOCK_LINES = 64
+
+
+def extract_pixels(hy_obj,lines,columns,corrections = [],resample = False,bands = None):
+    '''Extract the spectra of a set of pixels.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        lines (list, numpy.ndarray): Zero-indexed line indices.
+        columns (list, numpy.ndarray): Zero-indexed column indices.
+        corrections(list): Corrections to apply, will be applied in
+        order listed.
+        resample (bool, dict, list): Resample wavelengths, see
+                                HyTools.resample. Defaults to False.
+        bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                HyTools.band_selection. Defaults to None,
+                                all bands.
+
+    Returns:
+        numpy.ndarray: Pixel array (pixels,bands), in input order.
+
+    '''
+    lines = np.asarray(lines,dtype = int)
+    columns = np.asarray(columns,dtype = int)
+    bands = hy_obj.band_selection(bands)
+    count = hy_obj.bands if bands is None else len(bands)
+    pixels = np.zeros((len(lines),count),dtype = hy_obj.dtype)
+    if len(lines) == 0:
+        return pixels if hy_obj.encoding is None else hy_obj.decode(pixels,bands)
+
+    # Split sorted pixels into blocks of consecutive lines
+    order = np.lexsort((columns,lines))
+    sorted_lines = lines[order]
+    segment = np.concatenate([[0],np.cumsum(np.diff(sorted_lines) > 1)])
+    segment_start = sorted_lines[np.searchsorted(segment,segment)]
+    block = segment*hy_obj.lines + (sorted_lines - segment_start)//BLOCK_LINES
+    starts = np.concatenate([[0],np.where(np.diff(block) != 0)[0]+1,[len(order)]])
+
+    if hy_obj.counters is not None:
+        start = time.perf_counter()
+
+    # Data is opened once for all blocks
+    hy_obj.load_data()
+    for block_start,block_end in zip(starts[:-1],starts[1:]):
+        block = order[block_start:block_end]
+        line_start,line_end = lines[block].min(),lines[block].max()+1
+        col_start,col_end = columns[block].min(),columns[block].max()+1
+        if hy_obj.file_type == "neon":
+            chunk = hy_obj.data[line_start:line_end,col_start:col_end,:]
+            if bands is not None:
+                chunk = chunk[:,:,bands]
+        else:
+            chunk = envi_read_chunk(hy_obj.data,col_start,col_end,
+                                    line_start,line_end,hy_obj.interleave,bands)
+        pixels[block] = chunk[lines[block]-line_start,columns[block]-col_start]
+    hy_obj.close_data()
+
+    if hy_obj.file_type == "envi" and hy_obj.endianness != sys.byteorder:
+        pixels = hy_obj.byteswap(pixels)
+    if hy_obj.encoding is not None:
+        pixels = hy_obj.decode(pixels,bands)
+    if hy_obj.counters is not None:
+        hy_obj.counters.add('read',start,read = pixels.nbytes,output = pixels)
+
+    pixels = hy_obj.correct(pixels,'pixels',[lines,columns],corrections,bands)
+    if resample:
+        pixels = hy_obj.resample(pixels,resample,bands)
+    return pixels
+
+
+def point_requests(hy_objs,points,buffer = 0):
+    '''Convert a table of points to pixel requests for each image.
+
+    Args:
+        hy_objs (list): List of HyTools objects.
+        points (dict, pandas.DataFrame): Points table.
+        buffer (int, optional): Number of pixels added on each side of a
+                                point, extracting a (2*buffer+1)^2 plot.
+                                Defaults to 0.
+
+    Returns:
+        dict: Image index: (point index, line, column) arrays, pixels
+        outside an image are dropped.
+
+    '''
+    if ('line' in points) and ('column' in points):
+        map_coords = False
+        point_lines = np.asarray(points['line'],dtype = int)
+        point_columns = np.asarray(points['column'],dtype = int)
+    elif ('x' in points) and ('y' in points):
+        map_coords = True
+        point_x = np.asarray(points['x'],dtype = float)
+        point_y = np.asarray(points['y'],dtype = float)
+    else:
+        print("ERROR: Points require 'line' and 'column' or 'x' and 'y' columns.")
+        return None
+
+    count = len(point_lines) if not map_coords else len(point_x)
+    if 'image' in points:
+        point_images = np.asarray(points['image'],dtype = int)
+    elif map_coords:
+        point_images = None
+    else:
+        print("ERROR: Points in pixel coordinates require an 'image' column.")
+        return None
+
+    line_offset,col_offset = np.mgrid[-buffer:buffer+1,-buffer:buffer+1]
+    line_offset,col_offset = line_offset.flatten(),col_offset.flatten()
+
+    requests = {}
+    for image,hy_obj in enumerate(hy_objs):
+        point = np.arange(count)
+        if point_images is not None:
+            point = point[point_images == image]
+        if len(point) == 0:
+            continue
+
+        if map_coords:
+            lines,columns = hy_obj.map_to_pixel(point_x[point],point_y[point])
+            lines,columns = np.floor(lines).astype(int),np.floor(columns).astype(int)
+        else:
+            lines,columns = point_lines[point],point_columns[point]
+
+        point = np.repeat(point,len(line_offset))
+        lines = (lines[:,np.newaxis] + line_offset).flatten()
+        columns = (columns[:,np.newaxis] + col_offset).flatten()
+
+        inside = (lines >= 0) & (lines < hy_obj.lines) & \
+                 (columns >= 0) & (columns < hy_obj.columns)
+        if inside.sum() > 0:
+            requests[image] = (point[inside],lines[inside],columns[inside])
+    return requests
+
+
+def extract_image(hy_obj,args):
+    '''Extract the requested pixels of an image.
+    '''
+    requests,corrections,resample,bands = args
+    _,lines,columns = requests[hy_obj.file_name]
+    return extract_pixels(hy_obj,lines,columns,corrections,resample,bands)
+
+
+def extract(hy_objs,points,corrections = [],resample = False,buffer = 0,
+            scheduler = None,bands = None):
+    '''Extract spectra at a table of points from a group of images.
+
+    Args:
+        hy_objs (list): List of HyTools objects.
+        points (dict, pandas.DataFrame): Points table, see module
+                                         description.
+        corrections(list): Corrections to apply, will be applied in
+        order listed.
+        resample (bool, dict): Resample wavelengths, see HyTools.resample.
+                               Defaults to False.
+        buffer (int, optional): Number of pixels added on each side of a
+                                point. Defaults to 0.
+        scheduler (TaskScheduler, optional): Scheduler used to process
+                                             images in parallel. Defaults
+                                             to None, images are processed
+                                             in this process.
+        bands (str, list, numpy.ndarray, optional): Bands to read, see
+                                             HyTools.band_selection. Defaults
+                                             to None, all bands.
+
+    Returns:
+        dict: Tidy arrays, one row per extracted pixel, sorted by point
+        and image: 'point', 'image', 'line', 'column' and 'spectra'
+        (pixels,bands). None if the points table is invalid.
+
+    '''
+    requests = point_requests(hy_objs,points,buffer)
+    if requests is None:
+        return None
+
+    images = sorted(requests)
+    if len(images) == 0:
+        return {'point': np.zeros(0,dtype = int),'image': np.zeros(0,dtype = int),
+                'line': np.zeros(0,dtype = int),'column': np.zeros(0,dtype = int),
+                'spectra': np.zeros((0,hy_objs[0].bands))}
+
+    if scheduler is None:
+        spectra = [extract_pixels(hy_objs[image],*requests[image][1:],
+                                  corrections = corrections,resample = resample,
+                                  bands = bands)
+                   for image in images]
+    else:
+        args = ({hy_objs[image].file_name: requests[image] for image in images},
+                corrections,resample,bands)
+        spectra = scheduler.map_images(extract_image,[hy_objs[image] for image in images],args)
+
+    result = {'point': np.concatenate([requests[image][0] for image in images]),
+              'image': np.concatenate([np.full(len(requests[image][0]),image) for image in images]),
+              'line': np.concatenate([requests[image][1] for image in images]),
+              'column': np.concatenate([requests[image][2] for image in images]),
+              'spectra': np.concatenate(spectra)}
+
+    order = np.lexsort((result['image'],result['point']))
+    return {key: value[order] for key,value in result.items()}
+
+
+def to_dataframe(result,band_names = None):
+    '''Convert extraction results to a DataFrame.
+
+    Args:
+        result (dict): Output of extract().
+        band_names (list, optional): Spectra column names, ex. image
+                                     wavelengths. Defaults to band indices.
+
+    Returns:
+        pandas.DataFrame: One row per extracted pixel.
+
+    '''
+    import pandas as pd
+
+    spectra = result['spectra']
+    if band_names is None:
+        band_names = range(spectra.shape[1])
+    dataframe = pd.DataFrame(spectra,columns = [str(name) for name in band_names])
+    for key in ['column','line','image','point']:
+        dataframe.insert(0,key,result[key])
+    return dataframe
@@ -19,6 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import numpy as np
 from ..masks import mask_create
+from ..misc import sketch_image
 
 
 REFRACTIVE_INDICES = np.array([
@@ -98,25 +99,29 @@ def apply_gao_2021_correction(hy_obj, data, dimension, index):
     if 'gao_rto' not in hy_obj.ancillary:
         hy_obj.ancillary['gao_rto'] = get_rto(hy_obj)
 
+    # Non-water pixels are masked per slice
     if dimension == 'line':
-        rto_line = hy_obj.ancillary['gao_rto'][index, :]
+        rto_line = np.where(hy_obj.mask['apply_glint'][index, :],
+                            hy_obj.ancillary['gao_rto'][index, :], 0)
         rto_line = np.reshape(rto_line, (len(rto_line), 1))
         correction = rto_line * hy_obj.ancillary['gao_b_simu']
 
     elif dimension == 'column':
-        rto_col = hy_obj.ancillary['gao_rto'][:, index]
+        rto_col = np.where(hy_obj.mask['apply_glint'][:, index],
+                           hy_obj.ancillary['gao_rto'][:, index], 0)
         rto_col = np.reshape(rto_col, (len(rto_col), 1))
         correction = rto_col * hy_obj.ancillary['gao_b_simu']
 
     elif (dimension == 'band'):
         correction = (
             hy_obj.ancillary['gao_b_simu'][0, :][index]
-            * hy_obj.ancillary['gao_rto']
+            * np.where(hy_obj.mask['apply_glint'], hy_obj.ancillary['gao_rto'], 0)
         )
 
     elif dimension == 'chunk':
         x1, x2, y1, y2 = index
-        rto_chunk = hy_obj.ancillary['gao_rto'][y1:y2, x1:x2]
+        rto_chunk = np.where(hy_obj.mask['apply_glint'][y1:y2, x1:x2],
+                             hy_obj.ancillary['gao_rto'][y1:y2, x1:x2], 0)
         rto_chunk = np.reshape(
             rto_chunk,
             (
@@ -129,7 +134,8 @@ def apply_gao_2021_correction(hy_obj, data, dimension, index):
 
     elif dimension == 'pixels':
         y, x = index
-        rto_pixels = hy_obj.ancillary['gao_rto'][y, x]
+        rto_pixels = np.where(hy_obj.mask['apply_glint'][y, x],
+                              hy_obj.ancillary['gao_rto'][y, x], 0)
         rto_pixels = np.reshape(rto_pixels, (len(rto_pixels), 1))
         correction = rto_pixels * hy_obj.ancillary['gao_b_simu']
 
@@ -194,21 +200,22 @@ def get_b_simu(hy_obj):
 
 
 def get_rto(hy_obj):
-    b_ref = hy_obj.get_wave(hy_obj.glint['correction_wave'])
-
-    b_ref_min = np.percentile(
-        b_ref[
-            (hy_obj.mask['apply_glint'])
-            & (b_ref > 0)
-        ],
-        .0001
-    )
-    b_ref = b_ref - b_ref_min
-
+    def positive(chunk):
+        return np.where(chunk[:,:,0] > 0,chunk[:,:,0],np.nan)
+
+    # Minimum of positive water pixels, sketched chunk by chunk
+    b_ref_min = sketch_image(
+        hy_obj,
+        positive,
+        [hy_obj.wave_to_band(hy_obj.glint['correction_wave'])],
+        mask=hy_obj.mask['apply_glint']
+    ).percentile(.0001)
+    b_ref = hy_obj.get_wave(hy_obj.glint['correction_wave']) - b_ref_min
+
+    # Non-water pixels are zeroed when applied
     rto = (
         b_ref
         / hy_obj.ancillary['gao_b_simu'][0, :][hy_obj.glint['correction_band']]
     )
-    rto[~hy_obj.mask['apply_glint']] = 0
 
     return rto
@@ -17,8 +17,8 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import ray
-from ..misc import set_glint
+from ..parallel.executors import call
+from ..misc import set_glint, add_correction
 from .hochberg_2003 import apply_hochberg_2003_correction
 from .gao_2021 import apply_gao_2021_correction
 from .hedley_2005 import apply_hedley_2005_correction
@@ -29,14 +29,10 @@ def set_glint_parameters(actors, config_dict):
     glint_dict = config_dict['glint']
 
     # Set Glint dict
-    _ = ray.get([
-        a.do.remote(set_glint, glint_dict) for a in actors
-    ])
+    _ = call(actors,'do',set_glint, glint_dict)
 
     # Add glint correction
-    _ = ray.get([
-        a.do.remote(lambda x: x.corrections.append('glint')) for a in actors
-    ])
+    _ = call(actors,'do',add_correction,'glint')
 
 
 def apply_glint_correct(hy_obj, data, dimension, index):
@@ -18,8 +18,8 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import numpy as np
-from scipy import stats
 from ..masks import mask_create
+from ..misc import sketch_image
 
 
 def apply_hedley_2005_correction(hy_obj, data, dimension, index):
@@ -94,6 +94,8 @@ def apply_hedley_2005_correction(hy_obj, data, dimension, index):
 
 
 def optimize_slopes(hy_obj):
+    from scipy import stats
+
     deep_water = hy_obj.get_chunk(
         *hy_obj.glint['deep_water_sample'][hy_obj.file_name]
     )
@@ -128,10 +130,13 @@ def optimize_slopes(hy_obj):
 
 
 def nir_swir_diff(hy_obj):
-    nir_swir_array = np.copy(
-        hy_obj.get_wave(hy_obj.glint['correction_wave'])
-    )
-    nir_swir_array[~hy_obj.mask['apply_glint']] = 0
-    nir_swir_min = np.percentile(nir_swir_array[nir_swir_array > 0], .0001)
+    def nir_swir(chunk):
+        return np.where(chunk[:,:,0] > 0,chunk[:,:,0],np.nan)
+
+    # Minimum of positive water pixels, sketched chunk by chunk
+    nir_swir_min = sketch_image(hy_obj,nir_swir,
+                                [hy_obj.wave_to_band(hy_obj.glint['correction_wave'])],
+                                mask=hy_obj.mask['apply_glint']).percentile(.0001)
 
-    return nir_swir_array - nir_swir_min
+    # Non-water pixels are zeroed when applied
+    return hy_obj.get_wave(hy_obj.glint['correction_wave']) - nir_swir_min
@@ -19,6 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import numpy as np
 from ..masks import mask_create
+from ..misc import sketch_image
 
 
 def apply_hochberg_2003_correction(hy_obj, data, dimension, index):
@@ -39,47 +40,59 @@ def apply_hochberg_2003_correction(hy_obj, data, dimension, index):
             get_hochberg_correction(hy_obj)
         )
 
+    # Non-water pixels are masked per slice
     if dimension == 'line':
         correction = hy_obj.ancillary['hochberg_correction'][index, :][:,np.newaxis]
+        mask = hy_obj.mask['apply_glint'][index, :][:,np.newaxis]
 
     elif dimension == 'column':
         correction = hy_obj.ancillary['hochberg_correction'][:, index][np.newaxis,:]
+        mask = hy_obj.mask['apply_glint'][:, index][np.newaxis,:]
 
     elif dimension == 'band':
         correction = hy_obj.ancillary['hochberg_correction']
+        mask = hy_obj.mask['apply_glint']
 
     elif dimension == 'chunk':
         x1, x2, y1, y2 = index
-        correction = hy_obj.ancillary['hochberg_correction'][y1:y2, x1:x2]
+        correction = hy_obj.ancillary['hochberg_correction'][y1:y2, x1:x2][:,:,np.newaxis]
+        mask = hy_obj.mask['apply_glint'][y1:y2, x1:x2][:,:,np.newaxis]
 
     elif dimension == 'pixels':
         y, x = index
-        correction = hy_obj.ancillary['hochberg_correction'][y, x]
+        correction = hy_obj.ancillary['hochberg_correction'][y, x][:,np.newaxis]
+        mask = hy_obj.mask['apply_glint'][y, x][:,np.newaxis]
 
-    return data - correction
+    return data - np.where(mask, correction, 0)
 
 def get_hochberg_correction(hy_obj):
     """
     Calculates the hochberg correction across entire image.
     Uses the NIR or SWIR wavelengths to find the amount of signal
-    attributed to glint. Zeros out non-water pixels
+    attributed to glint. Non-water pixels are zeroed when applied.
     """
 
+    if isinstance(hy_obj.glint['correction_wave'],list):
+        waves = hy_obj.glint['correction_wave']
+    else:
+        waves = [hy_obj.glint['correction_wave']]
+    bands = [hy_obj.wave_to_band(wave) for wave in waves]
+
+    def nir_swir(chunk):
+        nir_swir_chunk = np.sum(chunk,axis=2,dtype=np.float64)/len(bands)
+        return np.where(nir_swir_chunk > 0,nir_swir_chunk,np.nan)
+
+    # Minimum of positive water pixels, sketched chunk by chunk
+    nir_swir_min = sketch_image(
+        hy_obj, nir_swir, bands, mask=hy_obj.mask['apply_glint']
+    ).percentile(.001)
+
     if isinstance(hy_obj.glint['correction_wave'],list):
         nir_swir_array = np.zeros((hy_obj.lines,hy_obj.columns))
         for wave in hy_obj.glint['correction_wave']:
             nir_swir_array+= hy_obj.get_wave(wave)
         nir_swir_array/=len(hy_obj.glint['correction_wave'])
     else:
-        nir_swir_array = np.copy(hy_obj.get_wave(hy_obj.glint['correction_wave']))
-
-    nir_swir_array[~hy_obj.mask['apply_glint']] = 0
-
-    nir_swir_min = np.percentile(
-        nir_swir_array[nir_swir_array > 0], .001
-    )
-
-    hochberg_correction = nir_swir_array - nir_swir_min
-    hochberg_correction[~hy_obj.mask['apply_glint']] = 0
+        nir_swir_array = hy_obj.get_wave(hy_obj.glint['correction_wave'])
 
-    return hochberg_correction
+    return nir_swir_array - nir_swir_min
@@ -21,3 +21,5 @@ The :mod:`hytools.io` module includes functions for reading
 from multiple file formats and writing to ENVI formatted binary files.
 """
 from .envi import *
+from .catalog import *
+from .convert import *
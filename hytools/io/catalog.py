@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Spatial index of image footprints.
+
+Footprints are calculated from ENVI headers or NEON metadata, image data
+is never read. Queries test footprint bounding boxes first and then the
+exact, possibly rotated, footprint.
+
+"""
+import json
+import os
+import numpy as np
+from .envi import parse_envi_header
+from ..misc.geo import map_info_transform,image_footprint
+
+
+def read_geometry(file_name,file_type = 'envi'):
+    '''Read map info and dimensions of an image without reading data.
+
+    Args:
+        file_name (str): Image pathname.
+        file_type (str, optional): 'envi' or 'neon'. Defaults to 'envi'.
+
+    Returns:
+        dict: Map info, lines and columns, None if the image has no map
+        info.
+
+    '''
+    if file_type == 'envi':
+        header_file = os.path.splitext(file_name)[0] + ".hdr"
+        if not os.path.isfile(header_file):
+            print("ERROR: Header file not found.")
+            return None
+        header_dict = parse_envi_header(header_file)
+        map_info = header_dict['map info']
+        lines,columns = header_dict['lines'],header_dict['samples']
+    elif file_type == 'neon':
+        import h5py
+        with h5py.File(file_name,'r') as hdf_obj:
+            base_key = list(hdf_obj.keys())[0]
+            reflectance = hdf_obj[base_key]["Reflectance"]
+            map_info = reflectance["Metadata"]['Coordinate_System']['Map_Info'][()].decode("utf-8").split(',')
+            lines,columns = reflectance["Reflectance_Data"].shape[:2]
+    else:
+        print("Unrecognized file type.")
+        return None
+
+    if map_info is None:
+        print("ERROR: %s has no map info." % os.path.basename(file_name))
+        return None
+    return {'map_info': [str(item).strip() for item in map_info],
+            'lines': int(lines),
+            'columns': int(columns)}
+
+
+class Catalog:
+    """Spatial index of a group of images.
+
+    """
+
+    def __init__(self):
+        self.images = []
+        self.corners = np.zeros((0,4,2))
+        self.bounds = np.zeros((0,4))
+
+    def __len__(self):
+        return len(self.images)
+
+    def add(self,file_name,file_type = 'envi'):
+        '''Add an image to the catalog.
+
+        Args:
+            file_name (str): Image pathname.
+            file_type (str, optional): 'envi' or 'neon'. Defaults to 'envi'.
+
+        Returns:
+            None.
+
+        '''
+        geometry = read_geometry(file_name,file_type)
+        if geometry is None:
+            return
+        geometry['file_name'] = file_name
+        geometry['file_type'] = file_type
+        self._index(geometry)
+
+    def _index(self,geometry):
+        transform = map_info_transform(geometry['map_info'])
+        corners = image_footprint(transform,geometry['lines'],geometry['columns'])
+        bounds = np.concatenate([corners.min(axis=0),corners.max(axis=0)])
+        self.images.append(geometry)
+        self.corners = np.concatenate([self.corners,corners[np.newaxis]])
+        self.bounds = np.concatenate([self.bounds,bounds[np.newaxis]])
+
+    def query(self,xmin,ymin,xmax,ymax):
+        '''Find images overlapping a map window.
+
+        Args:
+            xmin (float): Minimum map x coordinate.
+            ymin (float): Minimum map y coordinate.
+            xmax (float): Maximum map x coordinate.
+            ymax (float): Maximum map y coordinate.
+
+        Returns:
+            list: Pathnames of overlapping images, in catalog order.
+
+        '''
+        candidates = np.where((self.bounds[:,0] <= xmax) & (self.bounds[:,2] >= xmin) &
+                              (self.bounds[:,1] <= ymax) & (self.bounds[:,3] >= ymin))[0]
+
+        # Bounding boxes are exact for north up images, rotated footprints
+        # are also tested along their edge normals (separating axes)
+        corners = self.corners[candidates]
+        box = np.array([[xmin,ymin],[xmax,ymin],[xmax,ymax],[xmin,ymax]])
+        overlap = np.ones(len(candidates),dtype=bool)
+        for edge in (corners[:,1]-corners[:,0],corners[:,3]-corners[:,0]):
+            normal = np.stack([-edge[:,1],edge[:,0]],axis=1)
+            footprint = np.einsum('ijk,ik->ij',corners,normal)
+            window = box @ normal.T
+            overlap &= (window.max(axis=0) >= footprint.min(axis=1)) & \
+                       (footprint.max(axis=1) >= window.min(axis=0))
+
+        return [self.images[i]['file_name'] for i in candidates[overlap]]
+
+    def save(self,catalog_file):
+        '''Save the catalog to a JSON file.
+        '''
+        with open(catalog_file, 'w') as outfile:
+            json.dump(self.images,outfile)
+
+    def load(self,catalog_file):
+        '''Load images from a catalog JSON file.
+        '''
+        with open(catalog_file, 'r') as infile:
+            for geometry in json.load(infile):
+                self._index(geometry)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Out-of-core interleave conversion.
+
+Images are converted in blocks of full width lines sized to a memory
+budget. Each block is read with one contiguous read for BIL and BIP
+images (one per band for BSQ images), transposed in memory and written
+as contiguous runs of the output layout: a single run for BIL and BIP
+outputs and one run per band for BSQ outputs. Band subsetting and data
+type conversion or encoding (see encode_header) are applied in the same
+pass.
+
+"""
+import sys
+import numpy as np
+from .envi import WriteENVI,dtype_dict,parse_envi_header,encode_header,encoding_scale
+
+# Memory budget (bytes) of a conversion block
+BLOCK_MEMORY = 256*1024**2
+
+# Header fields with one entry per band
+BAND_FIELDS = ['band names','bbl','fwhm','wavelength',
+               'data gain values','data offset values',
+               'data reflectance gain values','data reflectance offset values']
+
+
+def envi_data_type(dtype):
+    '''Return the ENVI data type code of a numpy data type, None if not
+    supported.
+    '''
+    codes = {np.dtype(value): key for key,value in dtype_dict.items()}
+    return codes.get(np.dtype(dtype))
+
+
+def convert_header(hy_obj,interleave,bands = None,dtype = None,encoding = None):
+    '''Create the ENVI header of a converted image.
+
+    Args:
+        hy_obj (HyTools file object): Input image.
+        interleave (str): Output interleave: 'bil', 'bip' or 'bsq'.
+        bands (list, optional): Band indices to export, in output order.
+                                Defaults to all bands.
+        dtype (numpy.dtype, optional): Output data type. Defaults to the
+                                       input data type and encoding.
+        encoding (dict, optional): Output encoding, see encode_header,
+                                   overrides dtype. Scaled integer encodings
+                                   without a scale take it from the input,
+                                   see encoding_scale. Defaults to None.
+
+    Returns:
+        dict: ENVI header dictionary, None if the interleave or data type
+        is not supported.
+
+    Raises:
+        ValueError: Unsupported encoding, see encode_header.
+
+    '''
+    if interleave not in ['bil','bip','bsq']:
+        print("ERROR: Unrecognized interleave %s." % interleave)
+        return None
+    if (dtype is not None) and (envi_data_type(dtype) is None):
+        print("ERROR: Data type %s not supported by ENVI." % np.dtype(dtype))
+        return None
+    if bands is None:
+        bands = list(range(hy_obj.bands))
+
+    header_dict = hy_obj.get_header()
+    for field in BAND_FIELDS:
+        values = header_dict.get(field)
+        if isinstance(values,(list,np.ndarray)) and (len(values) == hy_obj.bands):
+            header_dict[field] = [values[band] for band in bands]
+    header_dict['bands'] = len(bands)
+    header_dict['interleave'] = interleave
+    header_dict['byte order'] = int(sys.byteorder == 'big')
+    header_dict['header offset'] = 0
+    if encoding is not None:
+        header_dict = encode_header(header_dict,encoding_scale(hy_obj,encoding))
+    elif dtype is not None:
+        header_dict = encode_header(header_dict)
+        header_dict['data type'] = envi_data_type(dtype)
+    return header_dict
+
+
+def read_block(hy_obj,line_start,line_end,bands):
+    '''Read a block of full width lines of a subset of bands, only the
+    requested bands are read from BIL and BSQ images. Blocks of encoded
+    images are decoded.
+
+    Returns:
+        numpy.ndarray: Block array (lines,columns,bands).
+
+    '''
+    if bands == list(range(hy_obj.bands)):
+        bands = slice(None)
+
+    if hy_obj.file_type == "neon":
+        block = hy_obj.data[line_start:line_end,:,:][:,:,bands]
+    elif hy_obj.interleave == "bip":
+        block = hy_obj.data[line_start:line_end,:,bands]
+    elif hy_obj.interleave == "bil":
+        block = np.moveaxis(hy_obj.data[line_start:line_end,bands,:],1,2)
+    elif hy_obj.interleave == "bsq":
+        block = np.moveaxis(hy_obj.data[bands,line_start:line_end,:],0,2)
+
+    if hy_obj.file_type == "envi" and hy_obj.endianness != sys.byteorder:
+        block = hy_obj.byteswap(block)
+    if hy_obj.encoding is not None:
+        block = hy_obj.decode(block,bands)
+    return block
+
+
+def convert_rows(hy_obj,output_name,line_start = 0,line_end = None,bands = None,
+                 memory = BLOCK_MEMORY):
+    '''Convert a band of lines to an existing output image.
+
+    Args:
+        hy_obj (HyTools file object): Input image.
+        output_name (str): Output image pathname, created with
+                           convert_header.
+        line_start (int, optional): Starting line. Defaults to 0.
+        line_end (int, optional): Noninclusive ending line. Defaults to
+                                  hy_obj.lines.
+        bands (list, optional): Band indices to export, in output order.
+                                Defaults to all bands.
+        memory (int, optional): Memory budget of a block in bytes.
+                                Defaults to BLOCK_MEMORY.
+
+    Returns:
+        None.
+
+    '''
+    if line_end is None:
+        line_end = hy_obj.lines
+    if bands is None:
+        bands = list(range(hy_obj.bands))
+
+    header_dict = parse_envi_header(output_name + ".hdr")
+    writer = WriteENVI(output_name,header_dict,mode = 'r+',counters = hy_obj.counters)
+    dtype = writer.data.dtype
+
+    # Input block and its converted copy, and the decoded float32 copy
+    # of encoded images
+    itemsize = np.dtype(hy_obj.dtype).itemsize + dtype.itemsize
+    if (hy_obj.encoding is not None) or (writer.encoding is not None):
+        itemsize += 4
+    block_lines = max(int(memory // (hy_obj.columns*len(bands)*itemsize)),1)
+
+    hy_obj.load_data()
+    for start in range(line_start,line_end,block_lines):
+        end = min(start + block_lines,line_end)
+        block = read_block(hy_obj,start,end,bands)
+        if writer.encoding is None:
+            block = block.astype(dtype,copy = False)
+        writer.write_chunk(block,start,0)
+    hy_obj.close_data()
+    writer.close()
+
+
+def convert_interleave(hy_obj,output_name,interleave,bands = None,dtype = None,
+                       encoding = None,memory = BLOCK_MEMORY):
+    '''Convert an image to an ENVI image with a different interleave.
+
+    Args:
+        hy_obj (HyTools file object): Input image.
+        output_name (str): Output image pathname.
+        interleave (str): Output interleave: 'bil', 'bip' or 'bsq'.
+        bands (list, optional): Band indices to export, in output order.
+                                Defaults to all bands.
+        dtype (numpy.dtype, optional): Output data type. Defaults to the
+                                       input data type and encoding.
+        encoding (dict, optional): Output encoding, see encode_header,
+                                   overrides dtype. Defaults to None.
+        memory (int, optional): Memory budget of a block in bytes.
+                                Defaults to BLOCK_MEMORY.
+
+    Returns:
+        None.
+
+    '''
+    header_dict = convert_header(hy_obj,interleave,bands,dtype,encoding)
+    if header_dict is None:
+        return
+    writer = WriteENVI(output_name,header_dict)
+    writer.close()
+    convert_rows(hy_obj,output_name,bands = bands,memory = memory)
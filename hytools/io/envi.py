@@ -24,9 +24,11 @@ Todo:
 
 """
 import os
+import time
 import sys
 from collections import Counter
 import numpy as np
+from ..misc.geo import map_info_transform
 
 # ENVI datatype conversion dictionary
 dtype_dict = {1:np.uint8,
@@ -39,6 +41,17 @@ dtype_dict = {1:np.uint8,
              14:np.int64,
              15:np.uint64}
 
+# Output encodings and their ENVI data types, float16 is stored in a
+# uint16 container as ENVI has no half precision data type
+encoding_dict = {'int16': 2,
+                 'uint16': 12,
+                 'float16': 12}
+
+# Description of float16 images, other ENVI readers see uint16 values
+FLOAT16_DESCRIPTION = ("{HyTools float16 image, half precision values stored as "
+                       "uint16 (data type 12) are only decoded by HyTools, "
+                       "convert to float32 with hytools.io.convert_interleave for other software}")
+
 # Dictionary of all ENVI header fields
 field_dict = {"acquisition time": "str",
               "band names":"list_str",
@@ -52,6 +65,7 @@ field_dict = {"acquisition time": "str",
               "complex function": "str",
               "coordinate system string": "str",
               "correction factors": "list_float",
+              "data encoding": "str",
               "data gain values": "list_float",
               "data ignore value": "float",
               "data offset values": "list_float",
@@ -122,7 +136,20 @@ def open_envi(hy_obj,anc_path = {}):
     hy_obj.wavelength_units = header_dict["wavelength units"]
     hy_obj.dtype = dtype_dict[header_dict["data type"]]
     hy_obj.no_data = header_dict['data ignore value']
+    hy_obj.encoding = header_dict['data encoding']
+    if hy_obj.encoding == 'float16':
+        hy_obj.dtype = np.float16
+    elif hy_obj.encoding == 'scaled':
+        hy_obj.scale_factor = header_dict['reflectance scale factor']
+        hy_obj.scale_offsets = np.zeros(hy_obj.bands,dtype = np.float32)
+        if header_dict['data reflectance offset values'] is not None:
+            hy_obj.scale_offsets[:] = header_dict['data reflectance offset values']
+    if hy_obj.encoding is not None:
+        hy_obj.no_data_code = no_data_code(hy_obj.dtype,hy_obj.no_data)
     hy_obj.map_info = header_dict['map info']
+    if hy_obj.map_info is not None:
+        hy_obj.transform = map_info_transform(hy_obj.map_info)
+        hy_obj.ulx,hy_obj.uly = hy_obj.transform[0],hy_obj.transform[3]
     hy_obj.byte_order = header_dict['byte order']
     hy_obj.anc_path = anc_path
 
@@ -170,11 +197,16 @@ class WriteENVI:
     """Iterator class for writing to an ENVI data file.
 
     """
-    def __init__(self,output_name,header_dict):
+    def __init__(self,output_name,header_dict,mode = 'w+',counters = None):
         """
         Args:
             output_name (str): Pathname of output ENVI data file.
             header_dict (dict): Dictionary containing ENVI header information.
+            mode (str, optional): File mode, 'w+' creates a new file and header,
+                                  'r+' opens an existing file to write a
+                                  subset of the image. Defaults to 'w+'.
+            counters (Counters, optional): Record write counts, see
+                                           hytools.misc.counters. Defaults to None.
 
         Returns:
             None.
@@ -185,21 +217,37 @@ class WriteENVI:
         self.interleave = header_dict['interleave']
         self.header_dict = header_dict
         self.output_name =output_name
+        self.counters = counters
         dtype = dtype_dict[header_dict["data type"]]
         lines = header_dict['lines']
         columns = header_dict['samples']
         bands = header_dict['bands']
 
+        # Values are encoded when written, see encode_header
+        self.encoding = header_dict.get('data encoding')
+        if self.encoding == 'float16':
+            dtype = np.float16
+        if self.encoding is not None:
+            self.no_data = header_dict.get('data ignore value')
+            self.code = no_data_code(dtype,self.no_data)
+        self.clipped = False
+        if self.encoding == 'scaled':
+            self.scale = header_dict['reflectance scale factor']
+            self.offsets = np.zeros(bands,dtype = np.float32)
+            if header_dict.get('data reflectance offset values') is not None:
+                self.offsets[:] = header_dict['data reflectance offset values']
+
         if self.interleave == "bip":
             self.data = np.memmap(output_name,dtype = dtype,
-                                  mode='w+', shape = (lines,columns,bands))
+                                  mode=mode, shape = (lines,columns,bands))
         elif self.interleave == "bil":
             self.data = np.memmap(output_name,dtype = dtype,
-                                  mode='w+', shape =(lines,bands,columns))
+                                  mode=mode, shape =(lines,bands,columns))
         elif self.interleave == "bsq":
             self.data = np.memmap(output_name,dtype = dtype,
-                                  mode='w+',shape =(bands,lines,columns))
-        write_envi_header(self.output_name,self.header_dict)
+                                  mode=mode,shape =(bands,lines,columns))
+        if mode == 'w+':
+            write_envi_header(self.output_name,self.header_dict)
 
     def write_line(self,line,index):
         """
@@ -212,6 +260,10 @@ class WriteENVI:
 
         """
 
+        line = self.encode(line)
+        if self.counters is not None:
+            start = time.perf_counter()
+
         if self.interleave == "bip":
             self.data[index,:,:] = line
 
@@ -221,6 +273,9 @@ class WriteENVI:
         elif self.interleave == "bsq":
             self.data[:,index,:] = np.moveaxis(line,0,1)
 
+        if self.counters is not None:
+            self.counters.add('write',start,written = np.size(line)*self.data.itemsize)
+
     def write_column(self,column,index):
         """
         Args:
@@ -232,6 +287,10 @@ class WriteENVI:
 
         """
 
+        column = self.encode(column)
+        if self.counters is not None:
+            start = time.perf_counter()
+
         if self.interleave == "bip":
             self.data[:,index,:]  = column
         elif self.interleave == "bil":
@@ -239,6 +298,9 @@ class WriteENVI:
         elif self.interleave == "bsq":
             self.data[:,:,index] =  np.moveaxis(column,0,1)
 
+        if self.counters is not None:
+            self.counters.add('write',start,written = np.size(column)*self.data.itemsize)
+
     def write_band(self,band,index):
         """
         Args:
@@ -250,6 +312,10 @@ class WriteENVI:
 
         """
 
+        band = self.encode(band,index)
+        if self.counters is not None:
+            start = time.perf_counter()
+
         if self.interleave == "bip":
             self.data[:,:,index]  = band
         elif self.interleave == "bil":
@@ -257,6 +323,9 @@ class WriteENVI:
         elif self.interleave == "bsq":
             self.data[index,:,:]= band
 
+        if self.counters is not None:
+            self.counters.add('write',start,written = np.size(band)*self.data.itemsize)
+
     def write_chunk(self,chunk,line_index,column_index):
         """
         Args:
@@ -269,6 +338,10 @@ class WriteENVI:
 
         """
 
+        chunk = self.encode(chunk)
+        if self.counters is not None:
+            start = time.perf_counter()
+
         x_start = column_index
         x_end = column_index + chunk.shape[1]
         y_start = line_index
@@ -281,6 +354,9 @@ class WriteENVI:
         elif self.interleave == "bsq":
             self.data[:,y_start:y_end,x_start:x_end] = np.moveaxis(chunk,-1,0)
 
+        if self.counters is not None:
+            self.counters.add('write',start,written = np.size(chunk)*self.data.itemsize)
+
     def write_pixel(self,pixel,line_index,column_index):
         """
         Args:
@@ -293,6 +369,10 @@ class WriteENVI:
 
         """
 
+        pixel = self.encode(pixel)
+        if self.counters is not None:
+            start = time.perf_counter()
+
         if self.interleave == "bip":
             self.data[line_index,column_index,:] = pixel
         elif self.interleave == "bil":
@@ -300,6 +380,81 @@ class WriteENVI:
         elif self.interleave == "bsq":
             self.data[:,line_index,column_index] = pixel
 
+        if self.counters is not None:
+            self.counters.add('write',start,written = np.size(pixel)*self.data.itemsize)
+
+
+    def check_clipping(self,encoded,data,info):
+        """Warn once when valid values fall outside the range of the stored
+        type and are clipped.
+        """
+        with np.errstate(invalid = 'ignore'):
+            if (np.fmin.reduce(encoded,axis = None) >= info.min) and \
+                (np.fmax.reduce(encoded,axis = None) <= info.max):
+                return
+            clipped = (encoded < info.min) | (encoded > info.max)
+        if self.no_data is not None:
+            clipped &= data != self.no_data
+        if clipped.any():
+            self.clipped = True
+            print("WARNING: Values outside the %s range are clipped in %s, check the encoding scale %s." %
+                  (info.dtype,os.path.basename(self.output_name),self.scale))
+
+    def encode(self,data,band = None):
+        """Encode data to the output encoding. Values are clipped to the
+        range of the stored type and no data values are stored as the no
+        data code, as are NaN values of scaled integer encodings.
+
+        Args:
+            data (numpy.ndarray): Data array, bands along the last axis.
+            band (int, optional): Band index of a single band array.
+                                  Defaults to None.
+
+        Returns:
+            numpy.ndarray: Encoded array.
+
+        """
+        if self.encoding is None:
+            return data
+        if self.counters is not None:
+            start = time.perf_counter()
+
+        data = np.asarray(data)
+        dtype = self.data.dtype
+
+        # No data and NaN values are cast first and replaced below
+        with np.errstate(invalid = 'ignore'):
+            if self.encoding == 'float16':
+                limit = np.finfo(dtype).max
+                encoded = np.maximum(data,-limit,dtype = np.float32)
+                np.minimum(encoded,limit,out = encoded)
+                encoded = encoded.astype(dtype)
+                neighbor = np.nextafter(self.code,dtype.type(0))
+            else:
+                info = np.iinfo(dtype)
+                if self.offsets.any():
+                    offsets = self.offsets if band is None else self.offsets[band]
+                    encoded = np.subtract(data,offsets,dtype = np.float32)
+                    encoded *= np.float32(self.scale)
+                else:
+                    encoded = np.multiply(data,np.float32(self.scale),dtype = np.float32)
+                np.rint(encoded,out = encoded)
+                if not self.clipped:
+                    self.check_clipping(encoded,data,info)
+                np.clip(encoded,info.min,info.max,out = encoded)
+                encoded = encoded.astype(dtype)
+                neighbor = self.code + 1 if self.code < info.max else self.code - 1
+
+        # Move values off the no data code, then store no data
+        np.copyto(encoded,neighbor,where = encoded == self.code)
+        if self.no_data is not None:
+            np.copyto(encoded,self.code,where = data == self.no_data)
+        if self.encoding == 'scaled':
+            np.copyto(encoded,self.code,where = np.isnan(data))
+
+        if self.counters is not None:
+            self.counters.add('encode',start,output = encoded)
+        return encoded
 
     def close(self):
         """Delete numpy memmap.
@@ -337,6 +492,116 @@ def envi_header_from_neon(hy_obj, interleave = 'bsq'):
     return header_dict
 
 
+def no_data_code(dtype,no_data):
+    """Return the stored value of no data pixels of an encoded image: the
+    no data value when it can be stored exactly, otherwise the minimum
+    (signed) or maximum (unsigned) integer or NaN for float16.
+
+    Args:
+        dtype (numpy.dtype): Stored data type.
+        no_data (float): No data value.
+
+    Returns:
+        Stored no data value.
+
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return dtype.type(np.nan if no_data is None else no_data)
+    info = np.iinfo(dtype)
+    if (no_data is not None) and (no_data == int(no_data)) and (info.min <= no_data <= info.max):
+        return dtype.type(no_data)
+    return dtype.type(info.max if dtype.kind == 'u' else info.min)
+
+
+def encode_header(header_dict,encoding = None):
+    """Set the output encoding of an ENVI header dictionary.
+
+    Scaled integer images store round((value - offset) * scale) and are
+    decoded to value = stored / scale + offset using the 'reflectance scale
+    factor' and 'data reflectance offset values' fields, which other ENVI
+    readers also apply. Float16 images are stored in a uint16 container,
+    ENVI has no half precision type, and can only be read by HyTools: the
+    header description says so and a warning is printed. Encoded no data
+    pixels are decoded to the 'data ignore value', see no_data_code.
+    Encoding is marked with a 'data encoding' field, images without it are
+    read unscaled.
+
+    Args:
+        header_dict (dict): Populated ENVI header dictionary, 'bands' set
+                            to the output band count.
+        encoding (dict, optional): Output encoding: 'type' ('int16', 'uint16'
+                                   or 'float16'), 'scale' (required by scaled
+                                   integer types, see encoding_scale) and
+                                   'offset' (defaults to 0). Defaults to None,
+                                   removing the encoding of an encoded input
+                                   header.
+
+    Returns:
+        dict: ENVI header dictionary.
+
+    Raises:
+        ValueError: Unrecognized encoding type or missing scale factor.
+
+    """
+    if encoding is not None:
+        if encoding.get('type') not in encoding_dict:
+            raise ValueError("Unrecognized encoding %s, expected a type of %s." %
+                             (encoding,', '.join(encoding_dict)))
+        if (encoding['type'] != 'float16') and (encoding.get('scale') is None):
+            raise ValueError("Encoding %s requires a scale factor." % encoding)
+
+    if header_dict.get('data encoding') == 'float16':
+        header_dict['description'] = None
+    if header_dict.get('data encoding') is not None:
+        header_dict['data encoding'] = None
+        header_dict['reflectance scale factor'] = None
+        header_dict['data reflectance offset values'] = None
+    if encoding is None:
+        return header_dict
+
+    header_dict['data type'] = encoding_dict[encoding['type']]
+    if encoding['type'] == 'float16':
+        print("WARNING: float16 images are stored as uint16 and can only be read by HyTools.")
+        header_dict['data encoding'] = 'float16'
+        header_dict['description'] = FLOAT16_DESCRIPTION
+    else:
+        header_dict['data encoding'] = 'scaled'
+        header_dict['reflectance scale factor'] = float(encoding['scale'])
+        header_dict['data reflectance offset values'] = [float(encoding.get('offset') or 0)]*header_dict['bands']
+    return header_dict
+
+
+def encoding_scale(hy_obj,encoding):
+    """Set the scale and offset of a scaled integer encoding from the input
+    image when not given. Scaled integer images are decoded when read and
+    are encoded with their own scale factor and offset. Integer images are
+    read in stored units and are encoded with a scale of 1. Float images
+    have no known units, their scale must be given.
+
+    Args:
+        hy_obj (HyTools file object): Input image.
+        encoding (dict): Output encoding, see encode_header.
+
+    Returns:
+        dict: Output encoding.
+
+    """
+    if (encoding is None) or (encoding.get('type') == 'float16') or \
+        (encoding.get('scale') is not None):
+        return encoding
+
+    encoding = dict(encoding)
+    if hy_obj.encoding == 'scaled':
+        encoding['scale'] = hy_obj.scale_factor
+        offsets = np.unique(hy_obj.scale_offsets)
+        if (encoding.get('offset') is None) and (len(offsets) == 1):
+            encoding['offset'] = float(offsets[0])
+    elif (hy_obj.encoding is None) and np.issubdtype(hy_obj.dtype,np.integer):
+        encoding['scale'] = 1
+    return encoding
+
+
 def write_envi_header(output_name,header_dict):
     """Write ENVI header file to disk.
 
@@ -375,44 +640,52 @@ def envi_header_dict():
     return {key:None for (key,value) in field_dict.items()}
 
 
-def envi_read_line(data,index,interleave):
+def envi_read_line(data,index,interleave,bands = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
         index (int): Zero-based line index.
         interleave (str): Data interleave type.
+        bands (numpy.ndarray, optional): Band indices to read. Defaults to
+                                         None, all bands.
 
     Returns:
         numpy.ndarray: Line array (columns, bands).
 
     """
+    if bands is None:
+        bands = slice(None)
 
     if interleave == "bip":
-        line = data[index,:,:]
+        line = data[index,:,:][:,bands]
     elif interleave == "bil":
-        line = np.moveaxis(data[index,:,:],0,1)
+        line = np.moveaxis(data[index,bands,:],0,1)
     elif interleave == "bsq":
-        line = np.moveaxis(data[:,index,:],0,1)
+        line = np.moveaxis(data[bands,index,:],0,1)
     return line
 
-def envi_read_column(data,index,interleave):
+def envi_read_column(data,index,interleave,bands = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
         index (int): Zero-based column index.
         interleave (str): Data interleave type.
+        bands (numpy.ndarray, optional): Band indices to read. Defaults to
+                                         None, all bands.
 
     Returns:
         numpy.ndarray: Column array (lines,bands).
 
     """
+    if bands is None:
+        bands = slice(None)
 
     if interleave == "bip":
-        column = data[:,index,:]
+        column = data[:,index,bands]
     elif interleave == "bil":
-        column = data[:,:,index]
+        column = data[:,bands,index]
     elif interleave == "bsq":
-        column =  np.moveaxis(data[:,:,index],0,1)
+        column =  np.moveaxis(data[bands,:,index],0,1)
     return column
 
 def envi_read_band(data,index,interleave):
@@ -435,28 +708,43 @@ def envi_read_band(data,index,interleave):
         band = data[index,:,:]
     return band
 
-def envi_read_pixels(data,lines,columns,interleave):
+def envi_read_pixels(data,lines,columns,interleave,bands = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
         lines (list): List of zero-indexed line indices.
         columns (list): List of zero-indexed column indices.
         interleave (str): Data interleave type.
+        bands (numpy.ndarray, optional): Band indices to read. Defaults to
+                                         None, all bands.
 
     Returns:
         numpy.ndarray: Pixel array (pixels,bands).
 
     """
+    if bands is None:
+        if interleave == "bip":
+            pixels =  data[lines,columns,:]
+        elif interleave == "bil":
+            pixels = data[lines,:,columns]
+        elif interleave == "bsq":
+            pixels = np.moveaxis(data[:,lines,columns],0,-1)
+        return pixels
+
+    # Only the selected bands of each pixel are gathered
+    lines = np.asarray(lines)[:,np.newaxis]
+    columns = np.asarray(columns)[:,np.newaxis]
+    bands = np.asarray(bands)[np.newaxis,:]
     if interleave == "bip":
-        pixels =  data[lines,columns,:]
+        pixels =  data[lines,columns,bands]
     elif interleave == "bil":
-        pixels = data[lines,:,columns]
+        pixels = data[lines,bands,columns]
     elif interleave == "bsq":
-        pixels = data[:,lines,columns]
+        pixels = data[bands,lines,columns]
     return pixels
 
 
-def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave):
+def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave,bands = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
@@ -465,18 +753,24 @@ def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave):
         line_start (int): Zero -ased top line index.
         line_end (int): Non-inclusive zero-based bottom line index.
         interleave (str): Data interleave type.
+        bands (numpy.ndarray, optional): Band indices to read, only the
+                                         selected band rows of BIL and band
+                                         planes of BSQ images are read.
+                                         Defaults to None, all bands.
 
     Returns:
         numpy.ndarray: Chunk array (line_end-line_start,col_end-col_start,bands).
 
     """
+    if bands is None:
+        bands = slice(None)
 
     if interleave == "bip":
-        chunk = data[line_start:line_end,col_start:col_end,:]
+        chunk = data[line_start:line_end,col_start:col_end,bands]
     elif interleave == "bil":
-        chunk = np.moveaxis(data[line_start:line_end,:,col_start:col_end],-1,-2)
+        chunk = np.moveaxis(data[line_start:line_end,bands,col_start:col_end],-1,-2)
     elif interleave == "bsq":
-        chunk = np.moveaxis(data[:,line_start:line_end,col_start:col_end],0,-1)
+        chunk = np.moveaxis(data[bands,line_start:line_end,col_start:col_end],0,-1)
     return chunk
 
 
@@ -19,8 +19,8 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 NEON AOP HDF opener
 """
-import h5py
 import numpy as np
+from ..misc.geo import map_info_transform
 
 
 def open_neon(hy_obj, no_data = -9999):
@@ -35,6 +35,8 @@ def open_neon(hy_obj, no_data = -9999):
 
     """
 
+    import h5py
+
     hdf_obj = h5py.File(hy_obj.file_name,'r')
     hy_obj.base_key = list(hdf_obj.keys())[0]
     metadata = hdf_obj[hy_obj.base_key]["Reflectance"]["Metadata"]
@@ -42,13 +44,16 @@ def open_neon(hy_obj, no_data = -9999):
 
     hy_obj.projection = metadata['Coordinate_System']['Coordinate_System_String'][()].decode("utf-8")
     hy_obj.map_info = metadata['Coordinate_System']['Map_Info'][()].decode("utf-8").split(',')
-    hy_obj.transform = (float(hy_obj.map_info [3]),float(hy_obj.map_info [1]),0,float(hy_obj.map_info [4]),0,-float(hy_obj.map_info [2]))
+    hy_obj.transform = map_info_transform(hy_obj.map_info)
+    hy_obj.ulx,hy_obj.uly = hy_obj.transform[0],hy_obj.transform[3]
     hy_obj.fwhm =  metadata['Spectral_Data']['FWHM'][()]
     hy_obj.wavelengths = metadata['Spectral_Data']['Wavelength'][()]
     hy_obj.wavelength_units = metadata['Spectral_Data']['Wavelength'].attrs['Units']
     hy_obj.lines = data.shape[0]
     hy_obj.columns = data.shape[1]
     hy_obj.bands = data.shape[2]
+    hy_obj.dtype = data.dtype.type
+    hy_obj.chunk_lines = data.chunks[0] if data.chunks else 1
     hy_obj.bad_bands = np.array([False for band in range(hy_obj.bands)])
     hy_obj.no_data = no_data
     hy_obj.anc_path = {'path_length': ['Ancillary_Imagery','Path_Length'],
@@ -22,6 +22,9 @@ The :mod:`hytools.masks` module include functions image correction.
 from .masks import *
 from .cloud import *
 from .calc_apply import *
+from .tiles import *
+from .packed import *
+from .footprint import *
 
 
 
@@ -21,9 +21,9 @@ This module contain functions for generating boolean masks specific to apply ima
 models.
 """
 
-from scipy.ndimage.morphology import binary_erosion
 import numpy as np
 from .cloud import zhai_cloud
+from .tiles import tile_apply,array_reader,TILE_SIZE,TILE_WORKERS
 
 
 def ndi(hy_obj,args):
@@ -47,14 +47,46 @@ def ancillary(hy_obj,args):
 def neon_edge(hy_obj,args):
     '''
     Mask artifacts in NEON images around edges.
+
+    By default the buffer is calculated by thresholding the euclidean
+    distance transform of the no data mask, which is equivalent to an
+    erosion using a disk of 'radius' but takes time independent of the
+    radius. Set 'method' to 'erosion' to use binary erosion.
+
+    The buffer is calculated in tiles with a halo of 'radius' pixels.
     '''
+    from scipy.ndimage import binary_erosion
+
     radius =args['radius']
-    y_grid, x_grid = np.ogrid[-radius: radius + 1, -radius: radius + 1]
-    window =  (x_grid**2 + y_grid**2 <= radius**2).astype(np.float)
-    buffer_edge = binary_erosion(hy_obj.mask['no_data'], window).astype(bool)
+
+    if args.get('method','edt') == 'erosion':
+        y_grid, x_grid = np.ogrid[-radius: radius + 1, -radius: radius + 1]
+        window =  (x_grid**2 + y_grid**2 <= radius**2)
+        operator = lambda mask: binary_erosion(mask, window).astype(bool)
+    else:
+        operator = lambda mask: edge_distance_mask(mask,radius)
+
+    reader = lambda y1,y2,x1,x2: [hy_obj.mask['no_data'][y1:y2,x1:x2]]
+    buffer_edge = tile_apply(operator,reader,
+                             (hy_obj.lines,hy_obj.columns),radius,
+                             tile_size = args.get('tile_size',TILE_SIZE),
+                             workers = args.get('workers',TILE_WORKERS))
     return buffer_edge
 
 
+def edge_distance_mask(mask,radius):
+    '''Return pixels further than radius from a False pixel or the array
+    edge, equivalent to binary erosion with a disk of radius.
+    '''
+    from scipy.ndimage import distance_transform_edt
+
+    # Pixels outside the array are treated as False, same as binary_erosion
+    padded = np.pad(mask,1,mode='constant',constant_values=False)
+    distance = distance_transform_edt(padded)[1:-1,1:-1]
+    # Squared distances are integers, round to remove floating point error
+    return np.round(distance**2) > radius**2
+
+
 def kernel_finite(hy_obj,args):
     '''
     Create NDVI bin class mask
@@ -80,10 +112,14 @@ def water(hy_obj,args):
     '''
     Create water mask using NDWI threshold
     '''
+    from scipy.ndimage import binary_erosion
+
     mask = hy_obj.ndi(args['band_1'],args['band_2'])
     mask = mask >= float(args['threshold'])
 
-    mask = binary_erosion(mask)
+    mask = tile_apply(binary_erosion,array_reader(mask),mask.shape,1,
+                      tile_size = args.get('tile_size',TILE_SIZE),
+                      workers = args.get('workers',TILE_WORKERS))
 
     return mask
 
@@ -1,119 +1,204 @@
-# -*- coding: utf-8 -*-
-'''
-HyTools:  Hyperspectral image processing library
-Copyright (C) 2021 University of Wisconsin
-
-Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
-
-This program is free software: you can redistribute it and/or modify
-it under the terms of the GNU General Public License as published by
-the Free Software Foundation, version 3 of the License.
-
-This program is distributed in the hope that it will be useful,
-but WITHOUT ANY WARRANTY; without even the implied warranty of
-MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
-GNU General Public License for more details.
-
-You should have received a copy of the GNU General Public License
-along with this program.  If not, see <https://www.gnu.org/licenses/>.
-
-Cloud masks
-
-'''
-from scipy.ndimage import median_filter
-import numpy as np
-
-
-def zhai_cloud(hy_obj,cloud,shadow,T1=0.01,t2=.1,t3=.25,t4=.5,T7= 9,T8= 9):
-    '''This function replicates the method of Zhai et al. (2018) for detecting clouds and shadows in
-    multispectral and hyperspectral imagery but does not apply shadow spatial refinement.
-
-    Suggested values for coefficients and params:
-        T1 : 0.01, 0.1, 1, 10, 100
-        t2 : 1/10, 1/9, 1/8, 1/7, 1/6, 1/5, 1/4, 1/3, 1/2
-        t3 : 1/4, 1/3, 1/2, 2/3, 3/4
-        t4 : 1/2, 2/3, 3/4, 4/5, 5/6
-        T7 : 3, 5, 7, 9, 11
-        T8 : 3, 5, 7, 9, 11
-
-    Zhai, H., Zhang, H., Zhang, L., & Li, P. (2018).
-    Cloud/shadow detection based on spectral indices for multi/hyperspectral optical remote sensing imagery.
-    ISPRS journal of photogrammetry and remote sensing, 144, 235-253.
-    https://doi.org/10.1016/j.isprsjprs.2018.07.006
-
-    Args:
-        hy_obj : HyTools data container object:
-        cloud (bool): Detect clouds.
-        shadow (bool): Detect clouds.
-        T1 (float): Threshold T1.
-        t2 (float): Adjusting coefficient t2.
-        t3 (float): Adjusting coefficient t3.
-        t4 (float): Adjusting coefficient t4.
-        T7 (float): Parameter T7.
-        T8 (float): Parameter T8.
-
-    Returns:
-        mask (nd.array): Boolean array where detected clouds and/or shadows = True.
-
-    '''
-
-    blue= hy_obj.get_wave(440)
-    green= hy_obj.get_wave(550)
-    red= hy_obj.get_wave(660)
-    nir = hy_obj.get_wave(850)
-
-    #If SWIR not available
-    if hy_obj.wavelengths.max() < 1570:
-        # Zhai et al. 2018 Eq. 1a,b
-        CI_1 = (3*nir)/(blue+green+red)
-        CI_2 = (blue+green+red+nir)/4
-        # Zhai et al. 2018 Eq. 3
-        CSI = nir
-
-    else:
-        swir1 = hy_obj.get_wave(1570)
-        swir2= hy_obj.get_wave(2110)
-        # Zhai et al. 2018 Eq. 1a,b
-        CI_1 = (nir+ 2*swir1)/(blue+green+red)
-        CI_2 = (blue+green+red+nir+swir1+swir2)/6
-        # Zhai et al. 2018 Eq. 3
-        CSI = (nir + swir1)/2
-
-    # Zhai et al. 2018 Eq.5
-    T2 = np.mean(CI_2[hy_obj.mask['no_data']]) + t2*(np.max(CI_2[hy_obj.mask['no_data']])-np.mean(CI_2[hy_obj.mask['no_data']]))
-    # Zhai et al. 2018 Eq.6
-    T3 = np.min(CSI[hy_obj.mask['no_data']]) + t3*(np.mean(CSI[hy_obj.mask['no_data']])-np.min(CSI[hy_obj.mask['no_data']]))
-    # Zhai et al. 2018 Eq.7
-    T4 = np.min(blue[hy_obj.mask['no_data']]) + t4*(np.mean(blue[hy_obj.mask['no_data']])-np.min(blue[hy_obj.mask['no_data']]))
-
-    mask = np.zeros((hy_obj.lines,hy_obj.columns)).astype(bool)
-
-    if cloud:
-        clouds = (np.abs(CI_1) < T1) | (CI_2 >  T2)
-        clouds = median_filter(clouds, T7)
-        mask[clouds] = True
-
-    if shadow:
-        shadows = (CSI<T3) & (blue<T4)
-        shadows = median_filter(shadows,T8)
-        mask[shadows] = True
-
-    return mask
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# -*- coding: utf-8 -*-
+'''
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Cloud masks
+
+'''
+import numpy as np
+from .tiles import tile_apply,band_reader,TILE_SIZE,TILE_WORKERS
+
+
+def box_sum(array,size):
+    '''Sum values over a square moving window using an integral image,
+    cost per pixel is independent of window size. Edges are handled by
+    reflecting the array (scipy.ndimage 'reflect' mode).
+
+    Args:
+        array (numpy.ndarray): 2D input array.
+        size (int): Window size.
+
+    Returns:
+        numpy.ndarray: Window sums, same shape as input.
+
+    '''
+    size = int(size)
+    before = size//2
+    after = size - 1 - before
+    padded = np.pad(array.astype(np.int64),((before,after),(before,after)),mode='symmetric')
+    integral = np.zeros((padded.shape[0]+1,padded.shape[1]+1),dtype=np.int64)
+    np.cumsum(np.cumsum(padded,axis=0),axis=1,out=integral[1:,1:])
+
+    lines,columns = array.shape
+    window_sum = integral[size:size+lines,size:size+columns] - integral[:lines,size:size+columns]
+    window_sum -= integral[size:size+lines,:columns]
+    window_sum += integral[:lines,:columns]
+    return window_sum
+
+
+def binary_median_filter(mask,size):
+    '''Median filter a boolean array over a square window.
+
+    The median of a boolean window is True when the count of True values
+    reaches the median rank, the count is calculated with a box sum.
+    Results match scipy.ndimage.median_filter with default settings.
+
+    Args:
+        mask (numpy.ndarray): 2D boolean array.
+        size (int): Window size.
+
+    Returns:
+        numpy.ndarray: Filtered boolean array.
+
+    '''
+    size = int(size)
+    window = size*size
+    return box_sum(mask,size) >= window - window//2
+
+
+def zhai_indices(bands,swir):
+    '''Calculate Zhai et al. (2018) cloud and shadow indices.
+
+    Args:
+        bands (dict): Reflectance arrays keyed by wavelength.
+        swir (bool): SWIR bands are available.
+
+    Returns:
+        tuple: CI_1, CI_2 and CSI arrays.
+
+    '''
+    blue,green,red,nir = [bands[wave].astype(np.float64) for wave in (440,550,660,850)]
+
+    if not swir:
+        # Zhai et al. 2018 Eq. 1a,b
+        CI_1 = (3*nir)/(blue+green+red)
+        CI_2 = (blue+green+red+nir)/4
+        # Zhai et al. 2018 Eq. 3
+        CSI = nir
+
+    else:
+        swir1 = bands[1570].astype(np.float64)
+        swir2 = bands[2110].astype(np.float64)
+        # Zhai et al. 2018 Eq. 1a,b
+        CI_1 = (nir+ 2*swir1)/(blue+green+red)
+        CI_2 = (blue+green+red+nir+swir1+swir2)/6
+        # Zhai et al. 2018 Eq. 3
+        CSI = (nir + swir1)/2
+
+    return CI_1, CI_2, CSI
+
+
+def zhai_cloud(hy_obj,cloud,shadow,T1=0.01,t2=.1,t3=.25,t4=.5,T7= 9,T8= 9,
+               tile_size = TILE_SIZE,workers = TILE_WORKERS):
+    '''This function replicates the method of Zhai et al. (2018) for detecting clouds and shadows in
+    multispectral and hyperspectral imagery but does not apply shadow spatial refinement.
+
+    Suggested values for coefficients and params:
+        T1 : 0.01, 0.1, 1, 10, 100
+        t2 : 1/10, 1/9, 1/8, 1/7, 1/6, 1/5, 1/4, 1/3, 1/2
+        t3 : 1/4, 1/3, 1/2, 2/3, 3/4
+        t4 : 1/2, 2/3, 3/4, 4/5, 5/6
+        T7 : 3, 5, 7, 9, 11
+        T8 : 3, 5, 7, 9, 11
+
+    The mask is calculated in tiles, only the six (four without SWIR) bands
+    used are read for each tile. Thresholds T2-T4 are derived from
+    statistics accumulated over blocks of lines, tiles are then read,
+    classified and median filtered with a halo of overlapping pixels so
+    results do not depend on the tile size.
+
+    Zhai, H., Zhang, H., Zhang, L., & Li, P. (2018).
+    Cloud/shadow detection based on spectral indices for multi/hyperspectral optical remote sensing imagery.
+    ISPRS journal of photogrammetry and remote sensing, 144, 235-253.
+    https://doi.org/10.1016/j.isprsjprs.2018.07.006
+
+    Args:
+        hy_obj : HyTools data container object:
+        cloud (bool): Detect clouds.
+        shadow (bool): Detect clouds.
+        T1 (float): Threshold T1.
+        t2 (float): Adjusting coefficient t2.
+        t3 (float): Adjusting coefficient t3.
+        t4 (float): Adjusting coefficient t4.
+        T7 (float): Parameter T7.
+        T8 (float): Parameter T8.
+        tile_size (int): Tile size in lines and columns.
+        workers (int): Number of threads used to process tiles.
+
+    Returns:
+        mask (nd.array): Boolean array where detected clouds and/or shadows = True.
+
+    '''
+
+    #If SWIR not available
+    swir = hy_obj.wavelengths.max() >= 1570
+    waves = [440,550,660,850]
+    if swir:
+        waves += [1570,2110]
+    reader = band_reader(hy_obj,waves)
+    no_data = hy_obj.mask['no_data']
+
+    # Accumulate statistics for thresholds
+    stats = {'CI_2' : [0.,0,-np.inf],
+             'CSI' : [0.,0,np.inf],
+             'blue' : [0.,0,np.inf]}
+
+    for start in range(0,hy_obj.lines,tile_size):
+        end = min(start+tile_size,hy_obj.lines)
+        tile = reader(start,end,0,hy_obj.columns)[0]
+        _, CI_2, CSI = zhai_indices(tile,swir)
+        valid = no_data[start:end]
+
+        for name,values,func in [('CI_2',CI_2,np.max),
+                                 ('CSI',CSI,np.min),
+                                 ('blue',tile[440].astype(np.float64),np.min)]:
+            values = values[valid]
+            if values.size > 0:
+                stats[name][0] += values.sum()
+                stats[name][1] += values.size
+                stats[name][2] = func([stats[name][2],func(values)])
+
+    CI_2_mean = stats['CI_2'][0]/stats['CI_2'][1]
+    CSI_mean = stats['CSI'][0]/stats['CSI'][1]
+    blue_mean = stats['blue'][0]/stats['blue'][1]
+
+    # Zhai et al. 2018 Eq.5
+    T2 = CI_2_mean + t2*(stats['CI_2'][2]-CI_2_mean)
+    # Zhai et al. 2018 Eq.6
+    T3 = stats['CSI'][2] + t3*(CSI_mean-stats['CSI'][2])
+    # Zhai et al. 2018 Eq.7
+    T4 = stats['blue'][2] + t4*(blue_mean-stats['blue'][2])
+
+    def classify(tile):
+        CI_1, CI_2, CSI = zhai_indices(tile,swir)
+        mask = np.zeros(CSI.shape,dtype=bool)
+
+        if cloud:
+            clouds = (np.abs(CI_1) < T1) | (CI_2 >  T2)
+            mask |= binary_median_filter(clouds, T7)
+
+        if shadow:
+            shadows = (CSI<T3) & (tile[440]<T4)
+            mask |= binary_median_filter(shadows,T8)
+        return mask
+
+    halo = max(int(T7),int(T8))//2
+    mask = tile_apply(classify,reader,(hy_obj.lines,hy_obj.columns),
+                      halo,tile_size = tile_size,workers = workers)
+
+    return mask
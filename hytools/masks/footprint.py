@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Valid footprint index.
+
+Rotated flightlines are stored in north up rasters where a large part
+of each line is no data. The footprint index holds the first and last
+valid column of each line and an occupancy flag for each tile of
+TILE_SIZE x TILE_SIZE pixels, built from the no data mask when an image
+is opened. Reads are restricted to the valid span of a window, windows
+without valid pixels are skipped.
+
+'''
+import numpy as np
+
+# Tile size (lines and columns) of the occupancy flags
+TILE_SIZE = 64
+
+
+class Footprint:
+    '''Valid pixel footprint of an image.
+    '''
+
+    def __init__(self,mask):
+        '''
+        Args:
+            mask (PackedMask, numpy.ndarray): 2D valid pixel mask.
+
+        Returns:
+            None.
+
+        '''
+        lines,columns = mask.shape
+        self.shape = (lines,columns)
+        # Valid span of each line, empty lines have a zero length span
+        self.start = np.zeros(lines,dtype = np.int32)
+        self.end = np.zeros(lines,dtype = np.int32)
+        self.tiles = np.zeros((-(-lines//TILE_SIZE),-(-columns//TILE_SIZE)),dtype = bool)
+
+        # Masks are unpacked in blocks of whole tiles
+        block_lines = 16*TILE_SIZE
+        pad = self.tiles.shape[1]*TILE_SIZE - columns
+        for line_start in range(0,lines,block_lines):
+            line_end = min(line_start+block_lines,lines)
+            block = np.asarray(mask[line_start:line_end,:],dtype = bool)
+
+            valid = block.any(axis = 1)
+            self.start[line_start:line_end] = np.where(valid,block.argmax(axis = 1),0)
+            self.end[line_start:line_end] = np.where(valid,columns - block[:,::-1].argmax(axis = 1),0)
+
+            rows = -(-(line_end-line_start)//TILE_SIZE)
+            block = np.pad(block,((0,rows*TILE_SIZE-block.shape[0]),(0,pad)))
+            block = block.reshape(rows,TILE_SIZE,self.tiles.shape[1],TILE_SIZE)
+            self.tiles[line_start//TILE_SIZE:line_start//TILE_SIZE+rows] = block.any(axis = (1,3))
+
+        self.full = bool(((self.start == 0) & (self.end == columns)).all())
+
+    def window(self,col_start,col_end,line_start,line_end):
+        '''Return the valid span of a window, the smallest window holding
+        all of its valid pixels.
+
+        Args:
+            col_start (int): Window starting column.
+            col_end (int): Noninclusive window ending column.
+            line_start (int): Window starting line.
+            line_end (int): Noninclusive window ending line.
+
+        Returns:
+            tuple: (col_start,col_end,line_start,line_end), None if the
+            window holds no valid pixels.
+
+        '''
+        if self.full:
+            return (col_start,col_end,line_start,line_end)
+        if not self.tiles[line_start//TILE_SIZE:(line_end-1)//TILE_SIZE+1,
+                          col_start//TILE_SIZE:(col_end-1)//TILE_SIZE+1].any():
+            return None
+
+        start = np.maximum(self.start[line_start:line_end],col_start)
+        end = np.minimum(self.end[line_start:line_end],col_end)
+        valid = np.flatnonzero(start < end)
+        if len(valid) == 0:
+            return None
+        return (int(start[valid].min()),int(end[valid].max()),
+                line_start+int(valid[0]),line_start+int(valid[-1])+1)
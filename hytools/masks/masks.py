@@ -18,8 +18,11 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 '''
+import json
+import numpy as np
 from .calc_apply import *
 from .cloud import *
+from .packed import PackedMask
 
 mask_dict = {'ndi' : ndi,
              'neon_edge' : neon_edge,
@@ -29,14 +32,150 @@ mask_dict = {'ndi' : ndi,
              'water': water,
              'external' : external}
 
-def mask_create(hy_obj,masks):
-    ''' Combine a series of boolean masks using an
-    and operator
+# Mask terms evaluated independently for each pixel, other terms depend
+# on neighbouring pixels
+PIXEL_MASKS = ['ndi','kernel_finite','ancillary','external']
+
+def mask_key(hy_obj,mask_name,args):
+    '''Return a key identifying a mask term, masks with identical
+    names and arguments are shared.
+    '''
+    key = [mask_name,args]
+    if mask_name == 'kernel_finite':
+        key += [hy_obj.brdf.get(param) for param in ['volume','geometric','b/r','h/b']]
+    return json.dumps(key,sort_keys=True,default=str)
+
+def mask_term(hy_obj,mask_name,args):
+    '''Return a packed mask term of the full image, terms are
+    generated once per image and cached.
+    '''
+    key = mask_key(hy_obj,mask_name,args)
+    if key not in hy_obj.mask_terms:
+        hy_obj.mask_terms[key] = PackedMask(mask_dict[mask_name](hy_obj,args))
+    return hy_obj.mask_terms[key]
+
+def slice_window(shape,row_key,col_key):
+    '''Return the window (col_start,col_end,line_start,line_end) of a
+    line, column or chunk index and the index of the slice within the
+    window, None for other indices.
+    '''
+    window,window_key = [],[]
+    for key,size in [(col_key,shape[1]),(row_key,shape[0])]:
+        if isinstance(key,(int,np.integer)):
+            start = range(size)[key]
+            window += [start,start+1]
+            window_key.append(0)
+        elif isinstance(key,slice) and (key.step in [None,1]):
+            start,stop,_ = key.indices(size)
+            if stop <= start:
+                return None
+            window += [start,stop]
+            window_key.append(slice(None))
+        else:
+            return None
+    return tuple(window),(window_key[1],window_key[0])
+
+def slice_pixels(row_key,col_key):
+    '''Return the line and column indices of a pixel index, None for
+    other indices.
+    '''
+    if isinstance(row_key,slice) or isinstance(col_key,slice):
+        return None
+    lines,columns = np.asarray(row_key),np.asarray(col_key)
+    if (lines.dtype.kind not in 'iu') or (columns.dtype.kind not in 'iu'):
+        return None
+    lines,columns = np.broadcast_arrays(lines,columns)
+    if lines.size == 0:
+        return None
+    return lines,columns
+
+
+class LazyMask(PackedMask):
+    '''Combination of mask terms using an and operator.
+
+    Terms which depend on neighbouring pixels are generated for the full
+    scene when the mask is created. Lines, columns, chunks and pixels are
+    evaluated on request: pixel wise terms are evaluated on a view of the
+    slice (see HyTools.slice_view) and the other terms are sliced. Other
+    uses (full scene indexing, operators, conversion to an array) evaluate
+    all terms for the full scene in the packed domain, later slices are
+    unpacked from the result.
     '''
-    mask = np.copy(hy_obj.mask['no_data'])
 
-    for mask_name,args in masks:
-        mask &= mask_dict[mask_name](hy_obj,args)
+    def __init__(self,hy_obj,masks):
+        '''
+        Args:
+            hy_obj (HyTools file object): Image to mask.
+            masks (list): List of [mask_name, args] pairs.
 
-    return mask
+        Returns:
+            None.
 
+        '''
+        super().__init__(shape = (hy_obj.lines,hy_obj.columns))
+        self.hy_obj = hy_obj
+        self.masks = masks
+        for mask_name,args in masks:
+            if mask_name not in PIXEL_MASKS:
+                mask_term(hy_obj,mask_name,args)
+
+    @property
+    def packed(self):
+        if self._packed is None:
+            packed = np.copy(self.hy_obj.mask['no_data'].packed)
+            for mask_name,args in self.masks:
+                packed &= mask_term(self.hy_obj,mask_name,args).packed
+            self._packed = packed
+            self.hy_obj = None
+        return self._packed
+
+    @packed.setter
+    def packed(self,packed):
+        self._packed = packed
+
+    def __getitem__(self,key):
+        if (self._packed is None) and self.hy_obj.slice_masks:
+            row_key,col_key = self._row_key(key)
+            index = slice_window(self.shape,row_key,col_key)
+            if index is not None:
+                window,window_key = index
+                return self.evaluate(key,self.hy_obj.slice_view(window = window),window_key)
+            pixels = slice_pixels(row_key,col_key)
+            if pixels is not None:
+                view = self.hy_obj.slice_view(pixels = [index.ravel() for index in pixels])
+                return self.evaluate(key,view,0,pixels[0].shape)
+        return super().__getitem__(key)
+
+    def evaluate(self,key,view,view_key,shape = None):
+        '''Evaluate the mask on a slice of the image.
+
+        Args:
+            key (tuple): Index of the slice in the image.
+            view (HyTools file object): View of the slice.
+            view_key (tuple, int): Index of the slice in the view.
+            shape (tuple, optional): Shape of pixel slices.
+
+        Returns:
+            numpy.ndarray: Boolean mask of the slice.
+
+        '''
+        hy_obj = self.hy_obj
+        mask = hy_obj.mask['no_data'][key]
+        for mask_name,args in self.masks:
+            # Pixel wise terms already generated for the full image are sliced
+            if (mask_name in PIXEL_MASKS) and \
+                (mask_key(hy_obj,mask_name,args) not in hy_obj.mask_terms):
+                term = mask_term(view,mask_name,args)[view_key]
+                if shape is not None:
+                    term = np.reshape(term,shape)
+            else:
+                term = mask_term(hy_obj,mask_name,args)[key]
+            mask = mask & term
+        return mask
+
+
+def mask_create(hy_obj,masks):
+    ''' Combine a series of boolean masks using an
+    and operator
+    '''
+    return LazyMask(hy_obj,masks)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+'''
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Bit-packed boolean masks.
+
+Masks are stored with 8 pixels per byte along the column axis. Slicing
+a mask unpacks only the requested lines, so lines, chunks and pixels can
+be masked without holding a byte-per-pixel copy of the full scene.
+Masked values of full scene arrays are selected in blocks of lines with
+mask_select.
+
+'''
+import numpy as np
+
+
+class PackedMask:
+    '''Bit-packed 2D boolean mask.
+
+    Supports the indexing used to subset masks for lines, columns,
+    chunks and pixels, and converts to a full boolean array when used
+    as a numpy array or index.
+
+    '''
+
+    # Number of lines unpacked at once when extracting columns
+    block_size = 1024
+
+    def __init__(self,mask = None,shape = None,packed = None):
+        '''
+        Args:
+            mask (numpy.ndarray, optional): 2D boolean array to pack.
+            shape (tuple, optional): Mask shape (lines,columns), required when
+                                     initializing from packed data.
+            packed (numpy.ndarray, optional): Bit-packed mask data.
+
+        Returns:
+            None.
+
+        '''
+        if mask is not None:
+            mask = np.asarray(mask,dtype=bool)
+            shape = mask.shape
+            packed = np.packbits(mask,axis=-1)
+        self.shape = tuple(shape)
+        self._packed = packed
+
+    @property
+    def packed(self):
+        return self._packed
+
+    @packed.setter
+    def packed(self,packed):
+        self._packed = packed
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return np.dtype(bool)
+
+    @property
+    def size(self):
+        return self.shape[0]*self.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def unpack(self,rows = slice(None)):
+        '''Unpack lines of the mask.
+
+        Args:
+            rows (slice, list, numpy.ndarray): Line selection.
+
+        Returns:
+            numpy.ndarray: 2D boolean array (lines,columns).
+
+        '''
+        return np.unpackbits(self.packed[rows],axis=-1,
+                             count=self.shape[1]).view(bool)
+
+    def _row_key(self,key):
+        '''Split an index into line and column keys.
+        '''
+        if not isinstance(key,tuple):
+            key = (key,)
+        if len(key) == 1:
+            key = key + (slice(None),)
+        return key[0],key[1]
+
+    def __getitem__(self,key):
+        row_key,col_key = self._row_key(key)
+
+        if isinstance(row_key,(PackedMask,np.ndarray)) and np.asarray(row_key).dtype == bool:
+            return self.unpack()[np.asarray(row_key)]
+
+        if isinstance(row_key,(int,np.integer)):
+            return self.unpack([row_key])[0][col_key]
+
+        if isinstance(row_key,slice):
+            if isinstance(col_key,(int,np.integer)):
+                # Unpack in blocks to extract a column
+                rows = range(*row_key.indices(self.shape[0]))
+                column = [self.unpack(slice(start,min(start + self.block_size,rows.stop),rows.step))[:,col_key]
+                          for start in range(rows.start,rows.stop,self.block_size*rows.step)]
+                return np.concatenate(column) if column else np.zeros(0,dtype=bool)
+            return self.unpack(row_key)[:,col_key]
+
+        # Integer array of lines, unpack each line once
+        row_key = np.asarray(row_key)
+        lines,inverse = np.unique(row_key,return_inverse=True)
+        rows = self.unpack(lines)
+        inverse = inverse.reshape(row_key.shape)
+
+        if isinstance(col_key,slice):
+            return rows[inverse][...,col_key]
+        return rows[inverse,col_key]
+
+    def __setitem__(self,key,value):
+        row_key,col_key = self._row_key(key)
+
+        if (isinstance(row_key,(PackedMask,np.ndarray)) and np.asarray(row_key).dtype == bool) or \
+            isinstance(row_key,slice):
+            mask = self.unpack()
+            mask[key] = value
+            self.packed = np.packbits(mask,axis=-1)
+            return
+
+        row_key = np.atleast_1d(row_key)
+        lines,inverse = np.unique(row_key,return_inverse=True)
+        rows = self.unpack(lines).copy()
+        inverse = inverse.reshape(row_key.shape)
+        rows[inverse,col_key] = value
+        packed = self.packed.copy()
+        packed[lines] = np.packbits(rows,axis=-1)
+        self.packed = packed
+
+    def __array__(self,dtype = None,copy = None):
+        mask = self.unpack()
+        if dtype is not None:
+            mask = mask.astype(dtype)
+        return mask
+
+    def __invert__(self):
+        return PackedMask(shape = self.shape,packed = np.invert(self.packed))
+
+    def __and__(self,other):
+        if isinstance(other,PackedMask):
+            return PackedMask(shape = self.shape,
+                              packed = np.bitwise_and(self.packed,other.packed))
+        return self.unpack() & other
+
+    def __or__(self,other):
+        if isinstance(other,PackedMask):
+            return PackedMask(shape = self.shape,
+                              packed = np.bitwise_or(self.packed,other.packed))
+        return self.unpack() | other
+
+    __rand__ = __and__
+    __ror__ = __or__
+
+    def sum(self):
+        '''Return the number of True pixels.
+        '''
+        return int(sum(self.unpack(slice(start,start+self.block_size)).sum()
+                       for start in range(0,self.shape[0],self.block_size)))
+
+    def select(self,array):
+        '''Return the values of an array where the mask is True, the
+        mask is unpacked in blocks of lines.
+
+        Args:
+            array (numpy.ndarray): Array (lines,columns,...).
+
+        Returns:
+            numpy.ndarray: Masked values, same as array[mask].
+
+        '''
+        return np.concatenate([array[start:start+self.block_size][self.unpack(slice(start,start+self.block_size))]
+                               for start in range(0,self.shape[0],self.block_size)])
+
+    def astype(self,dtype):
+        return self.unpack().astype(dtype)
+
+    def copy(self):
+        return PackedMask(shape = self.shape,packed = self.packed.copy())
+
+
+def mask_select(array,mask):
+    '''Return the values of an array where a packed or boolean mask is
+    True.
+    '''
+    if isinstance(mask,PackedMask):
+        return mask.select(array)
+    return array[mask]
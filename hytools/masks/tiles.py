@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+'''
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Tiled neighborhood operations.
+
+Neighborhood operators (erosion, median filters, distance thresholds)
+are run over overlapping tiles. Each tile is extended by a halo on all
+sides, the operator is applied to the extended tile and only the tile
+interior is kept. When the halo is at least the operator's radius of
+influence the stitched result matches running the operator on the full
+image. At the image edges tiles are clipped to the image so edge
+handling is unchanged.
+
+'''
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import numpy as np
+
+TILE_SIZE = 512
+TILE_WORKERS = 4
+
+
+def tile_windows(shape,tile_size,halo):
+    '''Generate tile interior and halo extended windows.
+
+    Args:
+        shape (tuple): Image shape (lines,columns).
+        tile_size (int): Tile size in lines and columns.
+        halo (int): Number of overlapping pixels on each side of a tile.
+
+    Yields:
+        tuple: Interior window (y1,y2,x1,x2) and extended window (y1,y2,x1,x2).
+
+    '''
+    lines,columns = shape
+    for y1 in range(0,lines,tile_size):
+        y2 = min(y1+tile_size,lines)
+        for x1 in range(0,columns,tile_size):
+            x2 = min(x1+tile_size,columns)
+            yield ((y1,y2,x1,x2),
+                   (max(y1-halo,0),min(y2+halo,lines),
+                    max(x1-halo,0),min(x2+halo,columns)))
+
+
+def array_reader(*arrays):
+    '''Return a tile reader which subsets 2D arrays.
+
+    Args:
+        *arrays: 2D arrays (lines,columns) or dictionaries of 2D arrays.
+
+    Returns:
+        function: Tile reader.
+
+    '''
+    def reader(y1,y2,x1,x2):
+        tiles = []
+        for array in arrays:
+            if isinstance(array,dict):
+                tiles.append({key:value[y1:y2,x1:x2] for key,value in array.items()})
+            else:
+                tiles.append(array[y1:y2,x1:x2])
+        return tiles
+    return reader
+
+
+def band_reader(hy_obj,waves):
+    '''Return a tile reader which reads the bands closest to a list of
+    wavelengths, only the requested bands of each tile are read from the
+    image. Reads are serialized, tiles are processed in parallel.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        waves (list): Wavelengths in image units.
+
+    Returns:
+        function: Tile reader, returns a dictionary of 2D arrays keyed by
+        wavelength.
+
+    '''
+    bands = [hy_obj.wave_to_band(wave) for wave in waves]
+    lock = Lock()
+
+    def reader(y1,y2,x1,x2):
+        with lock:
+            chunk = hy_obj.get_chunk(x1,x2,y1,y2,bands = bands)
+        return [{wave:chunk[:,:,i] for i,wave in enumerate(waves)}]
+    return reader
+
+
+def tile_apply(operator,reader,shape,halo,tile_size = TILE_SIZE,
+               workers = TILE_WORKERS,dtype = bool):
+    '''Apply a neighborhood operator to an image in overlapping tiles.
+
+    Args:
+        operator (function): Function which takes the tile inputs returned by
+                             reader and returns a 2D array with the same shape
+                             as the tile.
+        reader (function): Function which takes a window (y1,y2,x1,x2) and
+                           returns a list of operator inputs.
+        shape (tuple): Image shape (lines,columns).
+        halo (int): Number of overlapping pixels, at least the radius of the
+                    operator neighborhood.
+        tile_size (int, optional): Tile size in lines and columns.
+                                   Defaults to 512.
+        workers (int, optional): Number of threads. Defaults to 4.
+        dtype (numpy.dtype, optional): Output data type. Defaults to bool.
+
+    Returns:
+        numpy.ndarray: Stitched output array (lines,columns).
+
+    '''
+    output = np.zeros(shape,dtype=dtype)
+    halo = int(np.ceil(halo))
+
+    def run(windows):
+        (y1,y2,x1,x2),(hy1,hy2,hx1,hx2) = windows
+        tile = operator(*reader(hy1,hy2,hx1,hx2))
+        output[y1:y2,x1:x2] = tile[y1-hy1:y2-hy1,x1-hx1:x2-hx1]
+
+    windows = tile_windows(shape,int(tile_size),halo)
+    if workers and workers > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(run,windows))
+    else:
+        for window in windows:
+            run(window)
+
+    return output
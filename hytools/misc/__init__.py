@@ -18,4 +18,10 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 """
-from .misc import *
\ No newline at end of file
+from .misc import *
+from .quantile import *
+from .counters import *
+from .trace import *
+from .cache import *
+from .geo import *
+from .chunks import *
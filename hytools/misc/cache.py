@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Content addressed correction coefficient cache.
+
+Coefficients are stored as JSON files named by a hash of the input
+files (pathname, size and modification time of the image and its
+ancillary files), the image state coefficients depend on (bad bands and
+previously applied corrections), the correction settings and the
+hytools version. Any change to these produces a new key, stale entries
+are never read.
+
+The cache directory defaults to ~/.cache/hytools, or the
+HYTOOLS_CACHE_DIR environment variable, and can be changed or disabled
+with set_cache_dir().
+
+"""
+import hashlib
+import json
+import os
+
+_cache_dir = os.environ.get('HYTOOLS_CACHE_DIR',
+                            os.path.join(os.path.expanduser("~"),'.cache','hytools'))
+
+
+def set_cache_dir(cache_dir):
+    '''Set the coefficient cache directory, None disables the cache.
+    '''
+    global _cache_dir
+    _cache_dir = cache_dir
+
+
+def get_cache_dir():
+    '''Return the coefficient cache directory, None when disabled.
+    '''
+    return _cache_dir
+
+
+def json_hash(obj):
+    '''Return a hash of a JSON serializable object, numpy arrays are
+    hashed by value.
+    '''
+    # Encode twice so objects hash the same before and after a JSON
+    # round trip, which turns integer keys into strings
+    encoded = json.dumps(obj,default = lambda x: x.tolist() if hasattr(x,'tolist') else str(x))
+    encoded = json.dumps(json.loads(encoded),sort_keys = True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def file_identity(file_name):
+    '''Return absolute pathname, size and modification time of a file.
+    '''
+    stat = os.stat(file_name)
+    return [os.path.abspath(file_name),stat.st_size,stat.st_mtime_ns]
+
+
+def image_state(hy_obj):
+    '''Return the image state correction coefficients depend on.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+
+    Returns:
+        dict: Input file identities, bad bands and applied corrections.
+
+    '''
+    files = [hy_obj.file_name]
+    for anc_path in hy_obj.anc_path.values():
+        if os.path.isfile(anc_path[0]) and (anc_path[0] not in files):
+            files.append(anc_path[0])
+
+    return {'files': [file_identity(file_name) for file_name in files],
+            'bad_bands': hy_obj.bad_bands,
+            'corrections': hy_obj.corrections,
+            'topo': hy_obj.topo if 'topo' in hy_obj.corrections else None,
+            'glint': hy_obj.glint if 'glint' in hy_obj.corrections else None}
+
+
+def coeff_key(kind,states,settings):
+    '''Return the cache key of correction coefficients.
+
+    Args:
+        kind (str): Correction type, ex. 'topo'.
+        states (list): Image states, see image_state(). Group fits are
+                       keyed on the states of all images in the group.
+        settings (dict): Correction settings.
+
+    Returns:
+        str: Cache key.
+
+    '''
+    from .. import __version__
+    return json_hash({'kind': kind,
+                      'states': states,
+                      'settings': settings,
+                      'version': __version__})
+
+
+def cache_load(key):
+    '''Load coefficients from the cache.
+
+    Args:
+        key (str): Cache key.
+
+    Returns:
+        dict: Coefficients, None if not cached or the cache is disabled.
+
+    '''
+    if _cache_dir is None:
+        return None
+    coeff_file = os.path.join(_cache_dir,'coeffs',key + '.json')
+    if not os.path.isfile(coeff_file):
+        return None
+    with open(coeff_file, 'r') as infile:
+        return json.load(infile)
+
+
+def cache_save(key,coeffs):
+    '''Save coefficients to the cache.
+
+    Args:
+        key (str): Cache key.
+        coeffs (dict): Coefficients.
+
+    Returns:
+        None.
+
+    '''
+    if _cache_dir is None:
+        return
+    coeff_dir = os.path.join(_cache_dir,'coeffs')
+    os.makedirs(coeff_dir,exist_ok = True)
+    coeff_file = os.path.join(coeff_dir,key + '.json')
+
+    # Write and rename so concurrent runs never read a partial file
+    with open(coeff_file + '.%s.tmp' % os.getpid(), 'w') as outfile:
+        json.dump(coeffs,outfile)
+    os.replace(coeff_file + '.%s.tmp' % os.getpid(),coeff_file)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Chunk planning.
+
+Chunks are planned as blocks of full width lines, which are contiguous
+on disk for BIL and BIP images and within each band plane of BSQ
+images, so every read is sequential. Blocks hold as many lines as fit a
+memory budget, estimated from the band count, data type and the working
+arrays of the enabled corrections and resampling, counting only the
+selected bands of band selective reads. NEON blocks spanning
+more than an HDF chunk are aligned to the HDF chunk lines so no HDF
+chunk is decompressed twice.
+
+Images too wide for a single line to fit the budget are split into
+column blocks. Plans and the HDF chunk lines are computed once per image
+and kept with the image object.
+
+"""
+import numpy as np
+
+# Working memory budget (bytes) of a chunk, corrections run fastest when
+# their working arrays stay in cache
+MEMORY_BUDGET = 8*1024**2
+
+# Float32 working copies of the spectra held while applying corrections
+# and resampling
+WORK_COPIES = {'topo': 3,
+               'brdf': 12,
+               'glint': 3,
+               'resample': 3}
+
+
+def plan_key(hy_obj,corrections = [],resample = False,bands = None):
+    '''Return the corrections, number of resamplers and number of bands
+    read, which determine the working memory of a pixel.
+    '''
+    resamplers = 0
+    if resample:
+        resamplers = len(resample) if isinstance(resample,list) else 1
+    bands = hy_obj.band_selection(bands)
+    count = hy_obj.bands if bands is None else len(bands)
+    return tuple(corrections),resamplers,count
+
+
+def pixel_memory(hy_obj,corrections = [],resample = False,bands = None):
+    '''Estimate the working memory of a pixel.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        corrections (list): Corrections to apply.
+        resample (bool, dict, list): Resampling, see HyTools.resample.
+        bands (str, list, numpy.ndarray, optional): Bands read, see
+                                                    HyTools.band_selection.
+
+    Returns:
+        int: Bytes per pixel.
+
+    '''
+    corrections,resamplers,count = plan_key(hy_obj,corrections,resample,bands)
+    copies = sum(WORK_COPIES.get(correction,0) for correction in corrections)
+    copies += WORK_COPIES['resample']*resamplers
+    if copies > 0:
+        # Data is converted to float32 before correcting
+        copies += 1
+    return count*(np.dtype(hy_obj.dtype).itemsize + 4*copies)
+
+
+def hdf_chunk_lines(hy_obj):
+    '''Return the number of lines of a NEON HDF chunk, 1 for contiguous
+    datasets and ENVI images. Set when NEON images are opened, otherwise
+    read on first call and kept with the image.
+    '''
+    if hy_obj.file_type != 'neon':
+        return 1
+    if hy_obj.chunk_lines is None:
+        hy_obj.load_data()
+        chunks = hy_obj.data.chunks
+        hy_obj.close_data()
+        hy_obj.chunk_lines = chunks[0] if chunks else 1
+    return hy_obj.chunk_lines
+
+
+def plan_iteration(hy_obj,corrections = [],resample = False,bands = None,
+                   memory = MEMORY_BUDGET):
+    '''Plan the iteration dimension and chunk size of an image.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        corrections (list): Corrections to apply.
+        resample (bool, dict, list): Resampling, see HyTools.resample.
+        bands (str, list, numpy.ndarray, optional): Bands read, see
+                                                    HyTools.band_selection.
+        memory (int, optional): Memory budget in bytes. Defaults to
+                                MEMORY_BUDGET.
+
+    Returns:
+        by (str): Iteration dimension, 'line' or 'chunk'.
+        chunk_size (tuple): Chunk size (lines,columns).
+
+    '''
+    key = plan_key(hy_obj,corrections,resample,bands) + (memory,)
+    if key not in hy_obj.plans:
+        hy_obj.plans[key] = plan_chunks(hy_obj,corrections,resample,bands,memory)
+    return hy_obj.plans[key]
+
+
+def plan_chunks(hy_obj,corrections,resample,bands,memory):
+    '''Plan the iteration dimension and chunk size of an image, see
+    plan_iteration.
+    '''
+    pixel_bytes = pixel_memory(hy_obj,corrections,resample,bands)
+    lines = int(memory // (pixel_bytes*hy_obj.columns))
+
+    if lines < 1:
+        columns = max(int(memory // pixel_bytes),1)
+        return 'chunk',(1,columns)
+
+    chunk_lines = hdf_chunk_lines(hy_obj)
+    if lines >= chunk_lines:
+        lines = lines // chunk_lines*chunk_lines
+    lines = min(lines,hy_obj.lines)
+    if lines == 1:
+        return 'line',(1,hy_obj.columns)
+    return 'chunk',(lines,hy_obj.columns)
+
+
+def chunk_windows(hy_obj,chunk_size,line_start = 0,line_end = None):
+    '''Split a band of lines into chunks.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        chunk_size (tuple): Chunk size (lines,columns).
+        line_start (int, optional): Starting line. Defaults to 0.
+        line_end (int, optional): Noninclusive ending line. Defaults to
+                                  hy_obj.lines.
+
+    Returns:
+        list: List of (col_start,col_end,line_start,line_end) tuples in
+        storage order.
+
+    '''
+    if line_end is None:
+        line_end = hy_obj.lines
+    return [(col,min(col+chunk_size[1],hy_obj.columns),line,min(line+chunk_size[0],line_end))
+            for line in range(line_start,line_end,chunk_size[0])
+            for col in range(0,hy_obj.columns,chunk_size[1])]
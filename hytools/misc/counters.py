@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Per stage timing and I/O counters.
+
+Counters are disabled by default, HyTools.counters and WriteENVI.counters
+are None and each instrumented call only checks for None. Stages:
+
+    read : Data slice reads, including byteswapping.
+    byteswap : Byte order conversion of slices from non native files.
+    decode : Decoding of slices from scaled integer and float16 images.
+    topo, brdf, glint : Correction of data slices.
+    resample : Wavelength resampling.
+    ancillary : Ancillary dataset reads.
+    mask : Mask generation.
+    iterate : Iterator.read_next calls, including all of the above.
+    write : WriteENVI writes.
+    encode : WriteENVI encoding to scaled integer and float16.
+    read_file : Image opening.
+    do:<function> : Functions run with HyTools.do, ex. coefficient
+                    calculation.
+
+When tracing is enabled each stage call is also recorded as a span, see
+hytools.misc.trace.
+
+ENVI images are memory mapped, pages are read from disk by the first
+stage which touches the data.
+
+"""
+import json
+import os
+import threading
+import time
+import numpy as np
+
+
+class Counters:
+    """Wall time, call count and bytes read, written and allocated per stage.
+
+    """
+
+    def __init__(self,trace = False):
+        """
+        Args:
+            trace (bool, optional): Record spans of each stage call.
+                                    Defaults to False.
+
+        Returns:
+            None.
+
+        """
+        self.stages = {}
+        self.spans = [] if trace else None
+
+    def add(self,stage,start,read = 0,written = 0,output = None):
+        '''Record a stage call.
+
+        Args:
+            stage (str): Stage name.
+            start (float): Stage start time from time.perf_counter().
+            read (int, optional): Bytes read. Defaults to 0.
+            written (int, optional): Bytes written. Defaults to 0.
+            output (numpy.ndarray, optional): Stage output, counted as
+                                              allocated when it owns its
+                                              data. Defaults to None.
+
+        Returns:
+            None.
+
+        '''
+        end = time.perf_counter()
+        counter = self.stages.get(stage)
+        if counter is None:
+            counter = self.stages[stage] = {'seconds': 0.,
+                                            'calls': 0,
+                                            'bytes_read': 0,
+                                            'bytes_written': 0,
+                                            'bytes_allocated': 0}
+        counter['seconds'] += end-start
+        counter['calls'] += 1
+        counter['bytes_read'] += int(read)
+        counter['bytes_written'] += int(written)
+        if isinstance(output,np.ndarray) and output.flags.owndata:
+            counter['bytes_allocated'] += output.nbytes
+        if self.spans is not None:
+            self.spans.append((stage,start,end,os.getpid(),threading.get_ident()))
+
+    def merge(self,other):
+        '''Add counts from another Counters object.
+        '''
+        for stage,other_counter in other.stages.items():
+            counter = self.stages.setdefault(stage,dict.fromkeys(other_counter,0))
+            for key,value in other_counter.items():
+                counter[key] += value
+        if other.spans is not None:
+            if self.spans is None:
+                self.spans = []
+            self.spans += other.spans
+        return self
+
+    def to_dict(self):
+        '''Return counts as a dictionary, sorted by stage.
+        '''
+        return {stage: dict(self.stages[stage]) for stage in sorted(self.stages)}
+
+
+def enable_counters(hy_obj,trace = False):
+    '''Enable counters on a HyTools object.
+    '''
+    hy_obj.counters = Counters(trace)
+
+
+def merge_counters(counters_list):
+    '''Merge a list of Counters objects, None entries are skipped.
+
+    Args:
+        counters_list (list): List of Counters objects.
+
+    Returns:
+        Counters: Merged counters.
+
+    '''
+    merged = Counters()
+    for counters in counters_list:
+        if counters is not None:
+            merged.merge(counters)
+    return merged
+
+
+def dump_counters(output_file,image_counters):
+    '''Write per image and total counters to a JSON file.
+
+    Args:
+        output_file (str): Output JSON pathname.
+        image_counters (dict): Counters objects keyed by image name.
+
+    Returns:
+        None.
+
+    '''
+    counters_dict = {'total': merge_counters(image_counters.values()).to_dict(),
+                     'images': {image: counters.to_dict() for image,counters in image_counters.items()}}
+    with open(output_file, 'w') as outfile:
+        json.dump(counters_dict,outfile,indent=3)
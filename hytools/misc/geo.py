@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Map coordinate functions.
+
+Transforms are affine transforms in GDAL geotransform order:
+
+    x = transform[0] + column*transform[1] + line*transform[2]
+    y = transform[3] + column*transform[4] + line*transform[5]
+
+Pixel coordinates refer to the upper left corner of a pixel, add 0.5 to
+lines and columns for pixel centers.
+
+"""
+import numpy as np
+
+
+def map_info_transform(map_info):
+    '''Return the transform of an ENVI map info list.
+
+    The reference pixel is given in one based file coordinates, (1,1) is
+    the upper left corner of the image. Rotation, if present, is the
+    counterclockwise rotation of the image grid in degrees.
+
+    Args:
+        map_info (list): ENVI map info.
+
+    Returns:
+        tuple: Transform.
+
+    '''
+    ref_x,ref_y = float(map_info[1])-1,float(map_info[2])-1
+    easting,northing = float(map_info[3]),float(map_info[4])
+    size_x,size_y = float(map_info[5]),float(map_info[6])
+
+    rotation = 0.
+    for item in map_info[7:]:
+        item = str(item).strip().lower()
+        if item.startswith('rotation'):
+            rotation = np.radians(float(item.split('=')[1]))
+
+    cos,sin = np.cos(rotation),np.sin(rotation)
+    transform = [0,cos*size_x,sin*size_y,0,sin*size_x,-cos*size_y]
+    transform[0] = easting - ref_x*transform[1] - ref_y*transform[2]
+    transform[3] = northing - ref_x*transform[4] - ref_y*transform[5]
+    return tuple(float(x) for x in transform)
+
+
+def transform_map_info(transform,map_info):
+    '''Return ENVI map info of a north up transform, projection entries
+    are copied from an existing map info list.
+
+    Args:
+        transform (tuple): Transform.
+        map_info (list): ENVI map info of the same projection.
+
+    Returns:
+        list: ENVI map info.
+
+    '''
+    map_info = [str(item).strip() for item in map_info]
+    map_info = [item for item in map_info if not item.lower().startswith('rotation')]
+    map_info[1:7] = ['1','1',str(transform[0]),str(transform[3]),
+                     str(transform[1]),str(-transform[5])]
+    return map_info
+
+
+def pixel_to_map(transform,line,column):
+    '''Convert pixel coordinates to map coordinates.
+
+    Args:
+        transform (tuple): Transform.
+        line (float, numpy.ndarray): Line coordinates.
+        column (float, numpy.ndarray): Column coordinates.
+
+    Returns:
+        x (float, numpy.ndarray): Map x coordinates.
+        y (float, numpy.ndarray): Map y coordinates.
+
+    '''
+    x = transform[0] + column*transform[1] + line*transform[2]
+    y = transform[3] + column*transform[4] + line*transform[5]
+    return x,y
+
+
+def map_to_pixel(transform,x,y):
+    '''Convert map coordinates to fractional pixel coordinates.
+
+    Args:
+        transform (tuple): Transform.
+        x (float, numpy.ndarray): Map x coordinates.
+        y (float, numpy.ndarray): Map y coordinates.
+
+    Returns:
+        line (float, numpy.ndarray): Line coordinates.
+        column (float, numpy.ndarray): Column coordinates.
+
+    '''
+    det = transform[1]*transform[5] - transform[2]*transform[4]
+    dx,dy = x - transform[0],y - transform[3]
+    column = (transform[5]*dx - transform[2]*dy)/det
+    line = (transform[1]*dy - transform[4]*dx)/det
+    return line,column
+
+
+def image_footprint(transform,lines,columns):
+    '''Return the map coordinates of the image corners.
+
+    Args:
+        transform (tuple): Transform.
+        lines (int): Number of lines.
+        columns (int): Number of columns.
+
+    Returns:
+        numpy.ndarray: Corner coordinates (4,2), upper left, upper right,
+        lower right and lower left.
+
+    '''
+    line = np.array([0,0,lines,lines])
+    column = np.array([0,columns,columns,0])
+    x,y = pixel_to_map(transform,line,column)
+    return np.stack([x,y],axis=1)
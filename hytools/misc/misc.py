@@ -46,9 +46,18 @@ def pairwise(iterable):
     next(b, None)
     return zip(a, b)
 
+def add_correction(hy_obj,correction):
+    hy_obj.corrections.append(correction)
+
+def get_attribute(hy_obj,name):
+    return getattr(hy_obj,name)
+
 def set_brdf(hy_obj,brdf_dict):
     hy_obj.brdf = brdf_dict
 
+def set_topo(hy_obj,topo_dict):
+    hy_obj.topo = topo_dict
+
 def update_brdf(hy_obj,args):
     hy_obj.brdf[args['key']] = args['value']
 
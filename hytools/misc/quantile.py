@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Mergeable streaming quantile sketch.
+
+The sketch is a merging t-digest (Dunning & Ertl, 2019) which summarizes
+the bulk of the distribution with weighted centroids. Centroids are small
+near the tails and large near the median which keeps relative rank error
+low at extreme percentiles. In addition the smallest and largest values
+are retained exactly so that the very low percentiles used to estimate
+dark object offsets (ex. 0.0001%) are exact for typical scene sizes.
+
+Dunning, T., & Ertl, O. (2019).
+Computing extremely accurate quantiles using t-digests.
+arXiv preprint arXiv:1902.04023.
+
+"""
+import numpy as np
+from .chunks import plan_iteration
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch.
+
+    Sketches can be updated chunk by chunk and merged across processes,
+    percentiles are estimated without holding the data in memory.
+
+    """
+
+    def __init__(self,compression = 1000,tail_size = 2048):
+        """
+        Args:
+            compression (int, optional): Compression parameter (delta), higher
+                                         values give more centroids and lower
+                                         error. Defaults to 1000.
+            tail_size (int, optional): Number of minimum and maximum values
+                                       stored exactly. Defaults to 2048.
+
+        Returns:
+            None.
+
+        """
+        self.compression = compression
+        self.tail_size = tail_size
+        self.count = 0
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.low = np.zeros(0)
+        self.high = np.zeros(0)
+
+    def update(self,values):
+        """Add values to the sketch, non-finite values are ignored.
+
+        Args:
+            values (numpy.ndarray): Array of values.
+
+        Returns:
+            None.
+
+        """
+        values = np.asarray(values,dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        self.count += values.size
+        self._update_tails(values,values)
+        self._compress(np.concatenate([self.means,values]),
+                       np.concatenate([self.weights,np.ones(values.size)]))
+
+    def merge(self,other):
+        """Merge another sketch into this sketch.
+
+        Args:
+            other (QuantileSketch): Sketch to merge.
+
+        Returns:
+            QuantileSketch: Merged sketch (self).
+
+        """
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self._update_tails(other.low,other.high)
+        self._compress(np.concatenate([self.means,other.means]),
+                       np.concatenate([self.weights,other.weights]))
+        return self
+
+    def _update_tails(self,low,high):
+        low = np.concatenate([self.low,low])
+        high = np.concatenate([self.high,high])
+        if low.size > self.tail_size:
+            low = np.partition(low,self.tail_size-1)[:self.tail_size]
+        if high.size > self.tail_size:
+            high = np.partition(high,high.size-self.tail_size)[-self.tail_size:]
+        self.low = np.sort(low)
+        self.high = np.sort(high)
+
+    def _compress(self,means,weights):
+        '''Merge centroids so that each spans at most one unit of the
+        k1 scale function.
+        '''
+        order = np.argsort(means,kind='mergesort')
+        means,weights = means[order],weights[order]
+        total = weights.sum()
+
+        # Quantile at the center of each centroid
+        q_center = (np.cumsum(weights) - weights/2)/total
+        k_scale = self.compression/(2*np.pi)*np.arcsin(2*q_center-1)
+        cluster = np.floor(k_scale - k_scale[0]).astype(np.int64)
+        cluster = np.unique(cluster,return_inverse=True)[1]
+
+        self.weights = np.bincount(cluster,weights=weights)
+        self.means = np.bincount(cluster,weights=means*weights)/self.weights
+
+    def _body_quantile(self,q):
+        '''Interpolate quantile from centroids.
+        '''
+        cum_weight = np.cumsum(self.weights) - self.weights/2
+        ranks = np.concatenate([[0],cum_weight,[self.count]])
+        values = np.concatenate([[self.low[0]],self.means,[self.high[-1]]])
+        return np.interp(q*self.count,ranks,values)
+
+    def quantile(self,q):
+        """Estimate quantile(s) of the data added to the sketch.
+
+        Ranks falling within the exactly stored tails are interpolated
+        the same way as numpy.quantile (linear method).
+
+        Args:
+            q (float, numpy.ndarray): Quantile(s) in the range [0,1].
+
+        Returns:
+            float, numpy.ndarray: Estimated quantile(s).
+
+        """
+        if self.count == 0:
+            return np.full(np.shape(q),np.nan)
+
+        q = np.clip(np.asarray(q,dtype=np.float64),0,1)
+        rank = q*(self.count-1)
+        result = self._body_quantile(q)
+
+        # Exact low tail
+        low_rank = np.minimum(rank,self.low.size-1)
+        low = np.interp(low_rank,np.arange(self.low.size),self.low)
+        result = np.where(rank <= self.low.size-1,low,result)
+
+        # Exact high tail
+        high_rank = rank - (self.count - self.high.size)
+        high = np.interp(np.maximum(high_rank,0),np.arange(self.high.size),self.high)
+        result = np.where(high_rank >= 0,high,result)
+
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+    def percentile(self,p):
+        """Estimate percentile(s), equivalent to numpy.percentile.
+
+        Args:
+            p (float, numpy.ndarray): Percentile(s) in the range [0,100].
+
+        Returns:
+            float, numpy.ndarray: Estimated percentile(s).
+
+        """
+        return self.quantile(np.asarray(p,dtype=np.float64)/100)
+
+    def cdf(self,x):
+        """Estimate the fraction of values less than or equal to x.
+
+        Args:
+            x (float, numpy.ndarray): Value(s).
+
+        Returns:
+            float, numpy.ndarray: Estimated cumulative fraction.
+
+        """
+        if self.count == 0:
+            return np.full(np.shape(x),np.nan)
+        cum_weight = np.cumsum(self.weights) - self.weights/2
+        ranks = np.concatenate([[0],cum_weight,[self.count]])
+        values = np.concatenate([[self.low[0]],self.means,[self.high[-1]]])
+        result = np.interp(x,values,ranks)/self.count
+        result = np.where(np.asarray(x) < self.low[0],0.,result)
+        result = np.where(np.asarray(x) >= self.high[-1],1.,result)
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+    def median_between(self,start,end):
+        """Estimate the median of values within the range (start,end).
+
+        Args:
+            start (float): Lower bound.
+            end (float): Upper bound.
+
+        Returns:
+            float: Estimated median.
+
+        """
+        return self.quantile((self.cdf(start) + self.cdf(end))/2)
+
+
+def sketch_array(array,mask = None,sketch = None,block_size = 256):
+    """Update a quantile sketch with values from a 2D array, in blocks of
+    lines.
+
+    Args:
+        array (numpy.ndarray): Input array (lines,columns).
+        mask (numpy.ndarray, optional): Boolean mask of values to include.
+        sketch (QuantileSketch, optional): Sketch to update, a new sketch is
+                                           created if not provided.
+        block_size (int, optional): Number of lines per update. Defaults to 256.
+
+    Returns:
+        QuantileSketch: Updated sketch.
+
+    """
+    if sketch is None:
+        sketch = QuantileSketch()
+
+    for start in range(0,array.shape[0],block_size):
+        block = array[start:start+block_size]
+        if mask is not None:
+            block = block[mask[start:start+block_size]]
+        sketch.update(block)
+    return sketch
+
+
+def sketch_image(hy_obj,values,bands,mask = None,sketch = None):
+    """Update a quantile sketch from image reads, chunk by chunk. Chunks
+    of the selected bands are read in blocks of lines planned by
+    plan_iteration for full spectra, NEON chunks are read with all bands
+    and values are computed in float64.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        values (function): Function returning the 2D array (lines,columns)
+                           of values of a chunk (lines,columns,bands),
+                           non-finite values are ignored.
+        bands (list): Band indices read.
+        mask (numpy.ndarray, PackedMask, optional): 2D mask of values to include.
+        sketch (QuantileSketch, optional): Sketch to update, a new sketch is
+                                           created if not provided.
+
+    Returns:
+        QuantileSketch: Updated sketch.
+
+    """
+    if sketch is None:
+        sketch = QuantileSketch()
+
+    _,chunk_size = plan_iteration(hy_obj)
+    iterator = hy_obj.iterate('chunk',chunk_size,bands = bands)
+    while not iterator.complete:
+        chunk = values(iterator.read_next())
+        line,column = iterator.current_line,iterator.current_column
+        if mask is not None:
+            chunk = chunk[mask[line:line+chunk.shape[0],column:column+chunk.shape[1]]]
+        sketch.update(chunk)
+    return sketch
+
+
+def merge_sketches(sketches):
+    """Merge a list of quantile sketches.
+
+    Args:
+        sketches (list): List of QuantileSketch objects.
+
+    Returns:
+        QuantileSketch: Merged sketch.
+
+    """
+    merged = QuantileSketch(sketches[0].compression,sketches[0].tail_size)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Cross process tracing in Chrome trace event format.
+
+Spans are recorded by Counters objects created with trace = True, each
+instrumented stage call (see hytools.misc.counters) is a span. Workers
+return their counters with task results, the driver process holds a
+single TraceCollector which adds the returned spans and its own spans,
+ex. time spent waiting on actors in call(), and writes one JSON file
+which can be opened with chrome://tracing or https://ui.perfetto.dev.
+
+Span times are taken from time.perf_counter(), a system wide monotonic
+clock, spans from processes on the same machine share a time base.
+
+"""
+import json
+import os
+from .counters import Counters
+
+# Trace collector of the driver process
+_collector = None
+
+
+class TraceCollector:
+    """Collect spans from the driver and worker processes.
+
+    """
+
+    def __init__(self):
+        self.counters = Counters(trace = True)
+        self.events = []
+
+    def add(self,counters,image = None):
+        '''Add spans from a Counters object.
+
+        Args:
+            counters (Counters): Worker counters.
+            image (str, optional): Image name added to span arguments.
+                                   Defaults to None.
+
+        Returns:
+            None.
+
+        '''
+        if (counters is None) or (counters.spans is None):
+            return
+        args = {'image': image} if image else {}
+        for stage,start,end,pid,tid in counters.spans:
+            self.events.append({'name': stage,
+                                'cat': stage.split(':')[0],
+                                'ph': 'X',
+                                'ts': start*1E6,
+                                'dur': (end-start)*1E6,
+                                'pid': pid,
+                                'tid': tid,
+                                'args': args})
+        counters.spans = []
+
+    def write(self,output_file):
+        '''Write collected spans to a Chrome trace event JSON file.
+        '''
+        self.add(self.counters)
+        driver = os.getpid()
+        names = [{'name': 'process_name',
+                  'ph': 'M',
+                  'pid': pid,
+                  'args': {'name': 'driver' if pid == driver else 'worker %s' % pid}}
+                 for pid in sorted({event['pid'] for event in self.events})]
+        events = sorted(self.events,key = lambda event: event['ts'])
+        with open(output_file, 'w') as outfile:
+            json.dump({'traceEvents': names + events,
+                       'displayTimeUnit': 'ms'},outfile)
+
+
+def start_trace():
+    '''Start collecting spans in the driver process.
+
+    Returns:
+        TraceCollector: Trace collector.
+
+    '''
+    global _collector
+    _collector = TraceCollector()
+    return _collector
+
+
+def get_collector():
+    '''Return the driver trace collector, None when tracing is not started.
+    '''
+    return _collector
+
+
+def stop_trace(output_file):
+    '''Write collected spans and stop collecting.
+
+    Args:
+        output_file (str): Output JSON pathname.
+
+    Returns:
+        None.
+
+    '''
+    global _collector
+    if _collector is not None:
+        _collector.write(output_file)
+    _collector = None
+
+
+def driver_span(stage,start):
+    '''Record a driver span when tracing is started.
+
+    Args:
+        stage (str): Span name.
+        start (float): Span start time from time.perf_counter().
+
+    Returns:
+        None.
+
+    '''
+    if _collector is not None:
+        _collector.counters.add(stage,start)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Mosaic images onto the union of their map grids.
+
+Images must share projection, pixel size and band count and be north up.
+The output is split into blocks of full width lines sized to a memory
+budget, each block is assembled from the overlapping full width lines of
+all images and written once, so blocks can be processed in parallel with
+any overlap rule:
+
+    first : First image in input order.
+    last : Last image in input order.
+    min_zenith : Image with the smallest sensor zenith angle, requires
+                 the 'sensor_zn' ancillary dataset.
+    mean : Mean of all images.
+
+No data pixels never contribute to the mosaic. When run with a
+TaskScheduler images are shipped to the workers once, each block task
+references the images overlapping it.
+
+"""
+import copy
+import sys
+import numpy as np
+from ..io.envi import WriteENVI,parse_envi_header
+from ..misc.geo import map_info_transform,transform_map_info
+
+OVERLAP_RULES = ['first','last','min_zenith','mean']
+
+# Memory budget (bytes) of a mosaic block
+BLOCK_MEMORY = 256*1024**2
+
+
+def mosaic_grid(hy_objs):
+    '''Calculate the union grid of a group of images.
+
+    Args:
+        hy_objs (list): List of HyTools objects.
+
+    Returns:
+        dict: Mosaic transform, map info, lines, columns and the
+        (line,column) offset of each image, None if the images cannot be
+        mosaicked.
+
+    '''
+    transforms = [map_info_transform(hy_obj.map_info) for hy_obj in hy_objs]
+    size_x,size_y = transforms[0][1],-transforms[0][5]
+
+    for hy_obj,transform in zip(hy_objs,transforms):
+        if (transform[2] != 0) or (transform[4] != 0):
+            print("ERROR: Rotated image %s cannot be mosaicked." % hy_obj.base_name)
+            return None
+        if not np.allclose([transform[1],-transform[5]],[size_x,size_y]):
+            print("ERROR: Pixel size of %s does not match." % hy_obj.base_name)
+            return None
+        if hy_obj.bands != hy_objs[0].bands:
+            print("ERROR: Band count of %s does not match." % hy_obj.base_name)
+            return None
+
+    ulx = min(transform[0] for transform in transforms)
+    uly = max(transform[3] for transform in transforms)
+    lrx = max(transform[0] + hy_obj.columns*size_x for hy_obj,transform in zip(hy_objs,transforms))
+    lry = min(transform[3] - hy_obj.lines*size_y for hy_obj,transform in zip(hy_objs,transforms))
+
+    offsets = []
+    for hy_obj,transform in zip(hy_objs,transforms):
+        line = (uly-transform[3])/size_y
+        column = (transform[0]-ulx)/size_x
+        if not np.allclose([line,column],np.round([line,column]),atol = 0.01):
+            print("WARNING: %s is not aligned with the mosaic grid, snapping to nearest pixel." % hy_obj.base_name)
+        offsets.append((int(round(line)),int(round(column))))
+
+    transform = (ulx,size_x,0.,uly,0.,-size_y)
+    return {'transform': transform,
+            'map_info': transform_map_info(transform,hy_objs[0].map_info),
+            'lines': int(round((uly-lry)/size_y)),
+            'columns': int(round((lrx-ulx)/size_x)),
+            'offsets': offsets}
+
+
+def mosaic_blocks(grid,hy_objs,block_lines = None,memory = BLOCK_MEMORY):
+    '''Split the mosaic grid into blocks of full width lines.
+
+    Args:
+        grid (dict): Mosaic grid, see mosaic_grid.
+        hy_objs (list): List of HyTools objects.
+        block_lines (int, optional): Lines per block. Defaults to None,
+                                     sized to the memory budget.
+        memory (int, optional): Memory budget of a block in bytes, the
+                                block, its image reads and the sums of the
+                                mean rule. Defaults to BLOCK_MEMORY.
+
+    Returns:
+        list: List of (line start, line end) tuples and the indices of
+        the images overlapping each block.
+
+    '''
+    if block_lines is None:
+        bands = hy_objs[0].bands
+        itemsize = max(np.dtype(hy_objs[0].dtype).itemsize,4)
+        line_bytes = (grid['columns'] + max(hy_obj.columns for hy_obj in hy_objs))*bands*itemsize
+        line_bytes += grid['columns']*bands*8
+        block_lines = max(int(memory // line_bytes),1)
+
+    blocks,groups = [],[]
+    for line_start in range(0,grid['lines'],block_lines):
+        line_end = min(line_start+block_lines,grid['lines'])
+        group = [i for i,(hy_obj,(line_offset,col_offset)) in enumerate(zip(hy_objs,grid['offsets']))
+                 if (line_offset < line_end) and (line_offset+hy_obj.lines > line_start)]
+        blocks.append((line_start,line_end,group))
+        groups.append(group)
+    return blocks,groups
+
+
+def mosaic_block(block,hy_objs,args):
+    '''Assemble and write a block of full width mosaic lines.
+
+    Args:
+        block (tuple): (line start, line end, indices of the images
+                       overlapping the block).
+        hy_objs (list): HyTools objects overlapping the block.
+        args (tuple): Mosaic grid, output pathname, overlap rule, band
+                      count, data type and no data value.
+
+    Returns:
+        None.
+
+    '''
+    grid,output_name,rule,bands,dtype,no_data = args
+    line_start,line_end,group = block
+    shape = (line_end-line_start,grid['columns'],bands)
+
+    if rule == 'mean':
+        total = np.zeros(shape)
+        count = np.zeros(shape[:2],dtype=np.int32)
+    else:
+        data = np.full(shape,no_data,dtype=dtype)
+        covered = np.zeros(shape[:2],dtype=bool)
+        if rule == 'min_zenith':
+            best = np.full(shape[:2],np.inf,dtype=np.float32)
+
+    for hy_obj,i in zip(hy_objs,group):
+        line_offset,col_offset = grid['offsets'][i]
+        l_start,l_end = max(line_start,line_offset),min(line_end,line_offset+hy_obj.lines)
+
+        chunk = hy_obj.get_chunk(0,hy_obj.columns,l_start-line_offset,l_end-line_offset)
+        valid = chunk[:,:,0] != hy_obj.no_data
+        window = (slice(l_start-line_start,l_end-line_start),
+                  slice(col_offset,col_offset+hy_obj.columns))
+
+        if rule == 'mean':
+            total[window][valid] += chunk[valid]
+            count[window][valid] += 1
+            continue
+        if rule == 'first':
+            valid &= ~covered[window]
+        elif rule == 'min_zenith':
+            zenith = hy_obj.get_anc_chunk('sensor_zn',0,hy_obj.columns,
+                                          l_start-line_offset,l_end-line_offset)
+            zenith = zenith.astype(np.float32)
+            valid &= zenith < best[window]
+            best[window][valid] = zenith[valid]
+        data[window][valid] = chunk[valid]
+        covered[window] |= valid
+
+    if rule == 'mean':
+        data = total/np.maximum(count,1)[:,:,np.newaxis]
+        if np.issubdtype(dtype,np.integer):
+            data = np.round(data)
+        data = data.astype(dtype)
+        data[count == 0] = no_data
+
+    header_dict = parse_envi_header(output_name + ".hdr")
+    writer = WriteENVI(output_name,header_dict,mode = 'r+')
+    writer.write_chunk(data,line_start,0)
+    writer.close()
+
+
+def mosaic(hy_objs,output_name,rule = 'first',scheduler = None,block_lines = None):
+    '''Mosaic a group of images.
+
+    Args:
+        hy_objs (list): List of HyTools objects.
+        output_name (str): Output ENVI pathname.
+        rule (str, optional): Overlap rule, see OVERLAP_RULES. Defaults
+                              to 'first'.
+        scheduler (TaskScheduler, optional): Scheduler used to process
+                                             blocks in parallel. Defaults
+                                             to None, blocks are processed
+                                             in this process.
+        block_lines (int, optional): Lines per block. Defaults to None,
+                                     sized to BLOCK_MEMORY.
+
+    Returns:
+        dict: Mosaic grid, None if the images cannot be mosaicked.
+
+    '''
+    if rule not in OVERLAP_RULES:
+        print("Unrecognized overlap rule: %s" % rule)
+        return None
+
+    if rule == 'min_zenith':
+        for hy_obj in hy_objs:
+            if 'sensor_zn' not in hy_obj.anc_path:
+                print("ERROR: Sensor zenith not found for %s." % hy_obj.base_name)
+                return None
+
+    grid = mosaic_grid(hy_objs)
+    if grid is None:
+        return None
+
+    header_dict = hy_objs[0].get_header()
+    header_dict['lines'] = grid['lines']
+    header_dict['samples'] = grid['columns']
+    header_dict['map info'] = grid['map_info']
+    header_dict['data ignore value'] = hy_objs[0].no_data
+    header_dict['byte order'] = int(sys.byteorder == 'big')
+    header_dict['header offset'] = 0
+    writer = WriteENVI(output_name,header_dict)
+    writer.close()
+
+    # Blocks read the data, masks are not shipped to workers
+    images = []
+    for hy_obj in hy_objs:
+        image = copy.copy(hy_obj)
+        image.mask = {}
+        image.ancillary = {}
+        images.append(image)
+
+    # Encoded images are read decoded and encoded on write
+    dtype = hy_objs[0].dtype if hy_objs[0].encoding is None else np.float32
+    args = (grid,output_name,rule,hy_objs[0].bands,dtype,hy_objs[0].no_data)
+    blocks,groups = mosaic_blocks(grid,images,block_lines)
+    if scheduler is None:
+        for block,group in zip(blocks,groups):
+            mosaic_block(block,[images[i] for i in group],args)
+    else:
+        scheduler.map_groups(mosaic_block,blocks,images,groups,args)
+    return grid
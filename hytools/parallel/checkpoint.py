@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Export checkpoint manifests.
+
+A manifest is a JSON file kept next to an output which records the
+bands of lines already written and a hash of the coefficients and
+settings used to produce them. Output files are synced to disk before
+the manifest is updated, lines recorded in a manifest survive a crash.
+A restarted export with the same hash only runs the missing bands of
+lines, any other hash starts the output from scratch.
+
+"""
+import json
+import os
+import time
+from ..misc.cache import json_hash
+from .scheduler import row_windows,ROWS_PER_TASK
+
+# Minimum time (s) between manifest writes
+FLUSH_INTERVAL = 30
+
+
+def checkpoint_hash(obj):
+    '''Return a hash of a JSON serializable object.
+    '''
+    return json_hash(obj)
+
+
+class Checkpoint:
+    """Manifest of bands of lines written to a group of output files.
+
+    """
+
+    def __init__(self,manifest_file,output_files,coeff_hash,lines,
+                 flush_interval = FLUSH_INTERVAL):
+        """
+        Args:
+            manifest_file (str): Manifest JSON pathname.
+            output_files (list): Pathnames of the output files.
+            coeff_hash (str): Hash of coefficients and export settings.
+            lines (int): Number of lines in the outputs.
+            flush_interval (float, optional): Minimum time (s) between
+                                              manifest writes. Defaults to 30.
+
+        Returns:
+            None.
+
+        """
+        self.manifest_file = manifest_file
+        self.output_files = output_files
+        self.coeff_hash = coeff_hash
+        self.lines = lines
+        self.flush_interval = flush_interval
+        self.completed = []
+        self.last_flush = time.perf_counter()
+
+    def load(self):
+        '''Load completed lines from an existing manifest.
+
+        Returns:
+            bool: True if the manifest matches the coefficient hash and
+            all output files exist.
+
+        '''
+        if not os.path.isfile(self.manifest_file):
+            return False
+        if not all(os.path.isfile(output_file) for output_file in self.output_files):
+            return False
+        with open(self.manifest_file, 'r') as infile:
+            manifest = json.load(infile)
+        if (manifest['coeff_hash'] != self.coeff_hash) or (manifest['lines'] != self.lines):
+            return False
+        self.completed = [tuple(window) for window in manifest['completed']]
+        return True
+
+    def add(self,window):
+        '''Record a band of lines as written, the manifest is written if
+        the flush interval has passed.
+        '''
+        self.completed.append(tuple(window))
+        if time.perf_counter()-self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        '''Sync outputs to disk and write the manifest.
+        '''
+        for output_file in self.output_files:
+            with open(output_file, 'r+b') as outfile:
+                os.fsync(outfile.fileno())
+
+        # Merge adjacent bands of lines
+        completed = []
+        for start,end in sorted(self.completed):
+            if completed and start <= completed[-1][1]:
+                completed[-1][1] = max(end,completed[-1][1])
+            else:
+                completed.append([start,end])
+        self.completed = [tuple(window) for window in completed]
+
+        manifest = {'coeff_hash': self.coeff_hash,
+                    'lines': self.lines,
+                    'completed': completed}
+        with open(self.manifest_file + '.tmp', 'w') as outfile:
+            json.dump(manifest,outfile)
+        os.replace(self.manifest_file + '.tmp',self.manifest_file)
+        self.last_flush = time.perf_counter()
+
+    def remaining(self,rows_per_task = ROWS_PER_TASK):
+        '''Return bands of lines not yet written.
+
+        Args:
+            rows_per_task (int, optional): Lines per task. Defaults to 256.
+
+        Returns:
+            list: List of (start line, end line) tuples.
+
+        '''
+        windows = []
+        for start,end in row_windows(self.lines,rows_per_task):
+            for done_start,done_end in self.completed:
+                if done_start <= start and end <= done_end:
+                    break
+            else:
+                windows.append((start,end))
+        return windows
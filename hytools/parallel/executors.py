@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Executors for running HyTools objects in parallel.
+
+Each image is held by an actor, a process which keeps a HyTools object in
+memory and runs its methods. Two backends are available:
+
+    ray : Ray actors.
+    local : Actors are assigned to a pool of at most num_cpus single
+            worker concurrent.futures.ProcessPoolExecutors, a worker holds
+            the images of all of its actors and runs their calls in
+            order. Large arrays are exchanged through shared memory rather
+            than pickled through the executor pipe.
+
+Functions which operate on groups of images take a list of actors and
+run methods using call(), which works with either backend. Ray is
+imported when a ray executor is created. When tracing is started the time
+the driver waits on each call() is recorded as a 'call:<method>' span.
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory,resource_tracker
+import os
+import time
+import numpy as np
+from ..misc.trace import driver_span
+
+# Arrays larger than this (bytes) are exchanged through shared memory
+SHARED_MIN_BYTES = 2**20
+
+# HyTools objects held by a local worker process, keyed by actor
+_images = {}
+
+
+class SharedArray:
+    """Numpy array stored in a shared memory block.
+
+    Only the block name, shape and data type are pickled. The receiving
+    process copies the array out of the block and releases it.
+
+    """
+
+    def __init__(self,array):
+        array = np.ascontiguousarray(array)
+        self.name = None
+        self.shape = array.shape
+        self.dtype = array.dtype
+        block = shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+        np.ndarray(self.shape,dtype=self.dtype,buffer=block.buf)[...] = array
+        self.name = block.name
+        block.close()
+
+    def load(self,release = True):
+        '''Copy array from shared memory.
+
+        Args:
+            release (bool, optional): Release the shared memory block.
+                                      Defaults to True.
+
+        Returns:
+            numpy.ndarray: Array.
+
+        '''
+        block = shared_memory.SharedMemory(name=self.name)
+        array = np.array(np.ndarray(self.shape,dtype=self.dtype,buffer=block.buf))
+        block.close()
+        if release:
+            block.unlink()
+        return array
+
+    def release(self):
+        '''Release the shared memory block.
+        '''
+        block = shared_memory.SharedMemory(name=self.name)
+        block.close()
+        block.unlink()
+
+
+def share(obj):
+    '''Replace large arrays in an object (array, list, tuple or dict) with
+    shared memory arrays.
+    '''
+    if isinstance(obj,np.ndarray) and (obj.dtype != object) and (obj.nbytes >= SHARED_MIN_BYTES):
+        return SharedArray(obj)
+    if isinstance(obj,(list,tuple)):
+        return type(obj)(share(item) for item in obj)
+    if isinstance(obj,dict) and type(obj) is dict:
+        return {key:share(value) for key,value in obj.items()}
+    return obj
+
+
+def unshare(obj):
+    '''Load shared memory arrays in an object.
+    '''
+    if isinstance(obj,SharedArray):
+        return obj.load()
+    if isinstance(obj,(list,tuple)):
+        return type(obj)(unshare(item) for item in obj)
+    if isinstance(obj,dict) and type(obj) is dict:
+        return {key:unshare(value) for key,value in obj.items()}
+    return obj
+
+
+def _call_actor(key,method,args,kwargs):
+    if key not in _images:
+        from ..base import HyTools
+        _images[key] = HyTools()
+    return share(getattr(_images[key],method)(*unshare(args),**unshare(kwargs)))
+
+
+def _release_actor(key):
+    _images.pop(key,None)
+
+
+class LocalActor:
+    """HyTools actor held by a local worker process.
+
+    """
+
+    def __init__(self,worker,key):
+        self.worker = worker
+        self.key = key
+
+    def submit(self,method,*args,**kwargs):
+        '''Submit a method call, returns a future.
+        '''
+        return self.worker.submit(_call_actor,self.key,method,share(args),share(kwargs))
+
+    def shutdown(self):
+        '''Release the HyTools object held by the worker.
+        '''
+        self.worker.submit(_release_actor,self.key).result()
+
+
+class RayExecutor:
+    """Create HyTools actors using ray.
+
+    """
+
+    def __init__(self,num_cpus = None):
+        import ray
+        if ray.is_initialized():
+            ray.shutdown()
+        ray.init(num_cpus = num_cpus)
+
+    def actors(self,count):
+        '''Create HyTools actors.
+        '''
+        import ray
+        from ..base import HyTools
+        hytools = ray.remote(HyTools)
+        return [hytools.remote() for i in range(count)]
+
+    def release(self,actors):
+        '''Stop actors.
+        '''
+        import ray
+        for actor in actors:
+            ray.kill(actor)
+
+    def shutdown(self):
+        import ray
+        ray.shutdown()
+
+
+class LocalExecutor:
+    """Create HyTools actors using local processes.
+
+    """
+
+    def __init__(self,num_cpus = None):
+        # Start the resource tracker before workers are created so shared
+        # memory blocks are tracked by a single process
+        resource_tracker.ensure_running()
+        self.num_cpus = num_cpus
+        self.workers = []
+        self._actors = []
+        self._count = 0
+
+    def actors(self,count):
+        '''Create HyTools actors, actors are assigned to at most num_cpus
+        worker processes.
+        '''
+        actors = []
+        for i in range(count):
+            if len(self.workers) < self.num_cpus:
+                self.workers.append(ProcessPoolExecutor(1))
+            # Assign actor to the worker holding the fewest actors
+            loads = [sum(actor.worker is worker for actor in self._actors + actors)
+                     for worker in self.workers]
+            actors.append(LocalActor(self.workers[loads.index(min(loads))],self._count))
+            self._count += 1
+        self._actors += actors
+        return actors
+
+    def release(self,actors):
+        '''Stop actors, workers without actors are stopped.
+        '''
+        for actor in actors:
+            actor.shutdown()
+            self._actors.remove(actor)
+        for worker in list(self.workers):
+            if not any(actor.worker is worker for actor in self._actors):
+                worker.shutdown()
+                self.workers.remove(worker)
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.shutdown()
+        self.workers = []
+        self._actors = []
+
+
+executor_dict = {'ray': RayExecutor,
+                 'local': LocalExecutor}
+
+
+def get_executor(backend = 'ray',num_cpus = None):
+    '''Create executor.
+
+    Args:
+        backend (str, optional): Executor backend, 'ray' or 'local'.
+                                 Defaults to 'ray'.
+        num_cpus (int, optional): Number of CPUs. Defaults to os.cpu_count().
+
+    Returns:
+        Executor object.
+
+    '''
+    if num_cpus is None:
+        num_cpus = os.cpu_count()
+    if backend not in executor_dict:
+        print("Unrecognized executor backend: %s" % backend)
+        return None
+    return executor_dict[backend](num_cpus)
+
+
+def call(actors,method,*args,**kwargs):
+    '''Run HyTools method on a list of actors and return the results.
+
+    Args:
+        actors (list): List of ray or local actors.
+        method (str): HyTools method name.
+        *args: Method arguments.
+        **kwargs: Method keyword arguments.
+
+    Returns:
+        list: Results for each actor.
+
+    '''
+    if len(actors) == 0:
+        return []
+    start = time.perf_counter()
+    if isinstance(actors[0],LocalActor):
+        futures = [actor.submit(method,*args,**kwargs) for actor in actors]
+        results = [unshare(future.result()) for future in futures]
+    else:
+        import ray
+        results = ray.get([getattr(actor,method).remote(*args,**kwargs) for actor in actors])
+    if method == 'do':
+        driver_span('call:do:%s' % args[0].__name__,start)
+    else:
+        driver_span('call:%s' % method,start)
+    return results
+
+
+def call_each(actors,method,*args):
+    '''Run HyTools method on a list of actors with a separate set of
+    arguments for each actor.
+
+    Args:
+        actors (list): List of ray or local actors.
+        method (str): HyTools method name.
+        *args: Method arguments, each a list with one entry per actor.
+
+    Returns:
+        list: Results for each actor.
+
+    '''
+    if len(actors) == 0:
+        return []
+    actor_args = list(zip(*args))
+    start = time.perf_counter()
+    if isinstance(actors[0],LocalActor):
+        futures = [actor.submit(method,*arg) for actor,arg in zip(actors,actor_args)]
+        results = [unshare(future.result()) for future in futures]
+    else:
+        import ray
+        results = ray.get([getattr(actor,method).remote(*arg) for actor,arg in zip(actors,actor_args)])
+    driver_span('call:%s' % method,start)
+    return results
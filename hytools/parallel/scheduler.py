@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Task scheduler for processing groups of images.
+
+Images are split into bands of lines and the resulting tasks are run on a
+fixed size pool of workers shared by all images, so the number of cores
+used does not depend on the number of images and a large image is
+processed by multiple workers. Each task writes its lines directly to the
+output file.
+
+Image objects are placed in the object store once, workers keep a small
+cache of deserialized images so consecutive tasks on the same image do
+not reload it. With the 'local' backend workers are processes of a
+concurrent.futures.ProcessPoolExecutor and pickled images are placed in
+shared memory. When tracing is started the time the driver waits on each
+submit() is recorded as a 'submit' span.
+
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor,as_completed
+import os
+import pickle
+import time
+import numpy as np
+from ..misc.trace import driver_span
+from .executors import SharedArray,call
+
+# Task worker held by a local worker process
+_worker = None
+
+ROWS_PER_TASK = 256
+
+
+class TaskWorker:
+    """Worker which runs tasks on cached image objects.
+
+    """
+
+    def __init__(self,cache_size = 4):
+        self.cache_size = cache_size
+        self.images = OrderedDict()
+
+    def get_image(self,key,ref):
+        '''Return image from cache, loading from the object store if needed.
+        '''
+        if key in self.images:
+            self.images.move_to_end(key)
+        else:
+            # Reference is wrapped in a list so it is not resolved when the
+            # task is submitted
+            if isinstance(ref[0],SharedArray):
+                self.images[key] = pickle.loads(ref[0].load(release = False).tobytes())
+            else:
+                import ray
+                self.images[key] = ray.get(ref[0])
+            if len(self.images) > self.cache_size:
+                self.images.popitem(last=False)
+        return self.images[key]
+
+    def run(self,function,key,ref,window,args):
+        '''Run function on an image, or an image window of lines.
+        '''
+        hy_obj = self.get_image(key,ref)
+        if window is None:
+            return function(hy_obj,args)
+        return function(hy_obj,window[0],window[1],args)
+
+    def run_group(self,function,item,keys,refs,args):
+        '''Run function on an item and a group of images.
+        '''
+        hy_objs = [self.get_image(key,ref) for key,ref in zip(keys,refs)]
+        return function(item,hy_objs,args)
+
+    def call(self,function,item,args):
+        '''Run function on an item which is not an image.
+        '''
+        return function(item,args)
+
+
+def _init_worker(cache_size):
+    global _worker
+    _worker = TaskWorker(cache_size)
+
+
+def _run_worker(method,task_args):
+    return getattr(_worker,method)(*task_args)
+
+
+def row_windows(lines,rows_per_task = ROWS_PER_TASK):
+    '''Split image lines into bands of rows.
+
+    Args:
+        lines (int): Number of image lines.
+        rows_per_task (int, optional): Lines per task. Defaults to 256.
+
+    Returns:
+        list: List of (start line, end line) tuples.
+
+    '''
+    return [(start,min(start+rows_per_task,lines)) for start in range(0,lines,rows_per_task)]
+
+
+def prepare_image(hy_obj):
+    '''Prepare image to be shipped to workers.
+
+    Corrections are run on a single pixel chunk so scene level correction
+    arrays (ex. glint) are computed once and shipped with the image.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+
+    Returns:
+        HyTools file object: Image.
+
+    '''
+    hy_obj.get_chunk(0,1,0,1,corrections = hy_obj.corrections)
+    return hy_obj
+
+
+def actor_images(actors):
+    '''Retrieve prepared image objects from HyTools actors.
+
+    Args:
+        actors (list): List of HyTools ray or local actors.
+
+    Returns:
+        list: HyTools objects.
+
+    '''
+    return call(actors,'do',prepare_image)
+
+
+class TaskScheduler:
+    """Run tasks for groups of images on a fixed pool of ray or local workers.
+
+    """
+
+    def __init__(self,num_workers = None,cache_size = 4,max_pending = 2,
+                 backend = 'ray'):
+        """
+        Args:
+            num_workers (int, optional): Number of workers, defaults to the
+                                         number of CPUs.
+            cache_size (int, optional): Number of images cached by each worker.
+                                        Defaults to 4.
+            max_pending (int, optional): Number of tasks queued on each worker.
+                                         Defaults to 2.
+            backend (str, optional): Worker backend, 'ray' or 'local'.
+                                     Defaults to 'ray'.
+
+        Returns:
+            None.
+
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count()
+        self.backend = backend
+        self.max_pending = max_pending
+        self.refs = {}
+
+        if backend == 'local':
+            self.pool = ProcessPoolExecutor(num_workers,initializer = _init_worker,
+                                            initargs = (cache_size,))
+            self.workers = []
+            return
+
+        import ray
+        if not ray.is_initialized():
+            ray.init(num_cpus = num_workers)
+        worker = ray.remote(TaskWorker)
+        self.workers = [worker.remote(cache_size) for i in range(num_workers)]
+
+    def put(self,hy_obj):
+        '''Place image in the object store, images are shipped once.
+        '''
+        key = hy_obj.file_name
+        if key not in self.refs:
+            if self.backend == 'local':
+                pickled = np.frombuffer(pickle.dumps(hy_obj),dtype = np.uint8)
+                self.refs[key] = SharedArray(pickled)
+            else:
+                import ray
+                self.refs[key] = ray.put(hy_obj)
+        return key
+
+    def submit(self,tasks,callback = None):
+        '''Run tasks on the worker pool, tasks are dispatched to workers
+        as they become available.
+
+        Args:
+            tasks (list): List of (method name, arguments) tuples.
+            callback (function, optional): Function run in the driver as
+                                           each task finishes,
+                                           callback(task index, result).
+                                           Defaults to None.
+
+        Returns:
+            list: Task results in order.
+
+        '''
+        start = time.perf_counter()
+        if self.backend == 'local':
+            # The process pool hands queued tasks to workers as they finish
+            futures = {self.pool.submit(_run_worker,method,task_args):i
+                       for i,(method,task_args) in enumerate(tasks)}
+            results = [None]*len(tasks)
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if callback:
+                    callback(i,results[i])
+            driver_span('submit',start)
+            return results
+
+        import ray
+        results = [None]*len(tasks)
+        available = self.workers*self.max_pending
+        pending = {}
+        queue = list(enumerate(tasks))[::-1]
+
+        while queue or pending:
+            while queue and available:
+                worker = available.pop(0)
+                i,(method,task_args) = queue.pop()
+                pending[getattr(worker,method).remote(*task_args)] = (i,worker)
+
+            done,_ = ray.wait(list(pending),num_returns = 1)
+            for future in done:
+                i,worker = pending.pop(future)
+                results[i] = ray.get(future)
+                available.append(worker)
+                if callback:
+                    callback(i,results[i])
+        driver_span('submit',start)
+        return results
+
+    def map(self,function,items,args = None):
+        '''Run function(item,args) for each item.
+        '''
+        return self.submit([('call',(function,item,args)) for item in items])
+
+    def map_images(self,function,hy_objs,args = None):
+        '''Run function(hy_obj,args) for each image.
+        '''
+        tasks = []
+        for hy_obj in hy_objs:
+            key = self.put(hy_obj)
+            tasks.append(('run',(function,key,[self.refs[key]],None,args)))
+        return self.submit(tasks)
+
+    def map_groups(self,function,items,hy_objs,groups,args = None):
+        '''Run function(item,images,args) for each item, images are the
+        group of hy_objs listed for the item.
+
+        Args:
+            function (function): Function to run on each item.
+            items (list): List of items.
+            hy_objs (list): List of HyTools objects.
+            groups (list): List of hy_objs indices for each item.
+            args (optional): Arguments passed to function.
+
+        Returns:
+            list: Task results in order.
+
+        '''
+        keys = [self.put(hy_obj) for hy_obj in hy_objs]
+        tasks = []
+        for item,group in zip(items,groups):
+            group_keys = [keys[i] for i in group]
+            tasks.append(('run_group',(function,item,group_keys,
+                                       [[self.refs[key]] for key in group_keys],args)))
+        return self.submit(tasks)
+
+    def map_rows(self,function,hy_objs,args = None,rows_per_task = ROWS_PER_TASK,
+                 windows = None,callback = None):
+        '''Run function(hy_obj,start,end,args) for bands of lines from
+        each image.
+
+        Args:
+            function (function): Function to run on each band of lines.
+            hy_objs (list): List of HyTools objects.
+            args (optional): Arguments passed to function.
+            rows_per_task (int, optional): Lines per task. Defaults to 256.
+            windows (list, optional): List of (start line, end line) tuples
+                                      to run for each image. Defaults to
+                                      all lines split into rows_per_task
+                                      bands.
+            callback (function, optional): Function run in the driver as
+                                           each task finishes,
+                                           callback(image index, window, result).
+                                           Defaults to None.
+
+        Returns:
+            list: List of task results for each image.
+
+        '''
+        if windows is None:
+            windows = [row_windows(hy_obj.lines,rows_per_task) for hy_obj in hy_objs]
+
+        tasks,task_windows,image_tasks = [],[],[]
+        for i,hy_obj in enumerate(hy_objs):
+            image_tasks.append(len(windows[i]))
+            if len(windows[i]) == 0:
+                continue
+            key = self.put(hy_obj)
+            for window in windows[i]:
+                tasks.append(('run',(function,key,[self.refs[key]],window,args)))
+                task_windows.append((i,window))
+
+        task_callback = None
+        if callback:
+            def task_callback(task,result):
+                callback(task_windows[task][0],task_windows[task][1],result)
+        results = self.submit(tasks,task_callback)
+
+        image_results = []
+        for count in image_tasks:
+            image_results.append(results[:count])
+            results = results[count:]
+        return image_results
+
+    def shutdown(self):
+        '''Stop workers.
+        '''
+        if self.backend == 'local':
+            self.pool.shutdown()
+            for ref in self.refs.values():
+                ref.release()
+        else:
+            import ray
+            for worker in self.workers:
+                ray.kill(worker)
+        self.workers = []
+        self.refs = {}
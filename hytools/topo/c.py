@@ -36,8 +36,8 @@ TODO: Rationale/ examples for using different fitting algorithms
 """
 
 import numpy as np
-from scipy.optimize import nnls
 from ..io.envi import WriteENVI
+from ..masks.packed import mask_select
 
 def calc_c(data,cosine_i,fit_type = 'ols'):
     """Calculate the topographic correction coefficient (c) for the input data.
@@ -61,6 +61,7 @@ def calc_c(data,cosine_i,fit_type = 'ols'):
     if fit_type == 'ols':
         slope, intercept = np.linalg.lstsq(X, data,rcond=-1)[0].flatten()
     elif fit_type == 'nnls':
+        from scipy.optimize import nnls
         slope, intercept = nnls(X, data)[0].flatten()
 
     # Eq 8. Soenen et al. 2005
@@ -83,12 +84,12 @@ def calc_c_coeffs(hy_obj,topo_dict):
     '''
 
     topo_dict['coeffs'] = {}
-    cosine_i = hy_obj.cosine_i()
+    cosine_i = mask_select(hy_obj.cosine_i(),hy_obj.mask['calc_topo'])
 
     for band_num,band in enumerate(hy_obj.bad_bands):
         if ~band:
             band = hy_obj.get_band(band_num,mask='calc_topo')
-            topo_dict['coeffs'][band_num] = calc_c(band,cosine_i[hy_obj.mask['calc_topo']],
+            topo_dict['coeffs'][band_num] = calc_c(band,cosine_i,
                                                    fit_type=topo_dict['c_fit_type'])
     hy_obj.topo = topo_dict
 
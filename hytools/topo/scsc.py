@@ -36,6 +36,7 @@ TODO: Rationale/ examples for using different fitting algorithms
 """
 import numpy as np
 from .c import calc_c
+from ..masks.packed import mask_select
 
 def calc_scsc_c1(solar_zn,slope):
     """ Calculate c1
@@ -66,12 +67,12 @@ def calc_scsc_coeffs(hy_obj,topo_dict):
     '''
 
     topo_dict['coeffs'] = {}
-    cosine_i = hy_obj.cosine_i()
+    cosine_i = mask_select(hy_obj.cosine_i(),hy_obj.mask['calc_topo'])
 
     for band_num,band in enumerate(hy_obj.bad_bands):
         if ~band:
             band = hy_obj.get_band(band_num,mask='calc_topo')
-            topo_dict['coeffs'][band_num] = calc_c(band,cosine_i[hy_obj.mask['calc_topo']],
+            topo_dict['coeffs'][band_num] = calc_c(band,cosine_i,
                                                    fit_type=topo_dict['c_fit_type'])
     hy_obj.topo = topo_dict
 
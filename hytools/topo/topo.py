@@ -22,13 +22,15 @@ Topographic correction
 """
 import json
 import numpy as np
-import ray
+from ..parallel.executors import call,call_each
 from .modminn import apply_modminn,calc_modminn_coeffs
 from .scsc import apply_scsc,calc_scsc_coeffs
 from .cosine import apply_cosine,calc_cosine_coeffs
 from .c import apply_c,calc_c_coeffs
 from .scs import apply_scs,calc_scs_coeffs
 from ..masks import mask_create
+from ..misc import add_correction,get_attribute,set_topo
+from ..misc import image_state,coeff_key,cache_load,cache_save
 
 def calc_cosine_i(solar_zn, solar_az, aspect ,slope):
     """Generate cosine i image. The cosine of the incidence angle (i) is
@@ -87,30 +89,46 @@ def calc_topo_coeffs(actors,topo_dict):
 
     if topo_dict['type'] == 'precomputed':
         print("Using precomputed topographic coefficients.")
-        _ = ray.get([a.do.remote(load_topo_precomputed,topo_dict) for a in actors])
+        _ = call(actors,'do',load_topo_precomputed,topo_dict)
 
     else:
-        print("Calculating topographic coefficients.")
+        # Coefficients are cached per image
+        keys = [coeff_key('topo',[state],topo_dict) for state in call(actors,'do',image_state)]
+        cached = [cache_load(key) for key in keys]
+        hits = [i for i,coeffs in enumerate(cached) if coeffs is not None]
+        if len(hits) > 0:
+            print("Using cached topographic coefficients for %s of %s images." % (len(hits),len(actors)))
+            _ = call_each([actors[i] for i in hits],'do',[set_topo]*len(hits),
+                          [cached[i] for i in hits])
 
-        _ = ray.get([a.gen_mask.remote(mask_create,'calc_topo',
-                                       topo_dict['calc_mask']) for a in actors])
+        calc_actors = [actor for i,actor in enumerate(actors) if i not in hits]
+        calc_keys = [key for i,key in enumerate(keys) if i not in hits]
 
-        if topo_dict['type'] == 'scs+c':
-            _ = ray.get([a.do.remote(calc_scsc_coeffs,topo_dict) for a in actors])
+        if len(calc_actors) > 0:
+            print("Calculating topographic coefficients.")
 
-        elif topo_dict['type'] == 'scs':
-            _ = ray.get([a.do.remote(calc_scs_coeffs,topo_dict) for a in actors])
+            _ = call(calc_actors,'gen_mask',mask_create,'calc_topo',
+                     topo_dict['calc_mask'])
 
-        elif topo_dict['type'] == 'mod_minneart':
-            _ = ray.get([a.do.remote(calc_modminn_coeffs,topo_dict) for a in actors])
+            if topo_dict['type'] == 'scs+c':
+                _ = call(calc_actors,'do',calc_scsc_coeffs,topo_dict)
 
-        elif topo_dict['type'] == 'cosine':
-            _ = ray.get([a.do.remote(calc_cosine_coeffs,topo_dict) for a in actors])
+            elif topo_dict['type'] == 'scs':
+                _ = call(calc_actors,'do',calc_scs_coeffs,topo_dict)
 
-        elif topo_dict['type'] == 'c':
-            _ = ray.get([a.do.remote(calc_c_coeffs,topo_dict) for a in actors])
+            elif topo_dict['type'] == 'mod_minneart':
+                _ = call(calc_actors,'do',calc_modminn_coeffs,topo_dict)
 
-    _ = ray.get([a.do.remote(lambda x: x.corrections.append('topo')) for a in actors])
+            elif topo_dict['type'] == 'cosine':
+                _ = call(calc_actors,'do',calc_cosine_coeffs,topo_dict)
+
+            elif topo_dict['type'] == 'c':
+                _ = call(calc_actors,'do',calc_c_coeffs,topo_dict)
+
+            for key,coeffs in zip(calc_keys,call(calc_actors,'do',get_attribute,'topo')):
+                cache_save(key,coeffs)
+
+    _ = call(actors,'do',add_correction,'topo')
 
 
 
@@ -20,3 +20,4 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 Transform functions
 """
 from .resampling import *
+from .decomposition import *
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools:  Hyperspectral image processing library
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus, Zhiwei Ye, Philip Townsend.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Streaming principal component (PCA) and minimum noise fraction (MNF)
+transforms.
+
+Mean and covariance are accumulated over all valid pixels in a single
+chunked pass. Statistics of separate chunks, bands of lines or images
+are merged exactly, so the pass can be split across workers. Noise
+covariance for MNF is estimated from differences between horizontally
+adjacent pixels.
+
+Transforms are dictionaries holding a float32 projection matrix with
+centering and standardization folded in:
+
+    components = pixels @ transform['projection'] - transform['offset']
+    pixels ~ components @ transform['inverse'] + transform['mean']
+
+"""
+import numpy as np
+
+# Column width of chunks read by image_covariance
+CHUNK_COLUMNS = 500
+
+
+class CovarianceStats:
+    """Running mean and covariance of a set of spectra.
+
+    """
+
+    def __init__(self,bands):
+        self.count = 0
+        self.mean = np.zeros(bands)
+        self.m2 = np.zeros((bands,bands))
+
+    def update(self,X):
+        '''Add spectra.
+
+        Args:
+            X (numpy.ndarray): Spectra (samples,bands).
+
+        Returns:
+            None.
+
+        '''
+        if X.shape[0] == 0:
+            return
+        X = X.astype(np.float64)
+        other = CovarianceStats(X.shape[1])
+        other.count = X.shape[0]
+        other.mean = X.mean(axis=0)
+        X -= other.mean
+        other.m2 = X.T @ X
+        self.merge(other)
+
+    def merge(self,other):
+        '''Merge statistics of another set of spectra.
+        '''
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta*other.count/count
+        self.m2 = self.m2 + other.m2 + np.outer(delta,delta)*self.count*other.count/count
+        self.count = count
+        return self
+
+    def covariance(self):
+        '''Return the sample covariance matrix.
+        '''
+        return self.m2/max(self.count-1,1)
+
+
+def image_covariance(hy_obj,line_start = 0,line_end = None,bands = None):
+    '''Accumulate data and noise statistics of valid pixels in a band of
+    lines.
+
+    Pixels are valid when not masked as no data and all selected bands are
+    finite. Noise statistics are accumulated from differences between
+    horizontally adjacent valid pixels.
+
+    Args:
+        hy_obj (HyTools file object): Image.
+        line_start (int, optional): Starting line. Defaults to 0.
+        line_end (int, optional): Noninclusive ending line. Defaults to
+                                  hy_obj.lines.
+        bands (numpy.ndarray, optional): Boolean array of bands to include.
+                                         Defaults to the good bands.
+
+    Returns:
+        CovarianceStats: Data statistics.
+        CovarianceStats: Noise statistics.
+
+    '''
+    if line_end is None:
+        line_end = hy_obj.lines
+    if bands is None:
+        bands = ~hy_obj.bad_bands
+
+    stats = CovarianceStats(bands.sum())
+    noise = CovarianceStats(bands.sum())
+
+    for col_start in range(0,hy_obj.columns,CHUNK_COLUMNS):
+        col_end = min(col_start+CHUNK_COLUMNS,hy_obj.columns)
+        chunk = hy_obj.get_chunk(col_start,col_end,line_start,line_end,bands = bands)
+        valid = hy_obj.mask['no_data'][line_start:line_end,col_start:col_end]
+        valid = valid & np.isfinite(chunk).all(axis=2)
+
+        stats.update(chunk[valid])
+
+        pairs = valid[:,1:] & valid[:,:-1]
+        noise.update(chunk[:,1:][pairs].astype(np.float64) - chunk[:,:-1][pairs])
+
+    return stats,noise
+
+
+def merge_stats(stats_list):
+    '''Merge a list of CovarianceStats objects.
+    '''
+    merged = CovarianceStats(len(stats_list[0].mean))
+    for stats in stats_list:
+        merged.merge(stats)
+    return merged
+
+
+def _transform(kind,stats,projection,inverse,eigenvalues,components):
+    projection = projection[:,:components]
+    return {'type': kind,
+            'mean': stats.mean.astype(np.float32),
+            'projection': projection.astype(np.float32),
+            'offset': (stats.mean @ projection).astype(np.float32),
+            'inverse': inverse[:components].astype(np.float32),
+            'eigenvalues': eigenvalues[:components]}
+
+
+def pca_transform(stats,components,standardize = True):
+    '''Calculate a PCA transform.
+
+    Args:
+        stats (CovarianceStats): Data statistics.
+        components (int): Number of components.
+        standardize (bool, optional): Scale bands to unit variance before
+                                      decomposition. Defaults to True.
+
+    Returns:
+        dict: Transform.
+
+    '''
+    covariance = stats.covariance()
+    scale = np.ones(len(stats.mean))
+    if standardize:
+        scale = np.sqrt(np.diag(covariance))
+        scale[scale == 0] = 1
+        covariance = covariance/np.outer(scale,scale)
+
+    eigenvalues,eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues,eigenvectors = eigenvalues[order],eigenvectors[:,order]
+
+    projection = eigenvectors/scale[:,np.newaxis]
+    inverse = eigenvectors.T*scale[np.newaxis,:]
+    return _transform('pca',stats,projection,inverse,eigenvalues,components)
+
+
+def mnf_transform(stats,noise,components):
+    '''Calculate an MNF transform, components are ordered by decreasing
+    signal to noise ratio.
+
+    Args:
+        stats (CovarianceStats): Data statistics.
+        noise (CovarianceStats): Noise (shift difference) statistics.
+        components (int): Number of components.
+
+    Returns:
+        dict: Transform.
+
+    '''
+    # Shift differences have twice the noise variance
+    noise_covariance = noise.m2/max(noise.count-1,1)/2
+
+    # Whiten noise, small eigenvalues are clipped to keep the
+    # whitening matrix finite
+    noise_values,noise_vectors = np.linalg.eigh(noise_covariance)
+    noise_values = np.maximum(noise_values,noise_values.max()*1E-10)
+    whiten = noise_vectors/np.sqrt(noise_values)[np.newaxis,:]
+    unwhiten = noise_vectors.T*np.sqrt(noise_values)[:,np.newaxis]
+
+    eigenvalues,eigenvectors = np.linalg.eigh(whiten.T @ stats.covariance() @ whiten)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues,eigenvectors = eigenvalues[order],eigenvectors[:,order]
+
+    projection = whiten @ eigenvectors
+    inverse = eigenvectors.T @ unwhiten
+    return _transform('mnf',stats,projection,inverse,eigenvalues,components)
+
+
+def apply_transform(X,transform):
+    '''Project spectra onto transform components.
+
+    Args:
+        X (numpy.ndarray): Spectra (...,bands).
+        transform (dict): Transform.
+
+    Returns:
+        numpy.ndarray: Components (...,components), float32.
+
+    '''
+    return X.astype(np.float32) @ transform['projection'] - transform['offset']
+
+
+def inverse_transform(Y,transform):
+    '''Reconstruct spectra from transform components.
+
+    Args:
+        Y (numpy.ndarray): Components (...,components).
+        transform (dict): Transform.
+
+    Returns:
+        numpy.ndarray: Spectra (...,bands), float32.
+
+    '''
+    return Y.astype(np.float32) @ transform['inverse'] + transform['mean']
@@ -21,7 +21,14 @@ Spectral resampling functions.
 
 """
 import numpy as np
-from scipy.interpolate import interp1d
+
+# Maximum number of resamplers held in the HyTools registry
+RESAMPLER_CACHE_SIZE = 8
+
+# Interpolation kinds weighting at most two neighboring input bands,
+# stored as sparse transforms so non-finite input bands only affect
+# the output bands they are interpolated to
+SPARSE_KINDS = ['linear', 'nearest', 'nearest-up', 'zero', 'slinear']
 
 
 def gaussian(x,mu,fwhm):
@@ -89,44 +96,149 @@ def calc_resample_coeffs(in_wave,in_fwhm,out_wave,out_fwhm, spacing = 1):
     return coeffs
 
 
-def apply_resampler(hy_obj,data):
-    ''' Apply SCSS correction to a slice of the data
+def calc_interp_coeffs(in_wave,out_wave,kind):
+    """Calculate a linear transform matrix equivalent to piecewise
+    interpolation from input to output wavelengths.
+
+    All interp1d kinds are linear in the input values so the
+    interpolation, including extrapolation beyond the input range, can
+    be precomputed by interpolating an identity matrix. Linear and nearest
+    kinds (SPARSE_KINDS) produce a sparse matrix with at most two nonzero
+    weights per output wavelength, spline kinds produce a dense matrix.
 
     Args:
-        hy_obj (TYPE): DESCRIPTION.
-        band (TYPE): DESCRIPTION.
-        index (TYPE): DESCRIPTION.
+        in_wave (list): Input wavelength centers.
+        out_wave (list): Output wavelength centers.
+        kind (str): Scipy interp1d interpolation kind.
 
     Returns:
-        band (TYPE): DESCRIPTION.
+        numpy.ndarray, scipy.sparse.csr_matrix: Transform coeffiecients
+        (input bands, output bands).
 
-    '''
+    """
+
+    from scipy.interpolate import interp1d
+
+    in_wave = np.asarray(in_wave)
+    interp_func = interp1d(in_wave,np.eye(len(in_wave)),
+                           kind=kind,axis=0, fill_value="extrapolate")
+    coeffs = interp_func(np.asarray(out_wave)).T
+
+    if kind in SPARSE_KINDS:
+        from scipy.sparse import csr_matrix
+        coeffs = csr_matrix(coeffs)
+
+    return coeffs
+
+
+def resampler_key(resampler,bands):
+    """Return a hashable key identifying a resampler.
+
+    Args:
+        resampler (dict): Resampler dictionary with 'type', 'out_waves'
+                          and optionally 'out_fwhm'.
+        bands (numpy.ndarray): Boolean mask of input bands being resampled.
+
+    Returns:
+        tuple: Resampler key (out waves, out fwhm, type, input bands).
+
+    """
+
+    out_fwhm = resampler.get('out_fwhm')
+    if out_fwhm is not None:
+        out_fwhm = tuple(np.round(np.asarray(out_fwhm,dtype=float),6))
+
+    return (tuple(np.round(np.asarray(resampler['out_waves'],dtype=float),6)),
+            out_fwhm,resampler['type'],
+            np.packbits(np.asarray(bands,dtype=bool)).tobytes())
+
+
+def get_resample_coeffs(hy_obj,resampler,bands):
+    """Return transform coefficients for a resampler, calculating them
+    if they are not in the HyTools resampler registry.
+
+    The registry is keyed by target wavelengths, target FWHM, method and
+    input bands and holds at most RESAMPLER_CACHE_SIZE entries, the least
+    recently used entry is dropped first.
+
+    Args:
+        hy_obj : Hytools class object.
+        resampler (dict): Resampler dictionary.
+        bands (numpy.ndarray): Boolean mask of input bands being resampled.
+
+    Returns:
+        numpy.ndarray, scipy.sparse.csr_matrix: Transform coeffiecients
+        (input bands, output bands).
+
+    """
 
     interp_types = ['linear', 'nearest', 'nearest-up',
                    'zero', 'slinear', 'quadratic',
                    'cubic']
 
-    #Convert to float
-    data = data.astype(np.float32)
+    key = resampler_key(resampler,bands)
+
+    if key in hy_obj.resamplers:
+        hy_obj.resamplers.move_to_end(key)
+        return hy_obj.resamplers[key]
+
+    in_wave = hy_obj.wavelengths[bands]
+
+    if resampler['type'] == 'gaussian':
+        in_fwhm =hy_obj.fwhm[bands]
+        resample_coeffs = calc_resample_coeffs(in_wave,in_fwhm,
+                                               np.asarray(resampler['out_waves']),
+                                               np.asarray(resampler['out_fwhm']))
+    elif resampler['type'] in interp_types:
+        resample_coeffs = calc_interp_coeffs(in_wave,
+                                             resampler['out_waves'],
+                                             resampler['type'])
+    else:
+        print("Unrecognized resampler type: %s" % resampler['type'])
+        return None
 
-    if hy_obj.resampler['type'] == 'gaussian':
+    hy_obj.resamplers[key] = resample_coeffs
+    while len(hy_obj.resamplers) > RESAMPLER_CACHE_SIZE:
+        hy_obj.resamplers.popitem(last=False)
 
-        # Load resampling coeffs to memory if needed
-        if 'resample_coeffs' not in hy_obj.ancillary.keys():
-            in_wave = hy_obj.wavelengths[~hy_obj.bad_bands]
-            in_fwhm =hy_obj.fwhm[~hy_obj.bad_bands]
-            resample_coeffs = calc_resample_coeffs(in_wave,in_fwhm,
-                                             hy_obj.resampler['out_waves'],
-                                             hy_obj.resampler['out_fwhm'])
-            hy_obj.ancillary['resample_coeffs'] = resample_coeffs
+    return resample_coeffs
 
-        data = np.dot(data, hy_obj.ancillary['resample_coeffs'] )
 
+def apply_resampler(hy_obj,data,resampler = None,bands = None):
+    ''' Apply wavelength resampling to a slice of the data.
+
+    Resampling is applied as a single matrix multiplication along the last
+    (band) axis, transform coefficients are looked up in the HyTools
+    resampler registry. Sparse (linear and nearest) transforms only
+    propagate non-finite input values to neighboring output bands.
+
+    Args:
+        hy_obj : Hytools class object.
+        data (numpy.ndarray): Data slice, bands along last axis.
+        resampler (dict, optional): Resampler dictionary. Defaults to
+                                    hy_obj.resampler.
+        bands (numpy.ndarray, optional): Boolean mask of the input bands
+                                    in data. Defaults to good bands.
+
+    Returns:
+        data (numpy.ndarray): Resampled data slice.
+
+    '''
+
+    if resampler is None:
+        resampler = hy_obj.resampler
+    if bands is None:
+        bands = ~hy_obj.bad_bands
+
+    #Convert to float
+    data = data.astype(np.float32)
 
-    elif hy_obj.resampler['type'] in interp_types:
-        interp_func =  interp1d(hy_obj.wavelengths[~hy_obj.bad_bands], data,
-                                kind=hy_obj.resampler['type'],
-                                axis=2, fill_value="extrapolate")
-        data = interp_func(hy_obj.resampler['out_waves'])
+    resample_coeffs = get_resample_coeffs(hy_obj,resampler,bands)
+    if isinstance(resample_coeffs,np.ndarray):
+        data = np.dot(data, resample_coeffs)
+    elif resample_coeffs is not None:
+        # Sparse transforms only weight neighboring bands
+        shape = data.shape[:-1] + (resample_coeffs.shape[1],)
+        data = (data.reshape(-1,data.shape[-1]) @ resample_coeffs).reshape(shape)
 
     return data
@@ -5,6 +5,7 @@
 '''
 
 import json
+import os
 import glob
 import numpy as np
 
@@ -69,6 +70,24 @@ config_dict['export']['subset_waves']  = []
 config_dict['export']['output_dir'] = "/data2/prisma/rfl/PRS_20210629153937_20210629153942_0001_modtran/"
 config_dict['export']["suffix"] = 'glint_hedley'
 
+# Resume an interrupted export: reuse exported coefficients and only
+# write lines missing from each output's checkpoint manifest
+config_dict['export']['resume'] = False
+
+# Mosaic corrected images, overlap rule: 'first', 'last', 'min_zenith'
+# (ENVI inputs only) or 'mean', None to disable
+config_dict['export']['mosaic'] = None
+
+# Corrected image encoding, None to export float32:
+#   {'type': 'int16' or 'uint16', 'scale': 1, 'offset': 0}, stored as
+#   round((value - offset) * scale), or {'type': 'float16'}, stored as
+#   uint16 and only readable by HyTools. Corrected
+#   values are in input units, the scale defaults to 1 for integer inputs
+#   and to the input scale factor for scaled integer inputs, it is
+#   required for float inputs. Values outside the stored range are
+#   clipped.
+config_dict['export']['encoding'] = None
+
 #Corrections
 #################################################################
 ''' Specify correction(s) to be applied, corrections will be applied
@@ -290,5 +309,20 @@ config_dict["resample"]  = False
 
 config_dict['num_cpus'] = len(images)
 
+# Executor backend: 'ray' or 'local' (single node, no ray required)
+config_dict['executor'] = 'ray'
+
+# Per stage timing and I/O counters JSON pathname, None to disable
+config_dict['profile'] = None
+
+# Chrome trace event JSON pathname (chrome://tracing, ui.perfetto.dev),
+# None to disable
+config_dict['trace'] = None
+
+# Topo and BRDF coefficient cache directory, coefficients are reused when
+# the input files, settings and hytools version are unchanged. None
+# disables the cache.
+config_dict['coeff_cache'] = os.path.join(os.path.expanduser("~"),'.cache','hytools')
+
 with open(config_file, 'w') as outfile:
     json.dump(config_dict,outfile,indent=3)
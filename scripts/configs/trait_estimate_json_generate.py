@@ -51,6 +51,30 @@ for i,image in enumerate(images):
 
 config_dict['num_cpus'] = len(images)
 
+# Executor backend: 'ray' or 'local' (single node, no ray required)
+config_dict['executor'] = 'ray'
+
+# Per stage timing and I/O counters JSON pathname, None to disable
+config_dict['profile'] = None
+
+# Chrome trace event JSON pathname (chrome://tracing, ui.perfetto.dev),
+# None to disable
+config_dict['trace'] = None
+
+# Resume an interrupted run, only lines missing from each trait image's
+# checkpoint manifest are written
+config_dict['resume'] = False
+
+# Mosaic trait images, overlap rule: 'first', 'last' or 'mean', None to
+# disable
+config_dict['mosaic'] = None
+
+# Trait image encoding, None to export float32, ex. {'type': 'float16'}
+# (stored as uint16, only readable by HyTools) or {'type': 'int16',
+# 'scale': 100}, scaled integer encodings require a scale, see
+# image_correct_json_generate.py
+config_dict['encoding'] = None
+
 # Assign correction coefficients
 ##########################################################
 ''' Specify correction(s) to apply and paths to coefficients.
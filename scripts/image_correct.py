@@ -2,7 +2,6 @@ import json
 import os
 import warnings
 import sys
-import ray
 import numpy as np
 import hytools as ht
 from hytools.io.envi import *
@@ -10,6 +9,11 @@ from hytools.topo import calc_topo_coeffs
 from hytools.brdf import calc_brdf_coeffs
 from hytools.glint import set_glint_parameters
 from hytools.masks import mask_create
+from hytools.mosaic import mosaic
+from hytools.misc import get_attribute,Counters,enable_counters,merge_counters,dump_counters
+from hytools.misc import start_trace,stop_trace,set_cache_dir,plan_iteration,chunk_windows
+from hytools.parallel import TaskScheduler,actor_images,get_executor,call,call_each,ROWS_PER_TASK
+from hytools.parallel import Checkpoint,checkpoint_hash
 
 warnings.filterwarnings("ignore")
 np.seterr(divide='ignore', invalid='ignore')
@@ -23,23 +27,39 @@ def main():
 
     images = config_dict["input_files"]
 
-    if ray.is_initialized():
-        ray.shutdown()
+    # Optional per stage timing and I/O counters, written to JSON, and
+    # spans from all processes, written to a Chrome trace JSON
+    profile = config_dict.get('profile')
+    trace = config_dict.get('trace')
+    if trace:
+        collector = start_trace()
+
+    backend = config_dict.get('executor','ray')
     print("Using %s CPUs." % config_dict['num_cpus'])
-    ray.init(num_cpus = config_dict['num_cpus'])
+    executor = get_executor(backend,config_dict['num_cpus'])
+    actors = executor.actors(len(images))
 
-    HyTools = ray.remote(ht.HyTools)
-    actors = [HyTools.remote() for image in images]
+    if profile or trace:
+        _ = call(actors,'do',enable_counters,bool(trace))
 
     if config_dict['file_type'] == 'envi':
         anc_files = config_dict["anc_files"]
-        _ = ray.get([a.read_file.remote(image,config_dict['file_type'],
-                                        anc_files[image]) for a,image in zip(actors,images)])
+        _ = call_each(actors,'read_file',images,[config_dict['file_type']]*len(images),
+                      [anc_files[image] for image in images])
 
     elif config_dict['file_type'] == 'neon':
-        _ = ray.get([a.read_file.remote(image,config_dict['file_type']) for a,image in zip(actors,images)])
+        _ = call_each(actors,'read_file',images,[config_dict['file_type']]*len(images))
+
+    _ = call(actors,'create_bad_bands',config_dict['bad_bands'])
+
+    # Coefficient cache directory, None disables the cache
+    if 'coeff_cache' in config_dict:
+        set_cache_dir(config_dict['coeff_cache'])
 
-    _ = ray.get([a.create_bad_bands.remote(config_dict['bad_bands']) for a in actors])
+    # Reuse coefficients exported by an interrupted run
+    resume = config_dict['export'].get('resume',False)
+    if resume and config_dict['export']['coeffs']:
+        reuse_coeffs(config_dict)
 
     for correction in config_dict["corrections"]:
         if correction =='topo':
@@ -51,21 +71,104 @@ def main():
 
     if config_dict['export']['coeffs'] and len(config_dict["corrections"]) > 0:
         print("Exporting correction coefficients.")
-        _ = ray.get([a.do.remote(export_coeffs,config_dict['export']) for a in actors])
+        _ = call(actors,'do',export_coeffs,config_dict['export'])
 
-    if config_dict['export']['image']:
-        print("Exporting corrected images.")
-        _ = ray.get([a.do.remote(apply_corrections,config_dict) for a in actors])
+    if config_dict['export']['image'] or config_dict['export']['masks']:
+        if config_dict['export']['masks'] and len(config_dict["corrections"]) > 0:
+            _ = call(actors,'do',gen_export_masks,config_dict)
+
+        # Retrieve calibrated images and release actors, export
+        # is run in bands of lines on a fixed pool of workers
+        hy_objs = actor_images(actors)
+        executor.release(actors)
 
-    ray.shutdown()
+        # Keep calibration counters out of the images shipped to workers
+        image_counters = [hy_obj.counters for hy_obj in hy_objs]
+        for hy_obj in hy_objs:
+            if hy_obj.counters is not None:
+                enable_counters(hy_obj,bool(trace))
+
+        print("Exporting corrected images.")
+        rows_per_task = config_dict['export'].get('rows_per_task',ROWS_PER_TASK)
+        checkpoints,windows = [],[]
+        for hy_obj in hy_objs:
+            # Set on every image, outputs of resumed runs are not recreated
+            if config_dict["resample"] == True:
+                hy_obj.resampler = config_dict['resampler']
+            checkpoint = export_checkpoint(hy_obj,config_dict)
+            if resume and checkpoint.load():
+                print("Resuming %s." % hy_obj.base_name)
+            else:
+                create_outputs(hy_obj,config_dict)
+                checkpoint.flush()
+            checkpoints.append(checkpoint)
+            windows.append(checkpoint.remaining(rows_per_task))
+
+        def task_done(i,window,result):
+            checkpoints[i].add(window)
+
+        scheduler = TaskScheduler(config_dict['num_cpus'],backend = backend)
+        results = scheduler.map_rows(export_rows,hy_objs,config_dict,
+                                     windows = windows,callback = task_done)
+        for checkpoint in checkpoints:
+            checkpoint.flush()
+
+        # Mosaic corrected images using the selected overlap rule
+        if config_dict['export'].get('mosaic') and config_dict['export']['image']:
+            print("Mosaicking corrected images.")
+            anc_files = config_dict.get("anc_files",{})
+            outputs = [(output_names(hy_obj,config_dict)[0],anc_files.get(hy_obj.file_name,{}))
+                       for hy_obj in hy_objs]
+            output_objs = scheduler.map(open_output,outputs)
+            mosaic_name = config_dict['export']['output_dir'] + "mosaic_%s" % config_dict['export']["suffix"]
+            mosaic(output_objs,mosaic_name,config_dict['export']['mosaic'],scheduler)
+        scheduler.shutdown()
+
+        image_counters = [merge_counters([counters] + task_counters)
+                          for counters,task_counters in zip(image_counters,results)]
+    elif profile or trace:
+        image_counters = call(actors,'do',get_attribute,'counters')
+
+    if profile:
+        dump_counters(profile,dict(zip(images,image_counters)))
+        print("Counters written to %s" % profile)
+
+    if trace:
+        for image,counters in zip(images,image_counters):
+            collector.add(counters,os.path.basename(image))
+        stop_trace(trace)
+        print("Trace written to %s" % trace)
+
+    executor.shutdown()
+
+def coeff_name(file_name,correction,export_dict):
+    '''Return correction coefficients output pathname.
+    '''
+    coeff_file = export_dict['output_dir']
+    coeff_file += os.path.splitext(os.path.basename(file_name))[0]
+    coeff_file += "_%s_coeffs_%s.json" % (correction,export_dict["suffix"])
+    return coeff_file
+
+def reuse_coeffs(config_dict):
+    '''Use previously exported coefficients as precomputed coefficients
+    when they exist for all images.
+    '''
+    for correction in config_dict["corrections"]:
+        if correction not in ['topo','brdf']:
+            continue
+        coeff_files = {image:coeff_name(image,correction,config_dict['export'])
+                       for image in config_dict["input_files"]}
+        if all(os.path.isfile(coeff_file) for coeff_file in coeff_files.values()):
+            print("Reusing exported %s coefficients." % correction)
+            config_dict[correction] = dict(config_dict[correction],
+                                           type = 'precomputed',
+                                           coeff_files = coeff_files)
 
 def export_coeffs(hy_obj,export_dict):
     '''Export correction coefficients to file.
     '''
     for correction in hy_obj.corrections:
-        coeff_file = export_dict['output_dir']
-        coeff_file += os.path.splitext(os.path.basename(hy_obj.file_name))[0]
-        coeff_file += "_%s_coeffs_%s.json" % (correction,export_dict["suffix"])
+        coeff_file = coeff_name(hy_obj.file_name,correction,export_dict)
 
         with open(coeff_file, 'w') as outfile:
             if correction == 'topo':
@@ -76,66 +179,87 @@ def export_coeffs(hy_obj,export_dict):
                 corr_dict = hy_obj.brdf
             json.dump(corr_dict,outfile)
 
-def apply_corrections(hy_obj,config_dict):
-    '''Apply correction to image and export
-        to file.
+def export_mask_names(config_dict):
+    '''Return names and mask types of exported masks. Names are used as
+    band names only and can repeat, masks are keyed by position.
     '''
+    mask_names = []
+    for correction in config_dict["corrections"]:
+        for mask_type in config_dict[correction]['apply_mask']:
+            mask_names.append((correction + '_' + mask_type[0],mask_type))
+    return mask_names
 
-    header_dict = hy_obj.get_header()
-    header_dict['data ignore value'] = hy_obj.no_data
-    header_dict['data type'] = 4
+def gen_export_masks(hy_obj,config_dict):
+    '''Generate masks for export.
+    '''
+    for i,(mask_name,mask_type) in enumerate(export_mask_names(config_dict)):
+        hy_obj.gen_mask(mask_create,'export_%d' % i,[mask_type])
 
+def output_names(hy_obj,config_dict):
+    '''Return corrected image and mask output pathnames.
+    '''
     output_name = config_dict['export']['output_dir']
     output_name += os.path.splitext(os.path.basename(hy_obj.file_name))[0]
     output_name +=  "_%s" % config_dict['export']["suffix"]
+    return output_name, output_name + "_mask"
+
+def export_checkpoint(hy_obj,config_dict):
+    '''Return the export checkpoint of an image, the manifest hash covers
+    correction coefficients and export settings.
+    '''
+    image_name,mask_name = output_names(hy_obj,config_dict)
+    output_files = []
+    if config_dict['export']['image']:
+        output_files.append(image_name)
+    if (config_dict['export']['masks']) and (len(config_dict["corrections"]) > 0):
+        output_files.append(mask_name)
+
+    settings = {'corrections': hy_obj.corrections,
+                'topo': hy_obj.topo,
+                'brdf': hy_obj.brdf,
+                'glint': config_dict.get('glint'),
+                'resample': config_dict['resample'],
+                'resampler': config_dict['resampler'],
+                'export': {key:config_dict['export'][key] for key in ['image','masks','subset_waves']}}
+    if config_dict['export'].get('encoding'):
+        settings['encoding'] = config_dict['export']['encoding']
+    return Checkpoint(output_files[0] + "_manifest.json",output_files,
+                      checkpoint_hash(settings),hy_obj.lines)
+
+def create_outputs(hy_obj,config_dict):
+    '''Create output files and headers, data is written by export_rows.
+    '''
+    image_name,mask_name = output_names(hy_obj,config_dict)
+    header_dict = hy_obj.get_header()
+    header_dict['data ignore value'] = hy_obj.no_data
+    header_dict['data type'] = 4
 
-    #Export all wavelengths
-    if len(config_dict['export']['subset_waves']) == 0:
+    if config_dict['export']['image']:
+        #Export all wavelengths
+        if len(config_dict['export']['subset_waves']) == 0:
+            if config_dict["resample"] == True:
+                waves= hy_obj.resampler['out_waves']
+            else:
+                waves = hy_obj.wavelengths
 
-        if config_dict["resample"] == True:
-            hy_obj.resampler = config_dict['resampler']
-            waves= hy_obj.resampler['out_waves']
+        #Export subset of wavelengths
         else:
-            waves = hy_obj.wavelengths
+            waves = config_dict['export']['subset_waves']
+            bands = [hy_obj.wave_to_band(x) for x in waves]
+            waves = [round(hy_obj.wavelengths[x],2) for x in bands]
 
         header_dict['bands'] = len(waves)
         header_dict['wavelength'] = waves
-
-        writer = WriteENVI(output_name,header_dict)
-        iterator = hy_obj.iterate(by='line', corrections=hy_obj.corrections,
-                                  resample=config_dict['resample'])
-        while not iterator.complete:
-            line = iterator.read_next()
-            writer.write_line(line,iterator.current_line)
-        writer.close()
-
-    #Export subset of wavelengths
-    else:
-        waves = config_dict['export']['subset_waves']
-        bands = [hy_obj.wave_to_band(x) for x in waves]
-        waves = [round(hy_obj.wavelengths[x],2) for x in bands]
-        header_dict['bands'] = len(bands)
-        header_dict['wavelength'] = waves
-
-        writer = WriteENVI(output_name,header_dict)
-        for b,band_num in enumerate(bands):
-            band = hy_obj.get_band(band_num,
-                                   corrections=hy_obj.corrections)
-            writer.write_band(band, b)
+        header_dict = encode_header(header_dict,encoding_scale(hy_obj,config_dict['export'].get('encoding')))
+        writer = WriteENVI(image_name,header_dict)
         writer.close()
 
-    #Export masks
     if (config_dict['export']['masks']) and (len(config_dict["corrections"]) > 0):
-        masks = []
-        mask_names = []
-
-        for correction in config_dict["corrections"]:
-            for mask_type in config_dict[correction]['apply_mask']:
-                mask_names.append(correction + '_' + mask_type[0])
-                masks.append(mask_create(hy_obj, [mask_type]))
+        mask_names = [name for name,mask_type in export_mask_names(config_dict)]
 
+        header_dict = encode_header(header_dict)
         header_dict['data type'] = 1
-        header_dict['bands'] = len(masks)
+        header_dict['bands'] = len(mask_names)
         header_dict['band names'] = mask_names
         header_dict['samples'] = hy_obj.columns
         header_dict['lines'] = hy_obj.lines
@@ -144,19 +268,60 @@ def apply_corrections(hy_obj,config_dict):
         header_dict['wavelength units'] = ''
         header_dict['data ignore value'] = 255
 
+        writer = WriteENVI(mask_name,header_dict)
+        writer.close()
 
-        output_name = config_dict['export']['output_dir']
-        output_name += os.path.splitext(os.path.basename(hy_obj.file_name))[0]
-        output_name +=  "_%s_mask" % config_dict['export']["suffix"]
+def open_output(output,args = None):
+    '''Open a corrected image with the input image ancillary datasets.
+    '''
+    output_name,anc_path = output
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(output_name,'envi',anc_path)
+    return hy_obj
+
+def export_rows(hy_obj,start,end,config_dict):
+    '''Apply corrections to a band of lines and export
+        to file. Returns the task counters when enabled.
+    '''
+    # Workers keep images between tasks, count each task separately
+    if hy_obj.counters is not None:
+        hy_obj.counters = Counters(hy_obj.counters.spans is not None)
 
-        writer = WriteENVI(output_name,header_dict)
+    image_name,mask_name = output_names(hy_obj,config_dict)
 
-        for band_num,mask in enumerate(masks):
-            mask = mask.astype(int)
-            mask[~hy_obj.mask['no_data']] = 255
-            writer.write_band(mask,band_num)
+    if config_dict['export']['image']:
+        header_dict = parse_envi_header(image_name + ".hdr")
+        writer = WriteENVI(image_name,header_dict,mode = 'r+',counters = hy_obj.counters)
+
+        #Export all wavelengths, only good bands are read when resampling
+        if len(config_dict['export']['subset_waves']) == 0:
+            resample = config_dict['resample']
+            bands = 'good' if resample else None
+        #Export subset of wavelengths, only the subset is read and corrected
+        else:
+            resample = False
+            bands = [hy_obj.wave_to_band(x) for x in config_dict['export']['subset_waves']]
+
+        _,chunk_size = plan_iteration(hy_obj,hy_obj.corrections,resample,bands)
+        for col_start,col_end,line_start,line_end in chunk_windows(hy_obj,chunk_size,start,end):
+            chunk = hy_obj.get_chunk(col_start,col_end,line_start,line_end,
+                                     corrections=hy_obj.corrections,
+                                     resample=resample,bands=bands)
+            writer.write_chunk(chunk,line_start,col_start)
+        writer.close()
+
+    #Export masks
+    if (config_dict['export']['masks']) and (len(config_dict["corrections"]) > 0):
+        header_dict = parse_envi_header(mask_name + ".hdr")
+        writer = WriteENVI(mask_name,header_dict,mode = 'r+',counters = hy_obj.counters)
+
+        masks = [hy_obj.mask['export_%d' % i][start:end] for i in range(len(export_mask_names(config_dict)))]
+        chunk = np.stack(masks,axis=-1).astype(np.uint8)
+        chunk[~hy_obj.mask['no_data'][start:end]] = 255
+        writer.write_chunk(chunk,start,0)
+        writer.close()
 
-        del masks
+    return hy_obj.counters
 
 if __name__== "__main__":
     main()
@@ -0,0 +1,101 @@
+'''interleave.py
+
+'''
+import argparse
+import os
+import numpy as np
+import hytools as ht
+from hytools.io import WriteENVI,dtype_dict,encoding_dict,convert_header,convert_rows,BLOCK_MEMORY
+from hytools.parallel import TaskScheduler,get_executor
+
+def main():
+    '''This command line tool converts ENVI or NEON images to ENVI images
+    with a BIL, BIP or BSQ interleave. Images are converted out of core in
+    blocks of full width lines sized to a per CPU memory budget, a subset of
+    wavelengths can be exported and the data type converted or encoded as
+    scaled integers or float16 in the same pass.
+
+    '''
+    parser = argparse.ArgumentParser(description = "Convert image interleave")
+    parser.add_argument('images',help="Input image pathnames", nargs='*')
+    parser.add_argument('output_dir',help="Output directory", type = str)
+    parser.add_argument("-interleave", help="Output interleave", type = str,
+                        required=True, choices=['bil','bip','bsq'])
+    parser.add_argument("-waves", help="Wavelengths to export", type = float, nargs='+',
+                        required=False, default=None)
+    parser.add_argument("-dtype", help="Output data type", type = str, required=False, default=None,
+                        choices=[np.dtype(dtype).name for dtype in dtype_dict.values()])
+    parser.add_argument("-encoding", help="Output encoding, overrides -dtype", type = str,
+                        required=False, default=None, choices=list(encoding_dict))
+    parser.add_argument("-scale", help="Scaled integer encoding scale factor, defaults to the input scale factor or 1 for integer inputs",
+                        type = float, required=False, default=None)
+    parser.add_argument("-offset", help="Scaled integer encoding offset", type = float,
+                        required=False, default=None)
+    parser.add_argument("-memory", help="Memory budget per CPU (MB)", type = int, required=False,
+                        default=BLOCK_MEMORY//1024**2)
+    parser.add_argument("-suffix", help="Output name suffix, defaults to the interleave", type = str,
+                        required=False, default=None)
+    parser.add_argument("-cpus", help="Number of CPUs", type = int, required=False,
+                        default=os.cpu_count())
+    parser.add_argument("-executor", help="Executor backend, 'ray' or 'local'", type = str,
+                        required=False, default='ray')
+
+    args = parser.parse_args()
+
+    if not args.output_dir.endswith("/"):
+        args.output_dir+="/"
+    if args.suffix is None:
+        args.suffix = args.interleave
+    encoding = None
+    if args.encoding:
+        encoding = {'type': args.encoding,'scale': args.scale,'offset': args.offset}
+
+    executor = get_executor(args.executor,args.cpus)
+    scheduler = TaskScheduler(args.cpus,backend = args.executor)
+    hy_objs = scheduler.map(open_image,args.images)
+
+    converted = []
+    for hy_obj in hy_objs:
+        header_dict = convert_header(hy_obj,args.interleave,export_bands(hy_obj,args),
+                                     args.dtype,encoding)
+        if header_dict is None:
+            continue
+        print("Converting %s to %s" % (hy_obj.base_name,args.interleave.upper()))
+        writer = WriteENVI(output_name(hy_obj,args),header_dict)
+        writer.close()
+        converted.append(hy_obj)
+    _ = scheduler.map_rows(convert_task,converted,args)
+
+    scheduler.shutdown()
+    executor.shutdown()
+    print("Conversion complete.")
+
+def open_image(image,args = None):
+    '''Open ENVI or NEON image.
+    '''
+    hy_obj = ht.HyTools()
+    if image.endswith('.h5'):
+        hy_obj.read_file(image,'neon')
+    else:
+        hy_obj.read_file(image,'envi')
+    return hy_obj
+
+def output_name(hy_obj,args):
+    return '%s%s_%s' % (args.output_dir,hy_obj.base_name,args.suffix)
+
+def export_bands(hy_obj,args):
+    '''Return the band indices of the exported wavelengths.
+    '''
+    if args.waves is None:
+        return None
+    return [hy_obj.wave_to_band(wave) for wave in args.waves]
+
+def convert_task(hy_obj,start,end,args):
+    '''Convert a band of lines.
+    '''
+    convert_rows(hy_obj,output_name(hy_obj,args),start,end,
+                 bands = export_bands(hy_obj,args),
+                 memory = args.memory*1024**2)
+
+if __name__== "__main__":
+    main()
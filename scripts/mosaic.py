@@ -0,0 +1,63 @@
+'''mosaic.py
+
+'''
+import argparse
+import json
+import os
+import hytools as ht
+from hytools.mosaic import mosaic,OVERLAP_RULES
+from hytools.parallel import TaskScheduler,get_executor
+
+def main():
+    '''This command line tool mosaics a group of ENVI or NEON images onto
+    the union of their map grids. Images must share projection, pixel size
+    and band count. Overlapping pixels are selected using an overlap rule,
+    the 'min_zenith' rule requires sensor zenith ancillary data, provided
+    for ENVI images with an ancillary JSON file using the same format as the
+    'anc_files' entry of image_correct configuration files.
+
+    '''
+    parser = argparse.ArgumentParser(description = "Mosaic images by map info")
+    parser.add_argument('images',help="Input image pathnames", nargs='*')
+    parser.add_argument('output',help="Output mosaic pathname", type = str)
+    parser.add_argument("-rule", help="Overlap rule: %s" % ', '.join(OVERLAP_RULES), type = str,
+                        required=False, default='first')
+    parser.add_argument("-anc", help="Ancillary files JSON", type = str, required=False, default=None)
+    parser.add_argument("-lines", help="Lines per block, defaults to a 256 MB block", type = int,
+                        required=False, default=None)
+    parser.add_argument("-cpus", help="Number of CPUs", type = int, required=False,
+                        default=os.cpu_count())
+    parser.add_argument("-executor", help="Executor backend, 'ray' or 'local'", type = str,
+                        required=False, default='ray')
+
+    args = parser.parse_args()
+
+    anc_files = {}
+    if args.anc:
+        with open(args.anc, 'r') as infile:
+            anc_files = json.load(infile)
+
+    executor = get_executor(args.executor,args.cpus)
+    scheduler = TaskScheduler(args.cpus,backend = args.executor)
+    hy_objs = scheduler.map(open_image,args.images,anc_files)
+
+    print("Mosaicking %s images" % len(hy_objs))
+    grid = mosaic(hy_objs,args.output,args.rule,scheduler,args.lines)
+    scheduler.shutdown()
+    executor.shutdown()
+    if grid is not None:
+        print("Mosaic complete, %s lines x %s columns." % (grid['lines'],grid['columns']))
+
+def open_image(image,anc_files):
+    '''Open ENVI or NEON image.
+    '''
+    hy_obj = ht.HyTools()
+    if image.endswith('.h5'):
+        hy_obj.read_file(image,'neon')
+    else:
+        anc_path = anc_files.get(image,anc_files.get(os.path.abspath(image),{}))
+        hy_obj.read_file(image,'envi',anc_path)
+    return hy_obj
+
+if __name__== "__main__":
+    main()
@@ -7,83 +7,98 @@ TODO: Implement progress bar like from this example:
 '''
 import argparse
 import os
-import ray
 import numpy as np
 import hytools as ht
-from hytools.io.envi import WriteENVI
+from hytools.io.envi import WriteENVI,parse_envi_header
+from hytools.misc import plan_iteration,chunk_windows
+from hytools.parallel import TaskScheduler,get_executor
 
 def main():
     '''This command line tool exports NEON AOP HDF imaging spectroscopy data
     to an ENVI formated binary file, with the option of also exporting
     ancillary data following formatting used by NASA JPL for AVIRIS
-    observables. The script utilizes ray to export images in parralel.
+    observables. The script utilizes ray to export images in parralel,
+    images are exported in bands of lines on a fixed pool of workers.
 
     '''
     parser = argparse.ArgumentParser(description = "Convert NEON AOP H5 to ENVI format")
     parser.add_argument('images',help="Input image pathnames", nargs='*')
     parser.add_argument('output_dir',help="Output directory", type = str)
     parser.add_argument("-anc", help="Output ancillary", required=False, action='store_true')
+    parser.add_argument("-cpus", help="Number of CPUs", type = int, required=False,
+                        default=os.cpu_count())
+    parser.add_argument("-executor", help="Executor backend, 'ray' or 'local'", type = str,
+                        required=False, default='ray')
 
     args = parser.parse_args()
 
     if not args.output_dir.endswith("/"):
         args.output_dir+="/"
 
-    if ray.is_initialized():
-        ray.shutdown()
-    ray.init(num_cpus = len(args.images))
-
-    hytool = ray.remote(ht.HyTools)
-    actors = [hytool.remote() for image in args.images]
-    _ = ray.get([a.read_file.remote(image,'neon') for a,image in zip(actors,args.images)])
-
-    def neon_to_envi(hy_obj):
-        basemame = os.path.basename(os.path.splitext(hy_obj.file_name)[0])
-        print("Exporting %s " % basemame)
-        output_name = args.output_dir+ basemame
-        writer = WriteENVI(output_name,hy_obj.get_header())
-        iterator = hy_obj.iterate(by = 'chunk')
-        pixels_processed = 0
-        while not iterator.complete:
-            chunk = iterator.read_next()
-            pixels_processed += chunk.shape[0]*chunk.shape[1]
-            writer.write_chunk(chunk,iterator.current_line,iterator.current_column)
-            if iterator.complete:
-                writer.close()
-
-    def export_anc(hy_obj):
-        anc_header = hy_obj.get_header()
-        anc_header['bands'] = 10
-        anc_header['band_names'] = ['path length', 'to-sensor azimuth',
-                                    'to-sensor zenith','to-sun azimuth',
-                                      'to-sun zenith','phase', 'slope',
-                                      'aspect', 'cosine i','UTC time']
-        anc_header['wavelength units'] = np.nan
-        anc_header['wavelength'] = np.nan
-        anc_header['data type'] = 4
-
-        output_name = args.output_dir+ os.path.basename(os.path.splitext(hy_obj.file_name)[0])
-        writer = WriteENVI(output_name + "_ancillary", anc_header)
-        writer.write_band(hy_obj.get_anc("path_length"),0)
-        writer.write_band(hy_obj.get_anc("sensor_az",radians = False),1)
-        writer.write_band(hy_obj.get_anc("sensor_zn",radians = False),2)
-        writer.write_band(hy_obj.get_anc("solar_az",radians = False),3)
-        writer.write_band(hy_obj.get_anc("solar_zn",radians = False),4)
-        #writer.write_band(hy_obj.get_anc("phase placeholder"),5)
-        writer.write_band(hy_obj.get_anc("slope",radians = False),6)
-        writer.write_band(hy_obj.get_anc("aspect",radians = False),7)
-        writer.write_band(hy_obj.cosine_i(),8)
-        #writer.write_band('UTC time placeholder',9)
-        writer.close()
+    executor = get_executor(args.executor,args.cpus)
+
+    scheduler = TaskScheduler(args.cpus,backend = args.executor)
+    hy_objs = scheduler.map(open_image,args.images)
 
-    _ = ray.get([a.do.remote(neon_to_envi) for a in actors])
+    for hy_obj in hy_objs:
+        print("Exporting %s " % hy_obj.base_name)
+        writer = WriteENVI(args.output_dir + hy_obj.base_name,hy_obj.get_header())
+        writer.close()
+    _ = scheduler.map_rows(neon_to_envi,hy_objs,args.output_dir)
 
     if args.anc:
         print("\nExporting ancillary data")
-        _ = ray.get([a.do.remote(export_anc) for a in actors])
+        _ = scheduler.map_images(export_anc,hy_objs,args.output_dir)
 
+    scheduler.shutdown()
+    executor.shutdown()
     print("Export complete.")
 
+def open_image(image,args = None):
+    '''Open NEON image.
+    '''
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(image,'neon')
+    return hy_obj
+
+def neon_to_envi(hy_obj,start,end,output_dir):
+    '''Export a band of lines to ENVI.
+    '''
+    output_name = output_dir + hy_obj.base_name
+    writer = WriteENVI(output_name,parse_envi_header(output_name + ".hdr"),mode = 'r+')
+    _,chunk_size = plan_iteration(hy_obj)
+    for col_start,col_end,line_start,line_end in chunk_windows(hy_obj,chunk_size,start,end):
+        chunk = hy_obj.get_chunk(col_start,col_end,line_start,line_end)
+        writer.write_chunk(chunk,line_start,col_start)
+    writer.close()
+
+def export_anc(hy_obj,output_dir):
+    '''Export ancillary datasets to ENVI.
+    '''
+    anc_header = hy_obj.get_header()
+    anc_header['bands'] = 10
+    anc_header['band_names'] = ['path length', 'to-sensor azimuth',
+                                'to-sensor zenith','to-sun azimuth',
+                                  'to-sun zenith','phase', 'slope',
+                                  'aspect', 'cosine i','UTC time']
+    anc_header['wavelength units'] = np.nan
+    anc_header['wavelength'] = np.nan
+    anc_header['data type'] = 4
+
+    output_name = output_dir + hy_obj.base_name
+    writer = WriteENVI(output_name + "_ancillary", anc_header)
+    writer.write_band(hy_obj.get_anc("path_length"),0)
+    writer.write_band(hy_obj.get_anc("sensor_az",radians = False),1)
+    writer.write_band(hy_obj.get_anc("sensor_zn",radians = False),2)
+    writer.write_band(hy_obj.get_anc("solar_az",radians = False),3)
+    writer.write_band(hy_obj.get_anc("solar_zn",radians = False),4)
+    #writer.write_band(hy_obj.get_anc("phase placeholder"),5)
+    writer.write_band(hy_obj.get_anc("slope",radians = False),6)
+    writer.write_band(hy_obj.get_anc("aspect",radians = False),7)
+    writer.write_band(hy_obj.cosine_i(),8)
+    #writer.write_band('UTC time placeholder',9)
+    writer.close()
+
 
 if __name__== "__main__":
     main()
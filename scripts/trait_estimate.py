@@ -2,11 +2,14 @@ import json
 import os
 import warnings
 import sys
-import ray
 import numpy as np
 import hytools as ht
 from hytools.io.envi import *
 from hytools.masks import mask_dict
+from hytools.mosaic import mosaic
+from hytools.misc import Counters,enable_counters,merge_counters,dump_counters
+from hytools.misc import start_trace,stop_trace,plan_iteration,chunk_windows
+from hytools.parallel import TaskScheduler,prepare_image,get_executor,Checkpoint,checkpoint_hash
 
 warnings.filterwarnings("ignore")
 
@@ -19,21 +22,24 @@ def main():
 
     images= config_dict["input_files"]
 
-    if ray.is_initialized():
-        ray.shutdown()
+    trace = config_dict.get('trace')
+    if trace:
+        collector = start_trace()
+
+    backend = config_dict.get('executor','ray')
     print("Using %s CPUs." % config_dict['num_cpus'])
-    ray.init(num_cpus = config_dict['num_cpus'])
+    executor = get_executor(backend,config_dict['num_cpus'])
 
-    HyTools = ray.remote(ht.HyTools)
-    actors = [HyTools.remote() for image in images]
+    scheduler = TaskScheduler(config_dict['num_cpus'],backend = backend)
 
     # Load data
-    if config_dict['file_type'] == 'envi':
-        anc_files = config_dict["anc_files"]
-        _ = ray.get([a.read_file.remote(image,config_dict['file_type'],
-                                        anc_files[image]) for a,image in zip(actors,images)])
-    elif config_dict['file_type'] == 'neon':
-        _ = ray.get([a.read_file.remote(image,config_dict['file_type']) for a,image in zip(actors,images)])
+    hy_objs = scheduler.map(load_image,images,config_dict)
+    image_counters = [[hy_obj.counters] for hy_obj in hy_objs]
+
+    # Keep load counters out of the images shipped to workers
+    for hy_obj in hy_objs:
+        if hy_obj.counters is not None:
+            enable_counters(hy_obj,bool(trace))
 
     print("Estimating %s traits:" % len( config_dict['trait_models']))
     for trait in config_dict['trait_models']:
@@ -41,12 +47,60 @@ def main():
             trait_model = json.load(json_file)
             print("\t %s" % trait_model["name"])
 
-    _ = ray.get([a.do.remote(apply_trait_models,config_dict) for a in actors])
-    ray.shutdown()
-
-def apply_trait_models(hy_obj,config_dict):
-    '''Apply trait model(s) to image and export to file.
+        # Only write lines missing from an interrupted run's manifests
+        checkpoints,windows = [],[]
+        for hy_obj in hy_objs:
+            checkpoint = trait_checkpoint(hy_obj,trait_model,config_dict)
+            if config_dict.get('resume') and checkpoint.load():
+                print("\t\t Resuming %s." % hy_obj.base_name)
+            else:
+                create_trait_output(hy_obj,trait_model,config_dict)
+                checkpoint.flush()
+            checkpoints.append(checkpoint)
+            windows.append(checkpoint.remaining())
+
+        def task_done(i,window,result):
+            checkpoints[i].add(window)
+
+        results = scheduler.map_rows(apply_trait_model,hy_objs,(trait_model,config_dict),
+                                     windows = windows,callback = task_done)
+        for checkpoint in checkpoints:
+            checkpoint.flush()
+        for i,task_counters in enumerate(results):
+            image_counters[i] += task_counters
+
+        # Mosaic trait images using the selected overlap rule
+        if config_dict.get('mosaic'):
+            outputs = [trait_output_name(hy_obj,trait_model,config_dict) for hy_obj in hy_objs]
+            output_objs = scheduler.map(open_output,outputs)
+            mosaic(output_objs,config_dict['output_dir'] + "%s_mosaic" % trait_model["name"],
+                   config_dict['mosaic'],scheduler)
+
+    scheduler.shutdown()
+
+    if config_dict.get('profile'):
+        dump_counters(config_dict['profile'],
+                      {image:merge_counters(counters) for image,counters in zip(images,image_counters)})
+        print("Counters written to %s" % config_dict['profile'])
+
+    if trace:
+        for image,counters in zip(images,image_counters):
+            collector.add(merge_counters(counters),os.path.basename(image))
+        stop_trace(trace)
+        print("Trace written to %s" % trace)
+    executor.shutdown()
+
+def load_image(image,config_dict):
+    '''Load image, correction coefficients and masks.
     '''
+    hy_obj = ht.HyTools()
+    if config_dict.get('profile') or config_dict.get('trace'):
+        enable_counters(hy_obj,bool(config_dict.get('trace')))
+    if config_dict['file_type'] == 'envi':
+        hy_obj.read_file(image,config_dict['file_type'],
+                         config_dict["anc_files"][image])
+    elif config_dict['file_type'] == 'neon':
+        hy_obj.read_file(image,config_dict['file_type'])
 
     hy_obj.create_bad_bands(config_dict['bad_bands'])
     hy_obj.corrections  = config_dict['corrections']
@@ -58,91 +112,141 @@ def apply_trait_models(hy_obj,config_dict):
     if 'brdf' in hy_obj.corrections:
         hy_obj.load_coeffs(config_dict['brdf'][hy_obj.file_name],'brdf')
 
-    hy_obj.resampler['type'] = config_dict["resampling"]['type']
+    #Generate masks
+    for mask,args in config_dict['masks']:
+        mask_function = mask_dict[mask]
+        hy_obj.gen_mask(mask_function,mask,args)
 
-    for trait in config_dict['trait_models']:
-        with open(trait, 'r') as json_file:
-            trait_model = json.load(json_file)
-            coeffs = np.array(trait_model['model']['coefficients'])
-            intercept = np.array(trait_model['model']['intercepts'])
-            model_waves = np.array(trait_model['wavelengths'])
-
-        #Check if wavelengths match
-        resample = not all(x in hy_obj.wavelengths for x in model_waves)
-        if resample:
-            hy_obj.resampler['out_waves'] = model_waves
-        else:
-            wave_mask = [np.argwhere(x==hy_obj.wavelengths)[0][0] for x in model_waves]
-
-        # Build trait image file
-        header_dict = hy_obj.get_header()
-        header_dict['wavelength'] = []
-        header_dict['data ignore value'] = -9999
-        header_dict['data type'] = 4
-        header_dict['band names'] = ["%s_mean" % trait_model["name"],
-                                     "%s_std" % trait_model["name"],
-                                     'range_mask'] + [mask[0] for mask in config_dict['masks']]
-        header_dict['bands'] = len(header_dict['band names'] )
-
-        #Generate masks
-        for mask,args in config_dict['masks']:
-            mask_function = mask_dict[mask]
-            hy_obj.gen_mask(mask_function,mask,args)
-
-        output_name = config_dict['output_dir']
-        output_name += os.path.splitext(os.path.basename(hy_obj.file_name))[0] + "_%s" % trait_model["name"]
-
-        writer = WriteENVI(output_name,header_dict)
-
-        iterator = hy_obj.iterate(by = 'chunk',
-                      chunk_size = (100,100),
-                      corrections =  hy_obj.corrections,
-                      resample=resample)
-
-        while not iterator.complete:
-            chunk = iterator.read_next()
-            if not resample:
-                chunk = chunk[:,:,wave_mask]
-
-            trait_est = np.zeros((chunk.shape[0],
-                                    chunk.shape[1],
-                                    header_dict['bands']))
-
-            # Apply spectrum transforms
-            for transform in  trait_model['model']["transform"]:
-                if  transform== "vector":
-                    norm = np.linalg.norm(chunk,axis=2)
-                    chunk = chunk/norm[:,:,np.newaxis]
-                if transform == "absorb":
-                    chunk = np.log(1/chunk)
-                if transform == "mean":
-                    mean = chunk.mean(axis=2)
-                    chunk = chunk/mean[:,:,np.newaxis]
-
-            trait_pred = np.einsum('jkl,ml->jkm',chunk,coeffs, optimize='optimal')
-            trait_pred = trait_pred + intercept
-            trait_est[:,:,0] = trait_pred.mean(axis=2)
-            trait_est[:,:,1] = trait_pred.std(ddof=1,axis=2)
-
-            range_mask = (trait_est[:,:,0] > trait_model["model_diagnostics"]['min']) & \
-                         (trait_est[:,:,0] < trait_model["model_diagnostics"]['max'])
-            trait_est[:,:,2] = range_mask.astype(int)
-
-            # Subset and assign custom masks
-            for i,(mask,args) in enumerate(config_dict['masks']):
-                mask = hy_obj.mask[mask][iterator.current_line:iterator.current_line+chunk.shape[0],
-                                              iterator.current_column:iterator.current_column+chunk.shape[1]]
-
-                trait_est[:,:,3+i] = mask.astype(int)
-
-
-            nd_mask = hy_obj.mask['no_data'][iterator.current_line:iterator.current_line+chunk.shape[0],
-                                             iterator.current_column:iterator.current_column+chunk.shape[1]]
-            trait_est[~nd_mask] = -9999
-            writer.write_chunk(trait_est,
-                               iterator.current_line,
-                               iterator.current_column)
-        writer.close()
+    return prepare_image(hy_obj)
+
+def open_output(output_name,args = None):
+    '''Open a trait image.
+    '''
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(output_name,'envi')
+    return hy_obj
+
+def trait_output_name(hy_obj,trait_model,config_dict):
+    '''Return trait image pathname.
+    '''
+    output_name = config_dict['output_dir']
+    output_name += os.path.splitext(os.path.basename(hy_obj.file_name))[0] + "_%s" % trait_model["name"]
+    return output_name
+
+def trait_checkpoint(hy_obj,trait_model,config_dict):
+    '''Return the trait image checkpoint, the manifest hash covers the
+    trait model, correction coefficients and masks.
+    '''
+    output_name = trait_output_name(hy_obj,trait_model,config_dict)
+    settings = {'trait_model': trait_model,
+                'corrections': hy_obj.corrections,
+                'topo': hy_obj.topo,
+                'brdf': hy_obj.brdf,
+                'masks': config_dict['masks']}
+    if config_dict.get('encoding'):
+        settings['encoding'] = config_dict['encoding']
+    return Checkpoint(output_name + "_manifest.json",[output_name],
+                      checkpoint_hash(settings),hy_obj.lines)
+
+def create_trait_output(hy_obj,trait_model,config_dict):
+    '''Create trait image file, data is written by apply_trait_model.
+    '''
+    header_dict = hy_obj.get_header()
+    header_dict['wavelength'] = []
+    header_dict['data ignore value'] = -9999
+    header_dict['data type'] = 4
+    header_dict['band names'] = ["%s_mean" % trait_model["name"],
+                                 "%s_std" % trait_model["name"],
+                                 'range_mask'] + [mask[0] for mask in config_dict['masks']]
+    header_dict['bands'] = len(header_dict['band names'] )
+    header_dict = encode_header(header_dict,config_dict.get('encoding'))
+
+    writer = WriteENVI(trait_output_name(hy_obj,trait_model,config_dict),header_dict)
+    writer.close()
+
+def apply_trait_model(hy_obj,start,end,args):
+    '''Apply trait model to a band of lines and export to file. Returns
+    the task counters when enabled.
+    '''
+    # Workers keep images between tasks, count each task separately
+    if hy_obj.counters is not None:
+        hy_obj.counters = Counters(hy_obj.counters.spans is not None)
+
+    trait_model,config_dict = args
+    coeffs = np.array(trait_model['model']['coefficients'])
+    intercept = np.array(trait_model['model']['intercepts'])
+    model_waves = np.array(trait_model['wavelengths'])
+
+    #Check if wavelengths match, only the bands used are read
+    resample = not all(x in hy_obj.wavelengths for x in model_waves)
+    if resample:
+        # Resamplers are cached per target wavelengths, each
+        # model gets its own transform
+        resample = {'type': config_dict["resampling"]['type'],
+                    'out_waves': model_waves}
+        if trait_model.get('fwhm'):
+            resample['out_fwhm'] = np.array(trait_model['fwhm'])
+        bands = 'good'
+    else:
+        bands = [np.argwhere(x==hy_obj.wavelengths)[0][0] for x in model_waves]
+
+    output_name = trait_output_name(hy_obj,trait_model,config_dict)
+    header_dict = parse_envi_header(output_name + ".hdr")
+    writer = WriteENVI(output_name,header_dict,mode = 'r+',counters = hy_obj.counters)
+
+    _,chunk_size = plan_iteration(hy_obj,hy_obj.corrections,resample,bands)
+    for window in chunk_windows(hy_obj,chunk_size,start,end):
+        # Only the valid span of the window is read and modeled, the rest
+        # is written as no data
+        window_est = np.full((window[3]-window[2],window[1]-window[0],
+                              header_dict['bands']),-9999.)
+        span = hy_obj.valid_span(window)
+        if span is None:
+            writer.write_chunk(window_est,window[2],window[0])
+            continue
+        col_start,col_end,line_start,line_end = span
+
+        chunk = hy_obj.get_chunk(col_start,col_end,line_start,line_end,
+                                 corrections =  hy_obj.corrections,
+                                 resample=resample,bands=bands)
+
+        trait_est = np.zeros((chunk.shape[0],
+                                chunk.shape[1],
+                                header_dict['bands']))
+
+        # Apply spectrum transforms
+        for transform in  trait_model['model']["transform"]:
+            if  transform== "vector":
+                norm = np.linalg.norm(chunk,axis=2)
+                chunk = chunk/norm[:,:,np.newaxis]
+            if transform == "absorb":
+                chunk = np.log(1/chunk)
+            if transform == "mean":
+                mean = chunk.mean(axis=2)
+                chunk = chunk/mean[:,:,np.newaxis]
+
+        trait_pred = np.einsum('jkl,ml->jkm',chunk,coeffs, optimize='optimal')
+        trait_pred = trait_pred + intercept
+        trait_est[:,:,0] = trait_pred.mean(axis=2)
+        trait_est[:,:,1] = trait_pred.std(ddof=1,axis=2)
+
+        range_mask = (trait_est[:,:,0] > trait_model["model_diagnostics"]['min']) & \
+                     (trait_est[:,:,0] < trait_model["model_diagnostics"]['max'])
+        trait_est[:,:,2] = range_mask.astype(int)
+
+        # Subset and assign custom masks
+        for i,(mask,args) in enumerate(config_dict['masks']):
+            mask = hy_obj.mask[mask][line_start:line_end,col_start:col_end]
+            trait_est[:,:,3+i] = mask.astype(int)
+
+        nd_mask = hy_obj.mask['no_data'][line_start:line_end,col_start:col_end]
+        trait_est[~nd_mask] = -9999
+        window_est[line_start-window[2]:line_end-window[2],
+                   col_start-window[0]:col_end-window[0]] = trait_est
+        writer.write_chunk(window_est,window[2],window[0])
+    writer.close()
+
+    return hy_obj.counters
 
 
 if __name__== "__main__":
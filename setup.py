@@ -13,7 +13,6 @@ setup(
                       'numpy',
                       'pandas',
                       'ray',
-                      'scikit-learn',
                       'scipy'],
     python_requires='>=3.6, !=3.9.*'
     )
@@ -0,0 +1,11 @@
+'''Shared test configuration, the synthetic scene generator used by the
+benchmarks is imported from benchmarks/ and command line scripts from
+scripts/.
+
+'''
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,os.path.join(ROOT,'benchmarks'))
+sys.path.insert(0,os.path.join(ROOT,'scripts'))
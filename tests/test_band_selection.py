@@ -0,0 +1,137 @@
+'''Compare corrected reads of a band selection with full band reads
+subset to the selection, on freshly opened images.
+
+'''
+import copy
+import numpy as np
+import pytest
+import hytools as ht
+from hytools.masks import mask_create
+from hytools.topo.scsc import calc_scsc_coeffs
+from hytools.brdf.brdf import set_solar_zn
+from hytools.brdf.flex import calc_flex_single
+from synthetic import write_envi
+
+LINES,COLUMNS,BANDS = 160,100,60
+BAD_BANDS = [[1300,1450],[1780,1970],[2450,2600]]
+NDI = ['ndi',{'band_1':850,'band_2':660,'min':0.1,'max':1.0}]
+WATER = ['ndi',{'band_1':850,'band_2':660,'min':-1.0,'max':0.0}]
+
+TOPO = {'type': 'scs+c','c_fit_type': 'ols',
+        'calc_mask': [NDI],'apply_mask': [NDI]}
+
+BRDF = {'type': 'flex','grouped': False,'geometric': 'li_dense_r',
+        'volume': 'ross_thick','b/r': 2.5,'h/b': 2,'sample_perc': 0.1,
+        'interp_kind': 'linear','solar_zn_type': 'scene',
+        'calc_mask': [NDI,['kernel_finite',{}],['neon_edge',{'radius':5}]],
+        'apply_mask': [['ndi',{'band_1':850,'band_2':660,'min':0.05,'max':1.0}]],
+        'bin_type': 'dynamic','num_bins': 8,'ndvi_bin_min': 0.05,
+        'ndvi_bin_max': 1.0,'ndvi_perc_min': 10,'ndvi_perc_max': 95}
+
+GLINT = {'hochberg': {'type': 'hochberg','correction_wave': 860,
+                      'truncate': True,'apply_mask': [WATER]},
+         'gao': {'type': 'gao','correction_wave': 860,
+                 'truncate': True,'apply_mask': [WATER]},
+         'hedley': {'type': 'hedley','correction_wave': 860,
+                    'truncate': True,'apply_mask': [WATER]}}
+
+SELECTIONS = [[0,30,59],[5,40],[12]]
+
+
+@pytest.fixture(scope='module')
+def scene(tmp_path_factory):
+    '''Synthetic image and its topo and BRDF coefficients.
+    '''
+    image = str(tmp_path_factory.mktemp('band_selection') / 'scene')
+    anc_path = write_envi(image,LINES,COLUMNS,BANDS)
+
+    hy_obj = open_image(image,anc_path)
+    hy_obj.gen_mask(mask_create,'calc_topo',TOPO['calc_mask'])
+    topo = copy.deepcopy(TOPO)
+    calc_scsc_coeffs(hy_obj,topo)
+
+    np.random.seed(0)
+    hy_obj.brdf = copy.deepcopy(BRDF)
+    hy_obj.gen_mask(mask_create,'calc_brdf',BRDF['calc_mask'])
+    set_solar_zn(hy_obj)
+    calc_flex_single(hy_obj,hy_obj.brdf)
+    return image,anc_path,hy_obj.topo,hy_obj.brdf
+
+
+def open_image(image,anc_path):
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(image,'envi',anc_path)
+    hy_obj.create_bad_bands(BAD_BANDS)
+    return hy_obj
+
+
+def fresh(scene,glint = None):
+    '''Open an image with coefficients, no masks or ancillary datasets
+    are built yet.
+    '''
+    image,anc_path,topo,brdf = scene
+    hy_obj = open_image(image,anc_path)
+    hy_obj.topo = copy.deepcopy(topo)
+    hy_obj.brdf = copy.deepcopy(brdf)
+    if glint is not None:
+        hy_obj.glint = copy.deepcopy(GLINT[glint])
+        hy_obj.glint['deep_water_sample'] = {hy_obj.file_name: [40,60,60,90]}
+    return hy_obj
+
+
+def assert_same(selected,full):
+    assert selected.shape == full.shape
+    assert np.array_equal(selected,full,equal_nan = True)
+
+
+READS = {'chunk': lambda h,c,b: h.get_chunk(5,95,10,150,corrections = c,bands = b),
+         'line': lambda h,c,b: h.get_line(77,corrections = c,bands = b),
+         'pixels': lambda h,c,b: h.get_pixels([20,80,140],[30,50,70],corrections = c,bands = b)}
+
+
+@pytest.mark.parametrize('read',list(READS))
+@pytest.mark.parametrize('bands',SELECTIONS)
+def test_topo_brdf_selection(scene,read,bands):
+    corrections = ['topo','brdf']
+    selected_obj,full_obj = fresh(scene),fresh(scene)
+
+    selected = READS[read](selected_obj,corrections,bands)
+    full = READS[read](full_obj,corrections,None)
+    assert_same(selected,full[...,bands])
+
+    # Masks and ancillary datasets built for the selection are shared
+    # with later full band reads
+    assert_same(READS[read](selected_obj,corrections,None),full)
+
+
+def test_topo_column_selection(scene):
+    selected_obj,full_obj = fresh(scene),fresh(scene)
+    bands = SELECTIONS[0]
+    selected = selected_obj.get_column(33,corrections = ['topo'],bands = bands)
+    full = full_obj.get_column(33,corrections = ['topo'])
+    assert_same(selected,full[:,bands])
+
+
+@pytest.mark.parametrize('glint',list(GLINT))
+@pytest.mark.parametrize('bands',SELECTIONS)
+def test_glint_selection(scene,glint,bands):
+    selected_obj,full_obj = fresh(scene,glint),fresh(scene,glint)
+
+    selected = selected_obj.get_chunk(0,COLUMNS,0,LINES,corrections = ['glint'],bands = bands)
+    full = full_obj.get_chunk(0,COLUMNS,0,LINES,corrections = ['glint'])
+    assert_same(selected,full[...,bands])
+
+
+def test_good_band_iteration(scene):
+    corrections = ['topo','brdf']
+    selected_obj,full_obj = fresh(scene),fresh(scene)
+    good = np.flatnonzero(~full_obj.bad_bands)
+
+    iterator = selected_obj.iterate('auto',corrections = corrections,bands = 'good')
+    chunks = []
+    while not iterator.complete:
+        chunks.append(iterator.read_next())
+    selected = np.concatenate(chunks) if iterator.by == 'chunk' else np.stack(chunks)
+
+    full = full_obj.get_chunk(0,COLUMNS,0,LINES,corrections = corrections)
+    assert_same(selected,full[...,good])
@@ -0,0 +1,36 @@
+'''Iteration plans are computed once per image.
+
+'''
+import pytest
+import hytools as ht
+from hytools.misc import plan_iteration
+from synthetic import write_neon
+
+
+@pytest.fixture(scope='module')
+def image(tmp_path_factory):
+    image = str(tmp_path_factory.mktemp('chunks') / 'scene.h5')
+    write_neon(image,200,100,40)
+    return image
+
+
+def test_plans_cached(image,monkeypatch):
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(image,'neon')
+    assert hy_obj.chunk_lines == 64
+
+    # Plans do not open the HDF file, 130 lines fit the budget and are
+    # aligned to the HDF chunk lines
+    def load_data():
+        raise AssertionError('HDF file opened')
+    monkeypatch.setattr(hy_obj,'load_data',load_data)
+
+    by,chunk_size = plan_iteration(hy_obj,memory = 130*100*40*2)
+    assert (by,chunk_size) == ('chunk',(128,100))
+    assert plan_iteration(hy_obj,memory = 130*100*40*2) == (by,chunk_size)
+    assert len(hy_obj.plans) == 1
+
+    plan_iteration(hy_obj,['topo'],bands = 'good')
+    hy_obj.create_bad_bands([[1300,1500]])
+    plan_iteration(hy_obj,['topo'],bands = 'good')
+    assert len(hy_obj.plans) == 3
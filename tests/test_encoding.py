@@ -0,0 +1,41 @@
+'''Output encodings of ENVI headers.
+
+'''
+import numpy as np
+import pytest
+import hytools as ht
+from hytools.io.envi import WriteENVI,encode_header,envi_header_dict,FLOAT16_DESCRIPTION
+
+
+def header():
+    header_dict = envi_header_dict()
+    header_dict.update({'lines': 3,'samples': 4,'bands': 2,'interleave': 'bil',
+                        'data type': 4,'byte order': 0,'header offset': 0,
+                        'file type': 'ENVI Standard','data ignore value': -9999})
+    return header_dict
+
+
+@pytest.mark.parametrize('encoding',[{'type': 'float32'},{'type': 'int16'},{'scale': 100}])
+def test_bad_encoding(encoding):
+    with pytest.raises(ValueError):
+        encode_header(header(),encoding)
+
+
+def test_float16_labelled(tmp_path):
+    output_name = str(tmp_path / 'half')
+    writer = WriteENVI(output_name,encode_header(header(),{'type': 'float16'}))
+    data = np.full((3,4,2),0.25,dtype = np.float32)
+    data[0,0] = -9999
+    writer.write_chunk(data,0,0)
+    writer.close()
+
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(output_name,'envi')
+    assert hy_obj.encoding == 'float16'
+    assert np.array_equal(hy_obj.get_chunk(0,4,0,3),data)
+
+    header_dict = hy_obj.get_header()
+    header_dict['description'] = FLOAT16_DESCRIPTION
+    header_dict = encode_header(header_dict)
+    assert header_dict['data encoding'] is None
+    assert header_dict['description'] is None
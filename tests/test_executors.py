@@ -0,0 +1,36 @@
+'''Local actors share a pool of at most num_cpus worker processes.
+
+'''
+import pytest
+from hytools.parallel import get_executor
+from hytools.parallel.executors import call,call_each
+from hytools.misc import get_attribute
+from synthetic import write_envi
+
+
+@pytest.fixture(scope='module')
+def images(tmp_path_factory):
+    path = tmp_path_factory.mktemp('executors')
+    images = [str(path / ('scene_%s' % i)) for i in range(5)]
+    for i,image in enumerate(images):
+        write_envi(image,10+i,8,5,seed = i)
+    return images
+
+
+def test_local_actors_capped(images):
+    executor = get_executor('local',num_cpus = 2)
+    try:
+        actors = executor.actors(len(images))
+        assert len(executor.workers) == 2
+        assert len({id(actor.worker) for actor in actors}) == 2
+
+        # Each actor keeps its own image
+        _ = call_each(actors,'read_file',images,['envi']*len(images))
+        assert call(actors,'do',get_attribute,'lines') == [10+i for i in range(len(images))]
+
+        executor.release(actors[:3])
+        assert call(actors[3:],'do',get_attribute,'file_name') == images[3:]
+        executor.release(actors[3:])
+        assert executor.workers == []
+    finally:
+        executor.shutdown()
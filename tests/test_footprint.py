@@ -0,0 +1,57 @@
+'''Pixels outside the valid footprint of a window are filled with no data.
+
+'''
+import numpy as np
+import pytest
+import hytools as ht
+from synthetic import write_envi,write_lines,envi_header,NO_DATA
+
+LINES,COLUMNS,BANDS = 60,50,30
+RESAMPLER = {'type': 'linear','out_waves': list(range(500,2000,100))}
+
+
+@pytest.fixture(scope='module')
+def image(tmp_path_factory):
+    image = str(tmp_path_factory.mktemp('footprint') / 'scene')
+    write_envi(image,LINES,COLUMNS,BANDS)
+    return image
+
+
+def open_image(image,footprint = True):
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(image,'envi')
+    if not footprint:
+        hy_obj.footprint = None
+    return hy_obj
+
+
+def test_resampled_no_data(image):
+    hy_obj,full_obj = open_image(image),open_image(image,False)
+    hy_obj.resampler = full_obj.resampler = RESAMPLER
+    no_data = ~np.asarray(hy_obj.mask['no_data'])
+    assert no_data.any()
+
+    data = np.stack([hy_obj.get_line(line,resample = True) for line in range(LINES)])
+    full = np.stack([full_obj.get_line(line,resample = True) for line in range(LINES)])
+    assert np.array_equal(data[~no_data],full[~no_data])
+
+    # No data pixels outside the valid span of a line are filled rather
+    # than resampled, resampling scales the no data value by the sum of
+    # the resampling coefficients
+    assert np.all(data[no_data] == NO_DATA)
+    assert np.allclose(full[no_data],NO_DATA)
+
+
+def test_unsigned_fill(tmp_path):
+    image = str(tmp_path / 'unsigned')
+    header_dict = envi_header(4,6,3,'bil',0,12)
+    write_lines(image,header_dict,lambda line: np.full((6,3),100+line,dtype = np.uint16))
+    hy_obj = open_image(image)
+    assert hy_obj.no_data == NO_DATA
+
+    window = hy_obj.fill_window((0,6,0,4),(2,5,1,3))
+    assert window.dtype == np.uint16
+    assert np.all(window[1:3,2:5] == np.arange(101,103)[:,np.newaxis,np.newaxis])
+    fill = np.ones(window.shape[:2],dtype = bool)
+    fill[1:3,2:5] = False
+    assert np.all(window[fill] == np.iinfo(np.uint16).max)
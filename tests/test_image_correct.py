@@ -0,0 +1,71 @@
+'''Resumed image_correct exports match uninterrupted exports.
+
+'''
+import json
+import sys
+import numpy as np
+import pytest
+import image_correct
+from hytools.io.envi import parse_envi_header
+from synthetic import write_envi
+
+LINES,COLUMNS,BANDS = 48,20,30
+ROWS_PER_TASK = 16
+
+
+@pytest.fixture(scope='module')
+def config(tmp_path_factory):
+    path = tmp_path_factory.mktemp('image_correct')
+    image = str(path / 'scene')
+    anc_path = write_envi(image,LINES,COLUMNS,BANDS)
+    output_dir = path / 'output'
+    output_dir.mkdir()
+    return {'input_files': [image],
+            'num_cpus': 1,
+            'file_type': 'envi',
+            'anc_files': {image: anc_path},
+            'bad_bands': [],
+            'corrections': [],
+            'export': {'coeffs': False,'image': True,'masks': False,
+                       'subset_waves': [],'output_dir': str(output_dir) + '/',
+                       'suffix': 'resamp','rows_per_task': ROWS_PER_TASK},
+            'resample': True,
+            'resampler': {'type': 'linear','out_waves': list(range(500,2000,50))},
+            'executor': 'local'}
+
+
+def run(config,path,monkeypatch):
+    config_file = str(path / 'config.json')
+    with open(config_file, 'w') as outfile:
+        json.dump(config,outfile)
+    monkeypatch.setattr(sys,'argv',['image_correct.py',config_file])
+    image_correct.main()
+
+
+def test_resume_resampled_export(config,tmp_path,monkeypatch):
+    run(config,tmp_path,monkeypatch)
+    output_name = config['export']['output_dir'] + 'scene_resamp'
+    with open(output_name,'rb') as infile:
+        complete = infile.read()
+    bands = parse_envi_header(output_name + '.hdr')['bands']
+    assert bands == len(config['resampler']['out_waves'])
+
+    # Interrupt after the first band of lines
+    manifest_file = output_name + '_manifest.json'
+    with open(manifest_file, 'r') as infile:
+        manifest = json.load(infile)
+    assert manifest['completed'] == [[0,LINES]]
+    manifest['completed'] = [[0,ROWS_PER_TASK]]
+    with open(manifest_file, 'w') as outfile:
+        json.dump(manifest,outfile)
+    line_bytes = COLUMNS*bands*4
+    with open(output_name,'r+b') as outfile:
+        outfile.seek(ROWS_PER_TASK*line_bytes)
+        outfile.write(bytes(len(complete)-ROWS_PER_TASK*line_bytes))
+
+    resume = dict(config,export = dict(config['export'],resume = True))
+    run(resume,tmp_path,monkeypatch)
+    with open(output_name,'rb') as infile:
+        assert infile.read() == complete
+    with open(manifest_file, 'r') as infile:
+        assert json.load(infile)['completed'] == [[0,LINES]]
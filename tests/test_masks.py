@@ -0,0 +1,65 @@
+'''Compare masks evaluated on slices with masks evaluated for the full
+scene.
+
+'''
+import json
+import numpy as np
+import pytest
+import hytools as ht
+from hytools.masks import mask_create
+from hytools.masks.masks import PIXEL_MASKS
+from synthetic import write_envi
+
+LINES,COLUMNS,BANDS = 120,90,40
+
+MASKS = [['ndi',{'band_1':850,'band_2':660,'min':0.1,'max':1.0}],
+         ['ancillary',{'name':'slope','min':0,'max':20}],
+         ['ancillary',{'name':'cosine_i','min':0.2,'max':1.0}],
+         ['neon_edge',{'radius':3}]]
+
+SLICES = {'chunk': (slice(10,70),slice(5,80)),
+          'line': (33,slice(None)),
+          'column': (slice(None),47),
+          'edge': (slice(-4,None),slice(0,3)),
+          'pixels': ([3,50,119,50],[0,20,89,21]),
+          'pixel grid': (np.array([[4],[60]]),np.array([[7,8,70]]))}
+
+
+@pytest.fixture(scope='module')
+def scene(tmp_path_factory):
+    image = str(tmp_path_factory.mktemp('masks') / 'scene')
+    anc_path = write_envi(image,LINES,COLUMNS,BANDS)
+    return image,anc_path
+
+
+def open_image(scene,slice_masks):
+    image,anc_path = scene
+    hy_obj = ht.HyTools()
+    hy_obj.read_file(image,'envi',anc_path)
+    hy_obj.slice_masks = slice_masks
+    hy_obj.gen_mask(mask_create,'apply',MASKS)
+    return hy_obj
+
+
+@pytest.mark.parametrize('index',list(SLICES))
+def test_slice_masks(scene,index):
+    sliced_obj,full_obj = open_image(scene,True),open_image(scene,False)
+    key = SLICES[index]
+
+    sliced = sliced_obj.mask['apply'][key]
+    full = full_obj.mask['apply'][key]
+    assert sliced.shape == full.shape
+    assert np.array_equal(sliced,full)
+
+    # Only terms which depend on neighbouring pixels are generated for
+    # the full scene
+    assert sliced_obj.mask['apply']._packed is None
+    terms = [json.loads(term)[0] for term in sliced_obj.mask_terms]
+    assert 'neon_edge' in terms
+    assert not set(terms) & set(PIXEL_MASKS)
+
+
+def test_full_scene_mask(scene):
+    sliced_obj,full_obj = open_image(scene,True),open_image(scene,False)
+    assert np.array_equal(np.asarray(sliced_obj.mask['apply']),
+                          np.asarray(full_obj.mask['apply']))
@@ -0,0 +1,78 @@
+'''Mosaics assembled in blocks of lines match mosaics assembled from
+full images.
+
+'''
+import numpy as np
+import pytest
+import hytools as ht
+from hytools.mosaic import mosaic
+from hytools.parallel import TaskScheduler
+from hytools.io.envi import parse_envi_header,write_envi_header
+from synthetic import write_envi,MAP_INFO,PIXEL_SIZE,NO_DATA
+
+# Lines, columns, interleave and line and column offset of each image,
+# the last image is separated from the others by a gap of 20 lines
+IMAGES = [(60,40,'bil',0,0),(50,52,'bip',30,-20),(40,36,'bsq',-60,-140)]
+
+
+@pytest.fixture(scope='module')
+def images(tmp_path_factory):
+    path = tmp_path_factory.mktemp('mosaic')
+    images = []
+    for i,(lines,columns,interleave,line,column) in enumerate(IMAGES):
+        image = str(path / ('scene_%s' % i))
+        write_envi(image,lines,columns,10,interleave,seed = i)
+        header_dict = parse_envi_header(image + '.hdr')
+        map_info = list(MAP_INFO)
+        map_info[3] = str(float(map_info[3]) + column*PIXEL_SIZE)
+        map_info[4] = str(float(map_info[4]) - line*PIXEL_SIZE)
+        header_dict['map info'] = map_info
+        write_envi_header(image,header_dict)
+        images.append(image)
+    return images
+
+
+def open_images(images):
+    hy_objs = []
+    for image in images:
+        hy_obj = ht.HyTools()
+        hy_obj.read_file(image,'envi')
+        hy_objs.append(hy_obj)
+    return hy_objs
+
+
+def full_mosaic(hy_objs,grid,rule):
+    data = np.full((grid['lines'],grid['columns'],hy_objs[0].bands),NO_DATA,dtype = np.int16)
+    order = hy_objs if rule == 'last' else hy_objs[::-1]
+    offsets = grid['offsets'] if rule == 'last' else grid['offsets'][::-1]
+    for hy_obj,(line,column) in zip(order,offsets):
+        image = hy_obj.get_chunk(0,hy_obj.columns,0,hy_obj.lines)
+        valid = image[:,:,0] != NO_DATA
+        data[line:line+hy_obj.lines,column:column+hy_obj.columns][valid] = image[valid]
+    return data
+
+
+@pytest.mark.parametrize('rule',['first','last'])
+@pytest.mark.parametrize('block_lines',[None,7])
+def test_mosaic_blocks(images,tmp_path,rule,block_lines):
+    hy_objs = open_images(images)
+    output_name = str(tmp_path / 'mosaic')
+    grid = mosaic(hy_objs,output_name,rule,block_lines = block_lines)
+    assert grid['offsets'] == [(60,140),(90,120),(0,0)]
+
+    output = open_images([output_name])[0]
+    result = output.get_chunk(0,output.columns,0,output.lines)
+    assert np.array_equal(result,full_mosaic(hy_objs,grid,rule))
+
+
+def test_mosaic_scheduler(images,tmp_path):
+    hy_objs = open_images(images)
+    scheduler = TaskScheduler(2,backend = 'local')
+    try:
+        for name,run in [('local',None),('scheduler',scheduler)]:
+            mosaic(hy_objs,str(tmp_path / name),'mean',run,block_lines = 9)
+    finally:
+        scheduler.shutdown()
+    local,scheduled = open_images([str(tmp_path / 'local'),str(tmp_path / 'scheduler')])
+    assert np.array_equal(local.get_chunk(0,local.columns,0,local.lines),
+                          scheduled.get_chunk(0,scheduled.columns,0,scheduled.lines))
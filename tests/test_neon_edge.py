@@ -0,0 +1,61 @@
+'''Compare the distance transform and binary erosion NEON edge buffers.
+
+'''
+import numpy as np
+import pytest
+from scipy.ndimage import binary_erosion,gaussian_filter
+from hytools.masks.calc_apply import neon_edge
+from synthetic import rotated_footprint
+
+
+class MaskContainer:
+    '''Minimal stand-in for a HyTools object holding a no data mask.
+    '''
+    def __init__(self,no_data):
+        self.lines,self.columns = no_data.shape
+        self.mask = {'no_data' : no_data}
+
+
+def blobs(lines,columns,seed = 0):
+    '''Irregular valid areas with holes and isolated pixels.
+    '''
+    noise = np.random.default_rng(seed).random((lines,columns))
+    return gaussian_filter(noise,4) > 0.5
+
+
+def stripes(lines,columns):
+    '''Valid pixels touching the image edges with narrow gaps.
+    '''
+    mask = np.ones((lines,columns),dtype = bool)
+    mask[:,::17] = False
+    mask[40:43,:] = False
+    return mask
+
+
+SHAPES = {'rotated': lambda: rotated_footprint(300,200),
+          'rotated_steep': lambda: rotated_footprint(250,260,angle = 60),
+          'blobs': lambda: blobs(220,180),
+          'stripes': lambda: stripes(150,190),
+          'full': lambda: np.ones((90,130),dtype = bool)}
+
+
+@pytest.mark.parametrize('shape',list(SHAPES))
+@pytest.mark.parametrize('radius',[1,3,8,25])
+def test_edt_matches_erosion(shape,radius):
+    hy_obj = MaskContainer(SHAPES[shape]())
+    erosion = neon_edge(hy_obj,{'radius':radius,'method':'erosion'})
+    edt = neon_edge(hy_obj,{'radius':radius})
+    assert np.array_equal(erosion,edt)
+
+
+@pytest.mark.parametrize('tile_size,workers',[(32,1),(45,3)])
+def test_tiles_match_full_image(tile_size,workers):
+    no_data = blobs(200,170,seed = 1)
+    hy_obj = MaskContainer(no_data)
+    radius = 6
+    y_grid, x_grid = np.ogrid[-radius: radius + 1, -radius: radius + 1]
+    expected = binary_erosion(no_data,x_grid**2 + y_grid**2 <= radius**2)
+    for method in ['edt','erosion']:
+        mask = neon_edge(hy_obj,{'radius':radius,'method':method,
+                                 'tile_size':tile_size,'workers':workers})
+        assert np.array_equal(mask,expected)